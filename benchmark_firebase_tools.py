@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Firebase Benchmark Script
+Time the admin tools and the app's hot queries against the Firestore emulator
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from clear_firebase_data import DEFAULT_PROJECT_ID, FirebaseDataClearer
+from firebase_benchmark import FirestoreBenchmark, compare_results
+from firebase_import import emulator_host
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Firebase Benchmark Tool")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated dataset sizes in users (default: 1000,10000,100000)")
+    parser.add_argument("--output", help="results file (default: benchmarks/results-<timestamp>.json)")
+    parser.add_argument("--compare", metavar="RESULTS_FILE", help="print changes against an earlier results file")
+    parser.add_argument("--work-dir", default="benchmarks", help="cached datasets and temporary exports")
+    parser.add_argument("--seed", type=int, default=42, help="dataset and sampling seed")
+    parser.add_argument("--iterations", type=int, default=50, help="calls per single-user query replay")
+    parser.add_argument("--scan-iterations", type=int, default=3,
+                        help="calls per full-collection replay and stats run")
+    parser.add_argument("--workers", type=int, default=8, help="parallelism of the bulk paths")
+    parser.add_argument("--max-in-flight", type=int, default=32, help="concurrent batch commits")
+    parser.add_argument("--processes", type=int, help="dataset generator processes (default: CPU count)")
+    parser.add_argument("--project-id", default=DEFAULT_PROJECT_ID, help="emulator project ID")
+    args = parser.parse_args()
+
+    print("🏁 Firebase Benchmark Tool")
+    print("=" * 40)
+
+    if not emulator_host():
+        # The clear scenario wipes every benchmarked collection
+        print("❌ FIRESTORE_EMULATOR_HOST is not set; benchmarks only run against the emulator")
+        sys.exit(1)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    clearer = FirebaseDataClearer(args.project_id)
+    benchmark = FirestoreBenchmark(clearer, work_dir=args.work_dir, seed=args.seed,
+                                   iterations=args.iterations, scan_iterations=args.scan_iterations,
+                                   workers=args.workers, max_in_flight=args.max_in_flight,
+                                   processes=args.processes)
+    results = benchmark.run(sizes)
+
+    output = args.output or os.path.join(
+        args.work_dir, f"results-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare_results(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
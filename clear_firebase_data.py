@@ -4,126 +4,297 @@ Firebase Database Clear Script
 This script clears all data from Firebase Firestore database
 """
 
+import argparse
 import os
 import sys
 import json
-import time
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
 
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    from google.cloud import firestore as firestore_client
-except ImportError:
-    print("❌ Firebase Admin SDK not installed!")
-    print("📦 Install it with: pip install firebase-admin")
-    sys.exit(1)
+from firebase_checkpoint import DEFAULT_JOURNAL_PATH, JobJournal
+from firebase_export import FirestoreExporter, default_export_dir
+from firebase_metrics import add_metrics_arguments, configure_metrics, tracer, write_metrics
+from firebase_rate_control import AdaptiveRateController
+from firebase_schema import time_field_for, time_value, user_fields_for
+from firebase_streaming import (DEFAULT_PAGE_SIZE, PipelinedWriter, StreamingDeleter,
+                                count_documents, discover_collections, is_collection_empty)
+
+DEFAULT_PROJECT_ID = "quiz-app-81036"  # Replace with your Firebase project ID
+
+DEFAULT_COLLECTIONS = [
+    'users',
+    'tasks',
+    'tournaments',
+    'transactions',
+    'activities',
+    'quizQuestions',
+    'leaderboard',
+    'settings',
+    'taskVerifications',
+    'referrals',
+    'achievements',
+    'bets',
+    'notifications',
+    'quiz_sessions',
+    'security_flags',
+    'user_blocks',
+    'system_accounts',
+    'deposits',
+    'stats',
+    'broadcasts'
+]
+
+SERVICE_ACCOUNT_PATHS = [
+    "serviceAccountKey.json",
+    "firebase-service-account.json",
+    "service-account.json"
+]
+
+# Job name used for clear checkpoints in the journal
+CLEAR_JOB = "clear"
+
+# Values per 'in' query; older emulators reject more than 10
+IN_QUERY_LIMIT = 10
+
+RANGE_OPERATORS = {'<', '<=', '>', '>=', '!=', 'not-in'}
+
+USER_DATA_COLLECTIONS = ['users', 'transactions', 'activities', 'taskVerifications', 'referrals']
+CONTENT_DATA_COLLECTIONS = ['tasks', 'tournaments', 'quizQuestions', 'leaderboard', 'settings', 'achievements']
+
+def connect_firestore(project_id: str, service_account_path: str = None, use_async: bool = False):
+    """Initialize Firebase Admin SDK and return a Firestore client (an AsyncClient with use_async)"""
+    # Imported here so that --help and argument errors don't pay for loading the SDK
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        from google.cloud import firestore as firestore_client
+    except ImportError:
+        print("❌ Firebase Admin SDK not installed!")
+        print("📦 Install it with: pip install firebase-admin")
+        sys.exit(1)
+    
+    # The emulator needs no credentials; google-cloud-firestore connects to it directly
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print(f"🧪 Using Firestore emulator at {os.environ['FIRESTORE_EMULATOR_HOST']}")
+        client_class = firestore_client.AsyncClient if use_async else firestore_client.Client
+        return client_class(project=project_id)
+    
+    # Check if Firebase app is already initialized
+    if firebase_admin._apps:
+        firebase_admin.get_app()
+    elif service_account_path and os.path.exists(service_account_path):
+        # Use service account file
+        cred = credentials.Certificate(service_account_path)
+        firebase_admin.initialize_app(cred, {
+            'projectId': project_id
+        })
+        print(f"✅ Firebase initialized with service account: {service_account_path}")
+    else:
+        # Use default credentials (environment variable or metadata server)
+        firebase_admin.initialize_app()
+        print("✅ Firebase initialized with default credentials")
+    
+    if use_async:
+        # firestore_async shares the initialized app's credentials and project
+        from firebase_admin import firestore_async
+        return firestore_async.client()
+    return firestore.client()
 
 class FirebaseDataClearer:
-    def __init__(self, project_id: str, service_account_path: str = None):
+    def __init__(self, project_id: str, service_account_path: str = None,
+                 page_size: int = DEFAULT_PAGE_SIZE, workers: int = 1, max_in_flight: int = 1,
+                 auto_discover: bool = False, recursive: bool = False,
+                 journal_path: str = None, resume: bool = False, backup_dir: str = None):
         """
         Initialize Firebase Data Clearer
         
         Args:
             project_id: Firebase project ID
             service_account_path: Path to service account JSON file (optional)
+            page_size: Documents fetched and deleted per page (max 500)
+            workers: Number of collections cleared at the same time
+            max_in_flight: Number of batch commits running at the same time
+            auto_discover: Add every root collection found in the database
+            recursive: Also delete documents in nested subcollections
+            journal_path: Checkpoint file recording per-collection progress (optional)
+            resume: Continue the previous clear recorded in the checkpoint file
+            backup_dir: Export collections under this directory before clearing them (optional)
         """
         self.project_id = project_id
+        self.page_size = page_size
+        self.workers = max(1, workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.recursive = recursive
+        self.journal = JobJournal(journal_path) if journal_path else None
+        self.resume = resume
+        self.backup_dir = backup_dir
         self.db = None
-        self.collections = [
-            'users',
-            'tasks', 
-            'tournaments',
-            'transactions',
-            'activities',
-            'quizQuestions',
-            'leaderboard',
-            'settings',
-            'taskVerifications',
-            'referrals',
-            'achievements'
-        ]
+        self.rate_controller = AdaptiveRateController()
+        self.writer = None
+        self.deleter = None
+        self.collections = list(DEFAULT_COLLECTIONS)
         
         self.initialize_firebase(service_account_path)
+        
+        if auto_discover:
+            self.discover_collections()
     
     def initialize_firebase(self, service_account_path: str = None):
         """Initialize Firebase Admin SDK"""
         try:
-            # Check if Firebase app is already initialized
-            if firebase_admin._apps:
-                app = firebase_admin.get_app()
-            else:
-                if service_account_path and os.path.exists(service_account_path):
-                    # Use service account file
-                    cred = credentials.Certificate(service_account_path)
-                    app = firebase_admin.initialize_app(cred, {
-                        'projectId': self.project_id
-                    })
-                    print(f"✅ Firebase initialized with service account: {service_account_path}")
-                else:
-                    # Use default credentials (environment variable or metadata server)
-                    app = firebase_admin.initialize_app()
-                    print("✅ Firebase initialized with default credentials")
-            
-            self.db = firestore.client()
+            self.db = connect_firestore(self.project_id, service_account_path)
+            self.configure_concurrency(self.workers, self.max_in_flight)
             print(f"✅ Connected to Firebase project: {self.project_id}")
             
         except Exception as e:
             print(f"❌ Error initializing Firebase: {e}")
             sys.exit(1)
     
+    def _count_collection(self, collection_name: str) -> int:
+        """Count one collection, returning -1 on error"""
+        try:
+            return count_documents(self.db.collection(collection_name))
+        except Exception as e:
+            print(f"  ❌ Error getting stats for {collection_name}: {e}")
+            return -1
+    
+    def _probe_collection(self, collection_name: str) -> bool:
+        """Check whether one collection is empty, treating errors as not empty"""
+        try:
+            return is_collection_empty(self.db.collection(collection_name))
+        except Exception as e:
+            print(f"  ❌ Error checking {collection_name}: {e}")
+            return False
+    
+    def _map_collections(self, func, collections: List[str]) -> Dict[str, Any]:
+        """Run a per-collection function concurrently, keeping collection order"""
+        if not collections:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(len(collections), 16)) as executor:
+            return dict(zip(collections, executor.map(func, collections)))
+    
     def get_collection_stats(self) -> Dict[str, int]:
-        """Get statistics for all collections"""
+        """Get statistics for all collections using server-side count aggregation"""
         print("📊 Getting database statistics...")
-        stats = {}
-        total_docs = 0
+        stats = self._map_collections(self._count_collection, self.collections)
         
-        for collection_name in self.collections:
-            try:
-                collection_ref = self.db.collection(collection_name)
-                docs = list(collection_ref.stream())
-                count = len(docs)
-                stats[collection_name] = count
-                total_docs += count
+        for collection_name, count in stats.items():
+            if count >= 0:
                 print(f"  📁 {collection_name}: {count} documents")
-            except Exception as e:
-                print(f"  ❌ Error getting stats for {collection_name}: {e}")
-                stats[collection_name] = -1
         
+        total_docs = sum(count for count in stats.values() if count > 0)
         print(f"📊 Total documents: {total_docs}")
         return stats
     
+    def verify_collections_empty(self, collections: List[str]) -> bool:
+        """Check that every collection is empty with concurrent limit(1) probes"""
+        empty = self._map_collections(self._probe_collection, collections)
+        for collection_name, is_empty in empty.items():
+            if not is_empty:
+                print(f"  ⚠️ {collection_name}: documents remaining")
+        return all(empty.values())
+    
     def clear_collection(self, collection_name: str) -> int:
         """Clear all documents from a collection"""
         try:
+            checkpoint = None
+            if self.journal:
+                checkpoint = self.journal.checkpoint(CLEAR_JOB, collection_name)
+                if checkpoint.done:
+                    print(f"  ⏭️ {collection_name}: Cleared in the previous run "
+                          f"({checkpoint.processed} documents)")
+                    return 0
+            
             collection_ref = self.db.collection(collection_name)
-            docs = list(collection_ref.stream())
+            deleted_count = self.deleter.delete_collection(collection_ref, collection_name,
+                                                           recursive=self.recursive,
+                                                           checkpoint=checkpoint)
             
-            if not docs:
+            if deleted_count == 0:
                 print(f"  📭 {collection_name}: Already empty")
                 return 0
             
-            # Delete documents in batches
-            batch_size = 500
-            deleted_count = 0
-            
-            for i in range(0, len(docs), batch_size):
-                batch = self.db.batch()
-                batch_docs = docs[i:i + batch_size]
-                
-                for doc in batch_docs:
-                    batch.delete(doc.reference)
-                
-                batch.commit()
-                deleted_count += len(batch_docs)
-                print(f"  🗑️ {collection_name}: Deleted {deleted_count}/{len(docs)} documents")
-            
             print(f"  ✅ {collection_name}: Cleared {deleted_count} documents")
             return deleted_count
             
         except Exception as e:
             print(f"  ❌ Error clearing {collection_name}: {e}")
-            return 0
+            if self.journal:
+                print(f"  💡 Progress saved to {self.journal.path}; run again with --resume to continue")
+            return -1
+    
+    def discover_collections(self) -> List[str]:
+        """Add root collections found in the database to the known collections"""
+        try:
+            discovered = discover_collections(self.db)
+        except Exception as e:
+            print(f"❌ Error discovering collections: {e}")
+            return []
+        
+        new_collections = [name for name in discovered if name not in self.collections]
+        self.collections.extend(new_collections)
+        print(f"🔎 Discovered {len(discovered)} root collections ({len(new_collections)} new)")
+        for collection_name in new_collections:
+            print(f"  ➕ {collection_name}")
+        return discovered
+    
+    def configure_concurrency(self, workers: int, max_in_flight: int):
+        """Set the collection worker pool size and the number of commits in flight"""
+        if self.writer:
+            self.writer.close()
+        self.workers = max(1, workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.writer = PipelinedWriter(self.db, self.page_size, self.max_in_flight,
+                                      rate_controller=self.rate_controller)
+        self.deleter = StreamingDeleter(self.db, self.page_size, writer=self.writer)
+    
+    def print_rate_stats(self):
+        """Print the adaptive throttle's current state"""
+        stats = self.rate_controller.stats()
+        print(f"📈 Target write rate: {stats['target_ops_per_second']:.0f} ops/sec "
+              f"(peak {stats['peak_ops_per_second']:.0f}, batch size {stats['batch_size']}, "
+              f"{stats['contention_errors']} contention retries)")
+    
+    def clear_collections(self, collections: List[str]) -> Dict[str, int]:
+        """Clear collections, several at once when more than one worker is configured"""
+        if self.journal:
+            self.journal.start(CLEAR_JOB, resume=self.resume)
+            # Only the first clear of a session resumes; later ones start fresh
+            self.resume = False
+        
+        if self.workers > 1:
+            print(f"⚡ Parallel mode: {self.workers} workers, {self.max_in_flight} commits in flight")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                counts = executor.map(self.clear_collection, collections)
+                return dict(zip(collections, counts))
+        
+        results = {}
+        for collection_name in collections:
+            print(f"\n🧹 Clearing collection: {collection_name}")
+            results[collection_name] = self.clear_collection(collection_name)
+        return results
+    
+    def backup_collections(self, collections: List[str]) -> bool:
+        """Export collections to a new directory under backup_dir, returning False on failure"""
+        exporter = FirestoreExporter(self.db, default_export_dir(self.backup_dir),
+                                     workers=max(4, self.workers))
+        try:
+            manifest = exporter.export_collections(collections)
+        except Exception as e:
+            print(f"❌ Backup failed: {e}")
+            return False
+        return manifest['complete']
+    
+    def _backup_before_clear(self, collections: List[str]) -> bool:
+        """Run the automatic backup if one is configured; a resumed clear was already backed up"""
+        if not self.backup_dir or self.resume:
+            return True
+        print("\n💾 Backing up collections before clearing...")
+        if self.backup_collections(collections):
+            return True
+        print("❌ Backup incomplete - nothing was deleted")
+        return False
     
     def clear_all_data(self, confirm: bool = False) -> bool:
         """Clear all data from Firebase database"""
@@ -138,26 +309,23 @@ class FirebaseDataClearer:
                 print("❌ Operation cancelled by user")
                 return False
         
+        if not self._backup_before_clear(self.collections):
+            return False
+        
         print("\n🗑️ Starting to clear all database data...")
         print("=" * 50)
         
         # Get initial stats
         initial_stats = self.get_collection_stats()
         
-        total_deleted = 0
-        results = {}
-        
         # Clear each collection
-        for collection_name in self.collections:
-            print(f"\n🧹 Clearing collection: {collection_name}")
-            deleted = self.clear_collection(collection_name)
-            results[collection_name] = deleted
-            total_deleted += deleted
-            time.sleep(0.5)  # Small delay to avoid rate limiting
+        results = self.clear_collections(self.collections)
+        total_deleted = sum(count for count in results.values() if count > 0)
         
         print("\n" + "=" * 50)
         print("🎉 Database clear completed!")
         print(f"📊 Total documents deleted: {total_deleted}")
+        self.print_rate_stats()
         print("\n📋 Results:")
         for collection, count in results.items():
             if count > 0:
@@ -169,11 +337,9 @@ class FirebaseDataClearer:
         
         # Verify clearing
         print("\n🔍 Verifying database is empty...")
-        final_stats = self.get_collection_stats()
-        
-        if all(count == 0 for count in final_stats.values()):
+        if self.verify_collections_empty(self.collections):
             print("✅ Database successfully cleared - all collections are empty!")
-            return True
+            return not any(count < 0 for count in results.values())
         else:
             print("⚠️ Some collections may still contain data")
             return False
@@ -188,59 +354,195 @@ class FirebaseDataClearer:
                 return False
         
         print(f"\n🧹 Clearing specific collections: {', '.join(collections)}")
-        total_deleted = 0
         
+        known_collections = []
         for collection_name in collections:
             if collection_name in self.collections:
-                print(f"\n🧹 Clearing collection: {collection_name}")
-                deleted = self.clear_collection(collection_name)
-                total_deleted += deleted
+                known_collections.append(collection_name)
             else:
                 print(f"⚠️ Unknown collection: {collection_name}")
         
+        if not self._backup_before_clear(known_collections):
+            return False
+        
+        results = self.clear_collections(known_collections)
+        total_deleted = sum(count for count in results.values() if count > 0)
+        failed = [name for name, count in results.items() if count < 0]
+        
         print(f"\n✅ Cleared {total_deleted} documents from specified collections")
+        if failed:
+            print(f"❌ Failed to clear: {', '.join(failed)}")
+            return False
         return True
     
+    def _purge_tasks(self, collection_name: str, user_ids: Optional[List[str]],
+                     older_than_days: Optional[float],
+                     filters: List[Tuple[str, str, Any]]) -> List[Tuple[str, Any, Optional[str]]]:
+        """Build the filtered queries for one collection as (label, query, order_field)"""
+        base_query = self.db.collection(collection_name)
+        order_field = None
+        for field, operator, value in filters:
+            base_query = base_query.where(field, operator, value)
+            if operator in RANGE_OPERATORS:
+                order_field = field
+        
+        if older_than_days is not None:
+            time_field, kind = time_field_for(collection_name)
+            cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+            base_query = base_query.where(time_field, '<', time_value(cutoff, kind))
+            order_field = time_field
+        
+        if not user_ids:
+            return [(collection_name, base_query, order_field)]
+        
+        tasks = []
+        for user_field in user_fields_for(collection_name):
+            for i in range(0, len(user_ids), IN_QUERY_LIMIT):
+                chunk = user_ids[i:i + IN_QUERY_LIMIT]
+                query = base_query.where(user_field, 'in', chunk)
+                label = f"{collection_name}[{user_field} in {i + 1}-{i + len(chunk)}]"
+                tasks.append((label, query, order_field))
+        return tasks
+    
+    def _run_purge_task(self, task: Tuple[str, Any, Optional[str]]) -> int:
+        """Delete the documents matched by one purge query"""
+        label, query, order_field = task
+        try:
+            # Range filters are ordered newest first to match the userId+timestamp DESC indexes
+            return self.deleter.delete_query(query, label, order_field=order_field,
+                                             descending=order_field is not None)
+        except Exception as e:
+            print(f"  ❌ Error purging {label}: {e}")
+            return -1
+    
+    def purge_documents(self, collections: List[str], user_ids: Optional[List[str]] = None,
+                        older_than_days: Optional[float] = None,
+                        filters: Optional[List[Tuple[str, str, Any]]] = None,
+                        confirm: bool = False) -> Dict[str, int]:
+        """
+        Delete only the documents matching a user, time range and/or field filters
+        
+        Filters are pushed down to Firestore queries, so only matching keys
+        are read. Each collection is split into one query per user ID chunk,
+        and the queries run in parallel on the configured worker pool. A
+        collection whose purge hit an error is reported as -1, like a failed
+        clear; a refused purge returns {}.
+        
+        Args:
+            collections: Collections to purge
+            user_ids: Delete documents belonging to these users (optional)
+            older_than_days: Delete documents older than this many days (optional)
+            filters: Extra (field, operator, value) filters (optional)
+            confirm: Skip the confirmation prompt
+        """
+        filters = filters or []
+        if not user_ids and older_than_days is None and not filters:
+            print("❌ A purge needs at least one filter; use a clear to empty whole collections")
+            return {}
+
+        # Firestore accepts range/inequality filters on one field per query only
+        for collection_name in collections:
+            range_fields = {field for field, operator, _ in filters if operator in RANGE_OPERATORS}
+            if older_than_days is not None:
+                range_fields.add(time_field_for(collection_name)[0])
+            if len(range_fields) > 1:
+                print(f"❌ {collection_name}: range filters on {', '.join(sorted(range_fields))}; "
+                      f"Firestore allows range filters on one field per query")
+                return {}
+
+        criteria = []
+        if user_ids:
+            criteria.append(f"{len(user_ids)} user(s)")
+        if older_than_days is not None:
+            criteria.append(f"older than {older_than_days:g} days")
+        criteria.extend(f"{field} {operator} {value!r}" for field, operator, value in filters)
+        
+        if not confirm:
+            print(f"🚨 WARNING: This will delete documents matching {', '.join(criteria)} "
+                  f"from: {', '.join(collections)}")
+            response = input("❓ Are you sure? (y/N): ")
+            if response.lower() != 'y':
+                print("❌ Operation cancelled by user")
+                return {}
+        
+        tasks = []
+        for collection_name in collections:
+            tasks.extend((collection_name, task)
+                         for task in self._purge_tasks(collection_name, user_ids, older_than_days, filters))
+        
+        print(f"\n🧽 Purging {len(tasks)} filtered queries with {self.workers} workers")
+        results = {collection_name: 0 for collection_name in collections}
+        failed = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            counts = executor.map(self._run_purge_task, [task for _, task in tasks])
+            for (collection_name, _), count in zip(tasks, counts):
+                if count < 0:
+                    failed.add(collection_name)
+                else:
+                    results[collection_name] += count
+        
+        for collection_name, count in results.items():
+            if collection_name in failed:
+                print(f"  ❌ {collection_name}: {count} matching documents deleted before an error")
+            else:
+                print(f"  ✅ {collection_name}: {count} matching documents deleted")
+        print(f"✅ Purged {sum(results.values())} documents")
+        
+        # -1 marks a collection whose purge did not finish, as in clear_collections
+        for collection_name in failed:
+            results[collection_name] = -1
+        return results
+    
     def clear_user_data_only(self, confirm: bool = False) -> bool:
         """Clear only user-related data"""
-        user_collections = ['users', 'transactions', 'activities', 'taskVerifications', 'referrals']
-        return self.clear_specific_collections(user_collections, confirm)
+        return self.clear_specific_collections(USER_DATA_COLLECTIONS, confirm)
     
     def clear_content_data_only(self, confirm: bool = False) -> bool:
         """Clear only content data"""
-        content_collections = ['tasks', 'tournaments', 'quizQuestions', 'leaderboard', 'settings', 'achievements']
-        return self.clear_specific_collections(content_collections, confirm)
+        return self.clear_specific_collections(CONTENT_DATA_COLLECTIONS, confirm)
+    
+    def close(self):
+        """Wait for pending commits and close the checkpoint file"""
+        if self.writer:
+            self.writer.close()
+        if self.journal:
+            self.journal.close()
+
+def find_service_account_path() -> Optional[str]:
+    """Look for a service account file in the current directory"""
+    for path in SERVICE_ACCOUNT_PATHS:
+        if os.path.exists(path):
+            print(f"📁 Found service account file: {path}")
+            return path
+    
+    print("📁 No service account file found, using default credentials")
+    print("💡 You can place a service account JSON file in the current directory")
+    return None
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Firebase Database Clear Tool")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the previous clear from its checkpoints")
+    parser.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                        help=f"checkpoint file (default: {DEFAULT_JOURNAL_PATH})")
+    parser.add_argument("--backup-dir",
+                        help="export collections under this directory before every clear")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+    
     print("🗄️ Firebase Database Clear Tool")
     print("=" * 40)
     
-    # Configuration
-    PROJECT_ID = "quiz-app-81036"  # Replace with your Firebase project ID
-    
     # Check for service account file
-    service_account_path = None
-    possible_paths = [
-        "serviceAccountKey.json",
-        "firebase-service-account.json",
-        "service-account.json"
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            service_account_path = path
-            break
-    
-    if service_account_path:
-        print(f"📁 Found service account file: {service_account_path}")
-    else:
-        print("📁 No service account file found, using default credentials")
-        print("💡 You can place a service account JSON file in the current directory")
+    service_account_path = find_service_account_path()
     
     # Initialize clearer
     try:
-        clearer = FirebaseDataClearer(PROJECT_ID, service_account_path)
+        clearer = FirebaseDataClearer(DEFAULT_PROJECT_ID, service_account_path,
+                                      journal_path=args.checkpoint_file, resume=args.resume,
+                                      backup_dir=args.backup_dir)
     except Exception as e:
         print(f"❌ Failed to initialize Firebase: {e}")
         return
@@ -254,9 +556,12 @@ def main():
         print("3. 👥 Clear user data only")
         print("4. 📝 Clear content data only")
         print("5. 🎯 Clear specific collections")
-        print("6. ❌ Exit")
+        print(f"6. ⚡ Set parallelism (now {clearer.workers} workers, {clearer.max_in_flight} commits in flight)")
+        print(f"7. 🔎 Discover collections and toggle subcollections (now {'on' if clearer.recursive else 'off'})")
+        print("8. 🧽 Targeted purge (by user, age or field filter)")
+        print("9. ❌ Exit")
         
-        choice = input("\n❓ Enter your choice (1-6): ").strip()
+        choice = input("\n❓ Enter your choice (1-9): ").strip()
         
         if choice == "1":
             clearer.get_collection_stats()
@@ -288,11 +593,47 @@ def main():
                 print("❌ Invalid input")
         
         elif choice == "6":
+            try:
+                workers = int(input("❓ Collections cleared at once: ").strip())
+                max_in_flight = int(input("❓ Batch commits in flight: ").strip())
+                clearer.configure_concurrency(workers, max_in_flight)
+                print(f"✅ Using {clearer.workers} workers, {clearer.max_in_flight} commits in flight")
+            except ValueError:
+                print("❌ Invalid input")
+        
+        elif choice == "7":
+            clearer.discover_collections()
+            response = input("❓ Also delete nested subcollections? (y/N): ")
+            clearer.recursive = response.lower() == 'y'
+        
+        elif choice == "8":
+            selection = input("❓ Collections (comma-separated): ").strip()
+            collections = [name.strip() for name in selection.split(",") if name.strip()]
+            users = input("❓ User IDs (comma-separated, blank for all users): ").strip()
+            user_ids = [user.strip() for user in users.split(",") if user.strip()] or None
+            days = input("❓ Only documents older than N days (blank for any age): ").strip()
+            try:
+                older_than_days = float(days) if days else None
+            except ValueError:
+                print("❌ Invalid input")
+                continue
+            if collections:
+                clearer.purge_documents(collections, user_ids, older_than_days)
+            else:
+                print("❌ Invalid selection")
+        
+        elif choice == "9":
             print("👋 Goodbye!")
             break
         
         else:
             print("❌ Invalid choice")
+        
+        # Keep the metrics files current after every operation
+        write_metrics(args, job="clear")
+    
+    write_metrics(args, job="clear")
+    tracer.close()
 
 if __name__ == "__main__":
     main()
@@ -1,104 +1,439 @@
 #!/usr/bin/env python3
 """
-Firebase Index Creation Script
-This script creates the required Firestore indexes for the quiz app
+Firebase Index Advisor
+Derive the composite indexes the app's queries need from src/services/*.js,
+write them to firestore.indexes.json and diff them against what is declared
 """
 
+import glob
+import json
 import os
+import re
 import sys
-import json
-import time
-from typing import Dict, List, Any
-
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    from google.cloud import firestore as firestore_client
-except ImportError:
-    print("❌ Firebase Admin SDK not installed!")
-    print("📦 Install it with: pip install firebase-admin")
-    sys.exit(1)
-
-def create_firebase_indexes():
-    """Create required Firebase indexes"""
-    try:
-        # Check if service account file exists
-        if not os.path.exists('serviceAccountKey.json'):
-            print("❌ Service account key not found!")
-            print("📁 Please place 'serviceAccountKey.json' in the current directory")
-            return False
-        
-        # Initialize Firebase
-        cred = credentials.Certificate('serviceAccountKey.json')
-        app = firebase_admin.initialize_app(cred)
-        db = firestore.client()
-        
-        print("✅ Connected to Firebase!")
-        
-        # Define required indexes
-        indexes = [
-            {
-                "collection": "activities",
-                "fields": [
-                    {"field": "userId", "order": "ASCENDING"},
-                    {"field": "timestamp", "order": "DESCENDING"}
-                ]
-            },
-            {
-                "collection": "transactions", 
-                "fields": [
-                    {"field": "userId", "order": "ASCENDING"},
-                    {"field": "timestamp", "order": "DESCENDING"}
-                ]
-            },
-            {
-                "collection": "tasks",
-                "fields": [
-                    {"field": "type", "order": "ASCENDING"},
-                    {"field": "status", "order": "ASCENDING"}
-                ]
-            },
-            {
-                "collection": "tournaments",
-                "fields": [
-                    {"field": "status", "order": "ASCENDING"},
-                    {"field": "startDate", "order": "ASCENDING"}
-                ]
-            }
-        ]
-        
-        print("📋 Required indexes:")
-        for index in indexes:
-            print(f"  📁 {index['collection']}: {', '.join([f['field'] for f in index['fields']])}")
-        
-        print("\n💡 Note: Firebase indexes are created automatically when you run queries.")
-        print("   The errors you're seeing are normal for new collections.")
-        print("   Firebase will create the indexes automatically when needed.")
-        
-        print("\n🔧 To create indexes manually:")
-        print("1. Go to Firebase Console: https://console.firebase.google.com/")
-        print("2. Select your project: quiz-app-81036")
-        print("3. Go to Firestore Database → Indexes")
-        print("4. Click 'Create Index'")
-        print("5. Add the required composite indexes")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return False
+from typing import Any, Dict, List, Optional, Tuple
+
+from clear_firebase_data import USER_DATA_COLLECTIONS
+from firebase_dedup import QUESTIONS_COLLECTION
+from firebase_rollup import ROLLUPS
+from firebase_schema import change_field_for, time_field_for, user_fields_for
+from prune_firebase_data import DEFAULT_RETENTION_POLICIES
+
+DEFAULT_SOURCE_PATTERNS = ["src/services/*.js"]
+DEFAULT_INDEXES_FILE = "firestore.indexes.json"
+
+# Collections whose change feed the leaderboard materializer follows
+LEADERBOARD_SOURCES = ['users', 'quiz_sessions']
+
+# Indexes this script used to print before it could derive them; used as the
+# declared set until a firestore.indexes.json exists
+LEGACY_INDEXES = [
+    {"collectionGroup": "activities", "queryScope": "COLLECTION",
+     "fields": [{"fieldPath": "userId", "order": "ASCENDING"},
+                {"fieldPath": "timestamp", "order": "DESCENDING"}]},
+    {"collectionGroup": "transactions", "queryScope": "COLLECTION",
+     "fields": [{"fieldPath": "userId", "order": "ASCENDING"},
+                {"fieldPath": "timestamp", "order": "DESCENDING"}]},
+    {"collectionGroup": "tasks", "queryScope": "COLLECTION",
+     "fields": [{"fieldPath": "type", "order": "ASCENDING"},
+                {"fieldPath": "status", "order": "ASCENDING"}]},
+    {"collectionGroup": "tournaments", "queryScope": "COLLECTION",
+     "fields": [{"fieldPath": "status", "order": "ASCENDING"},
+                {"fieldPath": "startDate", "order": "ASCENDING"}]}
+]
+
+EQUALITY_OPERATORS = {'==', 'in'}
+ARRAY_OPERATORS = {'array-contains', 'array-contains-any'}
+RANGE_OPERATORS = {'<', '<=', '>', '>=', '!=', 'not-in'}
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+CONTAINS = "CONTAINS"
+
+CONDITION_PATTERN = re.compile(
+    r"\{\s*field:\s*(['\"])([\w.]+)\1\s*,\s*operator:\s*(['\"])([^'\"]+)\3")
+WHERE_PATTERN = re.compile(r"\bwhere\(\s*(['\"])([\w.]+)\1\s*,\s*(['\"])([^'\"]+)\3")
+ORDER_BY_PATTERN = re.compile(r"\borderBy\(\s*(['\"])([\w.]+)\1(?:\s*,\s*(['\"])(\w+)\3)?")
+COLLECTIONS_MAP_PATTERN = re.compile(r"this\.collections\s*=\s*\{([^}]*)\}")
+METHOD_PATTERN = re.compile(r"^  (?:async\s+)?\w+\s*\([^)]*\)\s*\{", re.MULTILINE)
+
+# An index field is (field path, ASCENDING/DESCENDING/CONTAINS)
+IndexFields = Tuple[Tuple[str, str], ...]
+
+
+def _closing_paren(text: str, start: int) -> int:
+    """Return the index of the bracket closing the one at start, skipping strings"""
+    depth = 0
+    quote = None
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return len(text)
+
+
+def _split_arguments(text: str) -> List[str]:
+    """Split a call's argument text on top-level commas"""
+    arguments = []
+    depth = 0
+    quote = None
+    current = []
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote and text[i - 1] != "\\":
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            arguments.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if "".join(current).strip():
+        arguments.append("".join(current).strip())
+    return arguments
+
+
+def _string_literal(text: str) -> Optional[str]:
+    match = re.fullmatch(r"(['\"])(.*)\1", text.strip())
+    return match.group(2) if match else None
+
+
+def _direction(text: Optional[str]) -> str:
+    return DESCENDING if text and text.lower() == "desc" else ASCENDING
+
+
+def load_collection_names(paths: List[str]) -> Dict[str, str]:
+    """Read the this.collections = {...} alias map used by firebaseService.js"""
+    names = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for block in COLLECTIONS_MAP_PATTERN.findall(f.read()):
+                for alias, name in re.findall(r"(\w+)\s*:\s*['\"]([^'\"]+)['\"]", block):
+                    names[alias] = name
+    return names
+
+
+def _collection_name(text: str, aliases: Dict[str, str]) -> Optional[str]:
+    literal = _string_literal(text)
+    if literal is not None:
+        return literal
+    match = re.fullmatch(r"this\.collections\.(\w+)", text.strip())
+    if match:
+        return aliases.get(match.group(1))
+    return None
+
+
+def _shape(collection_name: str, conditions: List[Tuple[str, str]], order: List[Tuple[str, str]],
+           location: str, **extra: Any) -> Dict[str, Any]:
+    shape = {'collection': collection_name, 'conditions': conditions, 'order': order,
+             'location': location, 'optional_conditions': False, 'client_sorted': False}
+    shape.update(extra)
+    return shape
+
+
+def scan_source(path: str, aliases: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Find the query shapes issued by one JavaScript file
+
+    Recognizes firebaseService.queryCollection(collection, conditions,
+    orderField, direction, limit) calls and direct query(collection(db, ...),
+    where(...), orderBy(...)) calls. Conditions passed as a variable are
+    taken from the {field, operator} objects built earlier in the same
+    method and treated as optional, since they are usually pushed behind ifs.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    shapes = []
+    name = os.path.basename(path)
+
+    for match in re.finditer(r"\bqueryCollection\(", text):
+        open_at = match.end() - 1
+        arguments = _split_arguments(text[open_at + 1:_closing_paren(text, open_at)])
+        if not arguments or text[max(0, match.start() - 6):match.start()] == "async ":
+            continue
+        collection_name = _collection_name(arguments[0], aliases)
+        if collection_name is None:
+            continue
+        location = f"{name}:{text.count(chr(10), 0, match.start()) + 1}"
+
+        optional = False
+        conditions_text = arguments[1] if len(arguments) > 1 else "[]"
+        if not conditions_text.startswith("["):
+            # A conditions variable: collect what the enclosing method builds
+            methods = [m.start() for m in METHOD_PATTERN.finditer(text, 0, match.start())]
+            conditions_text = text[methods[-1] if methods else 0:match.start()]
+            optional = True
+        conditions = [(field, operator) for _, field, _, operator in CONDITION_PATTERN.findall(conditions_text)]
+
+        order = []
+        order_field = _string_literal(arguments[2]) if len(arguments) > 2 else None
+        if order_field:
+            order.append((order_field, _direction(_string_literal(arguments[3]) if len(arguments) > 3 else None)))
+        # queryCollection only sends orderBy without conditions; otherwise it sorts after the limit
+        shapes.append(_shape(collection_name, conditions, order, location, optional_conditions=optional,
+                             client_sorted=bool(order and conditions)))
+
+    for match in re.finditer(r"\bquery\(\s*collection\(\s*db\s*,\s*", text):
+        open_at = text.index("(", match.start())
+        body = text[open_at + 1:_closing_paren(text, open_at)]
+        arguments = _split_arguments(body)
+        inner = re.fullmatch(r"collection\(\s*db\s*,\s*(.+)\)", arguments[0], re.DOTALL)
+        collection_name = _collection_name(inner.group(1), aliases) if inner else None
+        if collection_name is None:
+            continue
+        conditions = [(field, operator) for _, field, _, operator in WHERE_PATTERN.findall(body)]
+        order = [(field, _direction(direction)) for _, field, _, direction in ORDER_BY_PATTERN.findall(body)]
+        location = f"{name}:{text.count(chr(10), 0, match.start()) + 1}"
+        shapes.append(_shape(collection_name, conditions, order, location))
+    return shapes
+
+
+def scan_sources(patterns: List[str] = None) -> List[Dict[str, Any]]:
+    """Scan every file matching the glob patterns and return their query shapes"""
+    paths = sorted({path for pattern in (patterns or DEFAULT_SOURCE_PATTERNS)
+                    for path in glob.glob(pattern, recursive=True)})
+    aliases = load_collection_names(paths)
+    return [shape for path in paths for shape in scan_source(path, aliases)]
+
+
+def tool_query_shapes() -> List[Dict[str, Any]]:
+    """
+    Return the query shapes issued by the Python tools, which the source scan cannot see
+
+    A purge by user and age filters a user field with 'in' and the time
+    field with '<', newest first, so it needs (user field, time field desc)
+    on every user data collection. Pruning and the rollup, leaderboard and
+    dedup change feeds range over a single field and need no composite
+    index; they are listed so --verbose shows every query the tools issue.
+    """
+    shapes = []
+    for collection_name in USER_DATA_COLLECTIONS:
+        time_field, _ = time_field_for(collection_name)
+        for user_field in user_fields_for(collection_name):
+            shapes.append(_shape(collection_name, [(user_field, 'in'), (time_field, '<')],
+                                 [(time_field, DESCENDING)], "clear_firebase_data.py:purge_documents"))
+    for collection_name in DEFAULT_RETENTION_POLICIES:
+        time_field, _ = time_field_for(collection_name)
+        shapes.append(_shape(collection_name, [(time_field, '<')], [(time_field, ASCENDING)],
+                             "prune_firebase_data.py:prune_collection"))
+    change_feeds = {collection_name: "firebase_rollup.py:changes_query"
+                    for rollup in ROLLUPS.values() for collection_name in rollup['sources']}
+    change_feeds.update((collection_name, "firebase_leaderboard.py:read_source")
+                        for collection_name in LEADERBOARD_SOURCES if collection_name not in change_feeds)
+    change_feeds.setdefault(QUESTIONS_COLLECTION, "firebase_dedup.py:read_questions")
+    for collection_name, location in change_feeds.items():
+        change_field, _ = change_field_for(collection_name)
+        shapes.append(_shape(collection_name, [(change_field, '>')], [(change_field, ASCENDING)], location))
+    return shapes
+
+
+def indexes_for_shape(shape: Dict[str, Any]) -> List[IndexFields]:
+    """
+    Return the composite indexes one query shape needs (empty if single-field indexes suffice)
+
+    Equality and array-contains filters alone are served by merging
+    single-field indexes, and so is a single orderBy or a range filter on
+    one field. Equality filters combined with a sort are also served by
+    merging, as long as every equality field has its own (field, sort...)
+    index, so each equality field gets one instead of one index per
+    combination of filters. A range filter needs one index holding every
+    filtered field, with the range field first among the sorted ones.
+    """
+    equality = sorted({field for field, operator in shape['conditions'] if operator in EQUALITY_OPERATORS})
+    arrays = sorted({field for field, operator in shape['conditions'] if operator in ARRAY_OPERATORS})
+    ranges = [field for field, operator in shape['conditions'] if operator in RANGE_OPERATORS]
+
+    tail = list(shape['order'])
+    if ranges:
+        # Firestore requires the first sort to be on the range field
+        range_field = ranges[0]
+        direction = next((d for field, d in tail if field == range_field), ASCENDING)
+        tail = [(range_field, direction)] + [(field, d) for field, d in tail if field != range_field]
+    tail = [(field, direction) for field, direction in tail if field not in equality]
+
+    if not tail or (len(tail) == 1 and not equality and not arrays):
+        return []
+    if ranges:
+        return [tuple([(field, ASCENDING) for field in equality] + [(field, CONTAINS) for field in arrays] + tail)]
+    if not equality and not arrays:
+        return [tuple(tail)]
+    return ([tuple([(field, ASCENDING)] + tail) for field in equality]
+            + [tuple([(field, CONTAINS)] + tail) for field in arrays])
+
+
+def _serves(index: IndexFields, needed: IndexFields) -> bool:
+    """An index serves every query its field-list prefixes serve"""
+    return index[:len(needed)] == needed
+
+
+def merge_indexes(indexes: List[Tuple[str, IndexFields]]) -> List[Tuple[str, IndexFields]]:
+    """Drop duplicates and indexes that are a prefix of a longer index on the same collection"""
+    kept: List[Tuple[str, IndexFields]] = []
+    for collection_name, fields in sorted(set(indexes), key=lambda item: (item[0], -len(item[1]), item[1])):
+        if not any(kept_collection == collection_name and _serves(kept_fields, fields)
+                   for kept_collection, kept_fields in kept):
+            kept.append((collection_name, fields))
+    return sorted(kept)
+
+
+def to_index_json(collection_name: str, fields: IndexFields) -> Dict[str, Any]:
+    """Format one index the way firestore.indexes.json declares it"""
+    return {
+        'collectionGroup': collection_name,
+        'queryScope': "COLLECTION",
+        'fields': [{'fieldPath': field, 'arrayConfig': CONTAINS} if mode == CONTAINS
+                   else {'fieldPath': field, 'order': mode} for field, mode in fields]
+    }
+
+
+def from_index_json(index: Dict[str, Any]) -> Tuple[str, IndexFields]:
+    """Parse one firestore.indexes.json entry"""
+    fields = tuple((field['fieldPath'], field.get('order') or field.get('arrayConfig', ASCENDING))
+                   for field in index['fields'])
+    return index['collectionGroup'], fields
+
+
+def load_declared(path: str) -> Tuple[List[Tuple[str, IndexFields]], Dict[str, Any]]:
+    """Return the declared indexes and the raw file (the legacy list if the file does not exist)"""
+    if not os.path.exists(path):
+        return [from_index_json(index) for index in LEGACY_INDEXES], {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [from_index_json(index) for index in data.get('indexes', [])], data
+
+
+def describe(fields: IndexFields) -> str:
+    return ", ".join(f"{field} {mode.lower()}" for field, mode in fields)
+
+
+def advise_indexes(patterns: List[str] = None, declared_path: str = DEFAULT_INDEXES_FILE,
+                   include_client_sorted: bool = False) -> Dict[str, Any]:
+    """
+    Scan the sources and compare the indexes they need with the declared ones
+
+    The Python tools' own queries (tool_query_shapes) always count as
+    required, so regenerating the file never drops the purge indexes.
+    Returns a report with 'required' (merged), 'sort_indexes' (what the
+    client-sorted queries would need to sort server-side), 'missing',
+    'unused' and 'shapes' (every query found, with the indexes it needs).
+    With include_client_sorted the sort indexes count as required.
+    """
+    shapes = scan_sources(patterns) + tool_query_shapes()
+    needed: List[Tuple[str, IndexFields]] = []
+    sort_needed: List[Tuple[str, IndexFields]] = []
+    for shape in shapes:
+        if shape['client_sorted']:
+            shape['indexes'] = indexes_for_shape(dict(shape, order=[]))
+            shape['sort_indexes'] = [fields for fields in indexes_for_shape(shape)
+                                     if fields not in shape['indexes']]
+        else:
+            shape['indexes'] = indexes_for_shape(shape)
+            shape['sort_indexes'] = []
+        needed.extend((shape['collection'], fields) for fields in shape['indexes'])
+        sort_needed.extend((shape['collection'], fields) for fields in shape['sort_indexes'])
+
+    required = merge_indexes(needed + sort_needed if include_client_sorted else needed)
+    declared, existing = load_declared(declared_path)
+    missing = [(c, fields) for c, fields in required
+               if not any(dc == c and _serves(declared_fields, fields) for dc, declared_fields in declared)]
+    unused = [(c, fields) for c, fields in declared
+              if not any(nc == c and _serves(fields, needed_fields) for nc, needed_fields in needed + sort_needed)]
+    return {'shapes': shapes, 'required': required, 'sort_indexes': merge_indexes(sort_needed),
+            'declared': declared, 'missing': missing, 'unused': unused, 'existing': existing}
+
+
+def write_indexes_file(path: str, report: Dict[str, Any]):
+    """Write the required indexes, keeping any fieldOverrides already in the file"""
+    data = {
+        'indexes': [to_index_json(collection_name, fields) for collection_name, fields in report['required']],
+        'fieldOverrides': report['existing'].get('fieldOverrides', [])
+    }
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+
+def print_report(report: Dict[str, Any], verbose: bool = False):
+    """Print the query shapes found and the index diff"""
+    shapes = report['shapes']
+    print(f"🔎 Found {len(shapes)} queries on {len({s['collection'] for s in shapes})} collections")
+    for shape in shapes:
+        if not (verbose or shape['indexes'] or shape['sort_indexes'] or shape['client_sorted']):
+            continue
+        filters = " · ".join(f"{field} {operator}" for field, operator in shape['conditions']) or "no filters"
+        order = ", ".join(f"{field} {direction.lower()}" for field, direction in shape['order'])
+        optional = " (optional filters)" if shape['optional_conditions'] else ""
+        print(f"  📄 {shape['location']} {shape['collection']}: {filters}{optional}"
+              + (f" ordered by {order}" if order else ""))
+        for fields in shape['indexes']:
+            print(f"      🧩 needs ({describe(fields)})")
+        for fields in shape['sort_indexes']:
+            print(f"      💡 would need ({describe(fields)}) to sort server-side")
+        if shape['client_sorted']:
+            print("      ⚠️ sorted client-side after the query; any limit applies before the sort")
+
+    print(f"\n📋 Required composite indexes: {len(report['required'])}")
+    for collection_name, fields in report['required']:
+        print(f"  📁 {collection_name}: {describe(fields)}")
+    if report['sort_indexes']:
+        print(f"💡 Indexes that would let client-sorted queries sort server-side: {len(report['sort_indexes'])}")
+        for collection_name, fields in report['sort_indexes']:
+            marker = "📁" if (collection_name, fields) in report['required'] else "💡"
+            print(f"  {marker} {collection_name}: {describe(fields)}")
+    print(f"\n➕ Missing from the declared indexes: {len(report['missing'])}")
+    for collection_name, fields in report['missing']:
+        print(f"  ➕ {collection_name}: {describe(fields)}")
+    print(f"➖ Declared but not needed by any scanned query: {len(report['unused'])}")
+    for collection_name, fields in report['unused']:
+        print(f"  ➖ {collection_name}: {describe(fields)}")
+
+
+def create_firebase_indexes(patterns: List[str] = None, declared_path: str = DEFAULT_INDEXES_FILE,
+                            output_path: Optional[str] = DEFAULT_INDEXES_FILE, check: bool = False,
+                            include_client_sorted: bool = False, verbose: bool = False) -> bool:
+    """
+    Derive the required indexes, print the diff and write firestore.indexes.json
+
+    With check=True nothing is written and the result is False when indexes
+    are missing, for use in CI. include_client_sorted also declares the
+    indexes queryCollection would need to stop sorting in memory. Deploy the written file with
+    `firebase deploy --only firestore:indexes`.
+    """
+    report = advise_indexes(patterns, declared_path, include_client_sorted)
+    print_report(report, verbose)
+    if check:
+        return not report['missing']
+    if output_path:
+        write_indexes_file(output_path, report)
+        print(f"\n💾 Wrote {len(report['required'])} indexes to {output_path}")
+        print("🚀 Deploy them with: firebase deploy --only firestore:indexes")
+    return True
+
 
 def main():
-    """Main function"""
-    print("🔧 Firebase Index Creation Tool")
-    print("=" * 40)
-    
-    success = create_firebase_indexes()
-    
-    if success:
-        print("\n✅ Index creation process completed!")
-        print("💡 The app will work without indexes, but queries may be slower.")
-        print("   Firebase will create indexes automatically when you run queries.")
+    """Main function; same as `manage_firebase_data.py indexes`"""
+    # Imported here because the CLI imports create_firebase_indexes from this module
+    from manage_firebase_data import main as manage_main
+
+    return manage_main(["indexes", *sys.argv[1:]])
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Firebase Export Script
+Back up Firestore collections to compressed NDJSON shards on local disk,
+either as one-off full exports or as nightly incremental snapshots
+"""
+
+import sys
+
+from manage_firebase_data import main as manage_main
+
+
+def main():
+    """Main function; same as `manage_firebase_data.py export`"""
+    return manage_main(["export", *sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Firebase Anti-Cheat Scoring
+Score every user's whole quiz_sessions history at once with NumPy and publish
+one risk document per flagged user to security_flags
+"""
+
+import sys
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from firebase_metrics import tracer
+from firebase_rate_control import AdaptiveRateController
+from firebase_rollup import STATS_COLLECTION
+from firebase_schema import epoch_seconds, to_iso_string
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter, ThroughputMeter, iter_query_pages
+
+# Bound by _load_numpy, so importing the CLI (and --help) doesn't load NumPy
+np = None
+
+SECURITY_FLAGS_COLLECTION = "security_flags"
+
+# `kind` of the per-user documents written here, next to the event flags the app creates
+RISK_KIND = "risk_score"
+
+# Summary document in the stats collection, read by quizSecurityService
+RISK_STATS = "risk"
+
+SESSION_FIELDS = ['userId', 'startedAt', 'completedAt', 'totalTime', 'score']
+
+# Thresholds from quizSecurityService.securityRules / detectSuspiciousPatterns
+MIN_SESSIONS = 5
+RAPID_SESSION_SECONDS = 30
+MIN_SECONDS_BETWEEN_QUIZZES = 30
+MAX_HOURLY_QUIZZES = 3
+MAX_DAILY_QUIZZES = 10
+HIGH_SCORE = 95
+PERFECT_SCORE = 100
+
+# Every pattern only looks at each user's latest sessions, like detectSuspiciousPatterns,
+# so old history neither flags nor dilutes a user
+RECENT_SESSIONS = 10
+MIN_RAPID_SESSIONS = 3
+MIN_PERFECT_SCORES = 3
+MIN_HIGH_SCORES = 5
+
+# Pattern name -> (message shown to the client, points added to the risk score). Each of
+# detectSuspiciousPatterns' own patterns reaches `medium` alone, which the client blocks on;
+# rate-limit breaches only add up to that together with something else.
+PATTERNS = {
+    'rapid': ('Rapid quiz completion detected', 40),
+    'perfect': ('Multiple perfect scores detected', 40),
+    'high': ('Consistently high scores detected', 40),
+    'hourly': ('Hourly quiz limit exceeded', 15),
+    'daily': ('Daily quiz limit exceeded', 15),
+    'spacing': ('Quizzes started less than 30 seconds apart', 10)
+}
+
+# Lowest risk score per severity, highest first
+SEVERITIES = [('high', 70), ('medium', 40), ('low', 1)]
+
+
+def risk_document_id(user_id: str) -> str:
+    """ID of a user's risk document in security_flags"""
+    return f"risk-{user_id}"
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            print("❌ NumPy not installed!")
+            print("📦 Install it with: pip install numpy")
+            sys.exit(1)
+        np = numpy
+
+
+def severity_for(score: float) -> Optional[str]:
+    for severity, lowest in SEVERITIES:
+        if score >= lowest:
+            return severity
+    return None
+
+
+class SessionColumns:
+    def __init__(self):
+        """
+        quiz_sessions held column by column
+
+        Sessions are appended into typed arrays (8 bytes per value instead of
+        a dict per document) and handed to NumPy without copying. userIds are
+        stored once and referenced by index.
+        """
+        self.user_ids: List[str] = []
+        self._user_index: Dict[str, int] = {}
+        self.user = array('q')
+        self.started = array('d')
+        self.duration = array('d')
+        self.score = array('d')
+
+    def __len__(self) -> int:
+        return len(self.user)
+
+    def append(self, data: Dict[str, Any]):
+        user_id = data.get('userId')
+        if not isinstance(user_id, str):
+            return
+        index = self._user_index.get(user_id)
+        if index is None:
+            index = self._user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        started = epoch_seconds(data.get('startedAt'))
+        duration = epoch_seconds(data.get('completedAt')) - started
+        if duration != duration and isinstance(data.get('totalTime'), (int, float)):
+            duration = data['totalTime'] / 1000
+        score = data.get('score')
+        self.user.append(index)
+        self.started.append(started)
+        self.duration.append(duration)
+        self.score.append(score if isinstance(score, (int, float)) and not isinstance(score, bool)
+                          else float("nan"))
+
+    def arrays(self) -> Tuple[Any, Any, Any, Any]:
+        """(user index, start seconds, duration seconds, score) as NumPy arrays"""
+        return (np.frombuffer(self.user, dtype=np.int64),
+                np.frombuffer(self.started, dtype=np.float64),
+                np.frombuffer(self.duration, dtype=np.float64),
+                np.frombuffer(self.score, dtype=np.float64))
+
+
+def _window_peaks(user, started, users: int, seconds: float, ending=None):
+    """
+    Most sessions each user started within any `seconds` window (user, started sorted)
+
+    With an `ending` mask only windows that end at one of those sessions
+    count; the sessions before it in the window count whatever the mask.
+    """
+    _load_numpy()
+    peaks = np.zeros(users)
+    known = np.isfinite(started)
+    ending = known if ending is None else known & ending
+    user, started, ending = user[known], started[known], ending[known]
+    if len(user) == 0:
+        return peaks
+    # One sorted key for all users: each user's sessions sit in their own range,
+    # further apart than the window, so one searchsorted covers every user at once
+    offset = started - started.min()
+    keys = user * (offset.max() + 2 * seconds + 1) + offset
+    counts = np.arange(len(keys)) - np.searchsorted(keys, keys - seconds, side='right') + 1
+    np.maximum.at(peaks, user[ending], counts[ending])
+    return peaks
+
+
+def session_features(user, started, duration, score, users: int) -> Dict[str, Any]:
+    """
+    Per-user features, as arrays indexed by user
+
+    Sessions are sorted once by (user, start time); everything else is
+    bincount/ufunc.at reductions over that order, so the cost is one sort
+    plus a few linear passes whatever the number of users. The recent*
+    features only cover each user's last RECENT_SESSIONS sessions with a
+    start time: counts among them, and the rate-limit peaks and gaps of
+    windows ending at one of them. The other features cover the whole
+    history.
+    """
+    _load_numpy()
+    order = np.lexsort((started, user))
+    user, started, duration, score = user[order], started[order], duration[order], score[order]
+
+    sessions = np.bincount(user, minlength=users).astype(float)
+    first = np.concatenate(([0], np.cumsum(sessions)[:-1])).astype(np.int64)
+    timed = np.isfinite(duration)
+    timed_count = np.bincount(user, weights=timed, minlength=users)
+    rapid = timed & (duration < RAPID_SESSION_SECONDS)
+
+    # Sessions without a start time sort last in each user's block; of the rest,
+    # the last RECENT_SESSIONS positions are the user's latest sessions
+    known = np.isfinite(started)
+    known_count = np.bincount(user, weights=known, minlength=users).astype(np.int64)
+    position = np.arange(len(user)) - first[user]
+    recent = known & (position >= known_count[user] - RECENT_SESSIONS)
+
+    # Median duration: within each user's block, finite durations sort first
+    by_duration = np.lexsort((np.where(timed, duration, np.inf), user))
+    sorted_duration = np.where(timed, duration, np.inf)[by_duration]
+    has_timed = timed_count > 0
+    lower = first + np.maximum(timed_count - 1, 0).astype(np.int64) // 2
+    upper = first + timed_count.astype(np.int64) // 2
+    median = np.full(users, np.nan)
+    median[has_timed] = (sorted_duration[lower[has_timed]] + sorted_duration[upper[has_timed]]) / 2
+
+    scored = np.isfinite(score)
+    score_sum = np.bincount(user, weights=np.where(scored, score, 0), minlength=users)
+    scored_count = np.bincount(user, weights=scored, minlength=users)
+    high = scored & (score >= HIGH_SCORE)
+    perfect = scored & (score >= PERFECT_SCORE)
+    high_count = np.bincount(user, weights=high, minlength=users)
+
+    # Gaps between a recent start and the user's previous one
+    ends_gap = (user[1:] == user[:-1]) & recent[1:]
+    gaps = (started[1:] - started[:-1])[ends_gap]
+    min_gap = np.full(users, np.inf)
+    np.fmin.at(min_gap, user[1:][ends_gap], gaps)
+    last_started = np.full(users, np.nan)
+    np.fmax.at(last_started, user, started)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'sessions': sessions,
+            'recentSessions': np.bincount(user, weights=recent, minlength=users),
+            'recentRapid': np.bincount(user, weights=recent & rapid, minlength=users),
+            'recentPerfect': np.bincount(user, weights=recent & perfect, minlength=users),
+            'recentHigh': np.bincount(user, weights=recent & high, minlength=users),
+            'medianSeconds': median,
+            'averageScore': np.where(scored_count > 0, score_sum / scored_count, np.nan),
+            'highScores': high_count,
+            'recentMinSecondsBetween': min_gap,
+            'recentPeakHourly': _window_peaks(user, started, users, 3600, recent),
+            'recentPeakDaily': _window_peaks(user, started, users, 86400, recent),
+            'lastStarted': last_started,
+            'scoreSum': score_sum,
+            'scoredSessions': scored_count
+        }
+
+
+def risk_scores(features: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Risk score (0-100) per user and the boolean mask of each pattern
+
+    The patterns are detectSuspiciousPatterns' checks over the last ten
+    sessions, plus securityRules' rate limits as breached by one of those
+    sessions, so a user is flagged for what they do now and cleared once
+    they stop.
+    """
+    _load_numpy()
+    enough = features['recentSessions'] >= MIN_SESSIONS
+    hits = {
+        'rapid': enough & (features['recentRapid'] >= MIN_RAPID_SESSIONS),
+        'perfect': enough & (features['recentPerfect'] >= MIN_PERFECT_SCORES),
+        'high': enough & (features['recentHigh'] >= MIN_HIGH_SCORES),
+        'hourly': features['recentPeakHourly'] > MAX_HOURLY_QUIZZES,
+        'daily': features['recentPeakDaily'] > MAX_DAILY_QUIZZES,
+        'spacing': features['recentMinSecondsBetween'] < MIN_SECONDS_BETWEEN_QUIZZES
+    }
+    scores = np.zeros(len(features['sessions']))
+    for name, mask in hits.items():
+        scores += mask * PATTERNS[name][1]
+    return np.minimum(scores, 100), hits
+
+
+def _rounded(value: float, digits: int = 2) -> Optional[float]:
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+class RiskScorer:
+    def __init__(self, db, page_size: int = 1000, max_in_flight: int = 2, max_ops_per_second: float = 500,
+                 report_interval: float = 5.0):
+        """
+        Score all quiz sessions in bulk and publish per-user risk documents
+
+        Each run reads quiz_sessions once (four fields per document) into
+        columnar arrays and computes every user's features in vectorized
+        passes. Users with a non-zero score get security_flags/risk-<userId>;
+        documents of users who are no longer flagged are deleted; unchanged
+        ones are not rewritten. stats/risk records the run, so the client can
+        treat a missing risk document as a clean user.
+
+        Args:
+            db: Firestore client
+            page_size: Sessions read per query page
+            max_in_flight: Maximum number of concurrent batch commits
+            max_ops_per_second: Ceiling for the write rate
+            report_interval: Seconds between progress lines
+        """
+        _load_numpy()
+        self.db = db
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self.rate_controller = AdaptiveRateController(
+            initial_ops_per_second=min(max_ops_per_second, 100), max_ops_per_second=max_ops_per_second)
+        self.writer = PipelinedWriter(db, max_in_flight=max_in_flight, rate_controller=self.rate_controller)
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the scorer to exit after the current run"""
+        self._stop.set()
+
+    def load_sessions(self) -> SessionColumns:
+        """Read every quiz session into columns"""
+        columns = SessionColumns()
+        meter = ThroughputMeter("quiz_sessions", self.report_interval, icon="📥")
+        query = self.db.collection('quiz_sessions').select(SESSION_FIELDS).order_by(DOCUMENT_ID)
+        for snapshots in iter_query_pages(query, self.page_size):
+            for snapshot in snapshots:
+                columns.append(snapshot.to_dict() or {})
+            meter.add(len(snapshots))
+        return columns
+
+    def published(self) -> Dict[str, Tuple[float, List[str], int]]:
+        """Risk documents from the previous run: userId -> (score, patterns, sessions)"""
+        query = (self.db.collection(SECURITY_FLAGS_COLLECTION).where('kind', '==', RISK_KIND)
+                 .select(['userId', 'riskScore', 'patterns', 'sessions']))
+        previous = {}
+        for snapshots in iter_query_pages(query.order_by(DOCUMENT_ID), self.page_size):
+            for snapshot in snapshots:
+                data = snapshot.to_dict() or {}
+                if isinstance(data.get('userId'), str):
+                    previous[data['userId']] = (data.get('riskScore'), data.get('patterns'), data.get('sessions'))
+        return previous
+
+    def risk_documents(self, columns: SessionColumns, now: datetime) -> Tuple[Dict[str, Dict[str, Any]],
+                                                                                   Dict[str, Any]]:
+        """Risk document per flagged user, plus the run summary"""
+        users = len(columns.user_ids)
+        summary = {'sessions': len(columns), 'usersScored': users, 'flaggedUsers': 0,
+                   'highRiskUsers': 0, 'averageScore': 0, 'suspiciousSessions': 0, 'scoredAt': now, 'updatedAt': now}
+        if not users:
+            return {}, summary
+        features = session_features(*columns.arrays(), users)
+        scores, hits = risk_scores(features)
+        scored_sessions = features['scoredSessions'].sum()
+        summary.update(
+            flaggedUsers=int((scores > 0).sum()),
+            highRiskUsers=int((scores >= SEVERITIES[0][1]).sum()),
+            averageScore=round(float(features['scoreSum'].sum() / scored_sessions), 2) if scored_sessions else 0,
+            suspiciousSessions=int(features['highScores'].sum()))
+
+        documents = {}
+        for index in np.flatnonzero(scores > 0):
+            user_id = columns.user_ids[index]
+            patterns = [PATTERNS[name][0] for name, mask in hits.items() if mask[index]]
+            last_started = features['lastStarted'][index]
+            documents[user_id] = {
+                'kind': RISK_KIND,
+                'userId': user_id,
+                'riskScore': float(scores[index]),
+                'severity': severity_for(scores[index]),
+                'patterns': patterns,
+                'reason': "; ".join(patterns),
+                'sessions': int(features['sessions'][index]),
+                'features': {name: _rounded(features[name][index])
+                             for name in ('recentSessions', 'recentRapid', 'recentPerfect', 'recentHigh',
+                                          'recentMinSecondsBetween', 'recentPeakHourly', 'recentPeakDaily',
+                                          'medianSeconds', 'averageScore')},
+                'lastSessionAt': (to_iso_string(datetime.fromtimestamp(last_started, timezone.utc))
+                                  if np.isfinite(last_started) else None),
+                'timestamp': to_iso_string(now),
+                'updatedAt': now
+            }
+        return documents, summary
+
+    def run_once(self, dry_run: bool = False) -> Dict[str, int]:
+        """Score every user; return counts of flagged, written and cleared users"""
+        now = datetime.now(timezone.utc)
+        with tracer.span("firestore.anticheat") as span:
+            columns = self.load_sessions()
+            documents, summary = self.risk_documents(columns, now)
+            previous = self.published()
+            span.set_attribute("documents", len(columns))
+
+        flags = self.db.collection(SECURITY_FLAGS_COLLECTION)
+        changed = [(flags.document(risk_document_id(user_id)), data) for user_id, data in documents.items()
+                   if previous.get(user_id) != (data['riskScore'], data['patterns'], data['sessions'])]
+        cleared = [flags.document(risk_document_id(user_id)) for user_id in previous if user_id not in documents]
+        results = {'sessions': len(columns), 'users': summary['usersScored'], 'flagged': len(documents),
+                   'written': len(changed), 'cleared': len(cleared)}
+        if dry_run:
+            return results
+
+        written = self.writer.set_many(changed)
+        self.writer.delete_many(cleared).result()
+        written.result()
+        self.db.collection(STATS_COLLECTION).document(RISK_STATS).set(summary)
+        return results
+
+    def run_forever(self, interval: float = 3600.0, after_cycle: Optional[Callable[[], None]] = None):
+        """Rescore every interval seconds until stop() is called"""
+        print(f"🕵️ Scoring quiz_sessions every {interval:g}s")
+        while not self._stop.is_set():
+            try:
+                results = self.run_once()
+                print(f"✅ {results['flagged']} of {results['users']} users flagged "
+                      f"({results['written']} updated, {results['cleared']} cleared)")
+            except Exception as e:
+                print(f"  ❌ Error scoring sessions: {e}")
+            if after_cycle is not None:
+                after_cycle()
+            self._stop.wait(interval)
+        self.writer.close()
+        print("👋 Anti-cheat scorer stopped")
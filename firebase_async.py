@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Firebase Async Engine
+asyncio versions of the stats, clear and export operations, sharing one AsyncClient
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from clear_firebase_data import CLEAR_JOB
+from firebase_checkpoint import JobJournal
+from firebase_export import partition_queries, write_manifest
+from firebase_metrics import collection_label, document_collection, metrics, tracer
+from firebase_ndjson import ShardWriter, encode_document
+from firebase_rate_control import AdaptiveRateController, is_contention_error
+from firebase_streaming import DEFAULT_PAGE_SIZE, DOCUMENT_ID, ThroughputMeter, record_commit
+
+
+def _write_page(writer: ShardWriter, snapshots: List[Any]):
+    writer.write_lines([encode_document(snapshot) for snapshot in snapshots])
+
+
+class AsyncFirestoreEngine:
+    def __init__(self, db, page_size: int = DEFAULT_PAGE_SIZE, workers: int = 16,
+                 max_in_flight: int = 64, rate_controller: Optional[AdaptiveRateController] = None,
+                 report_interval: float = 5.0):
+        """
+        Run stats, clears and exports as coroutines on a single event loop
+
+        All operations share one AsyncClient, and with it one gRPC channel, so
+        hundreds of concurrent reads and commits cost a socket and a few
+        coroutines instead of a thread each. Two semaphores bound the work:
+        `workers` limits how many collections or partitions are read at once,
+        and `max_in_flight` limits concurrent batch commits, blocking the
+        readers once it is reached. Commits are paced by the same adaptive
+        rate controller as the threaded writer.
+
+        Use it as an async context manager. On exit, including when the
+        surrounding task is cancelled, commits already sent are awaited
+        before the client is closed, so no batch is abandoned mid-flight and
+        checkpoints never point past an uncommitted page.
+
+        Args:
+            db: google.cloud.firestore.AsyncClient
+            page_size: Documents per query page and batch commit (max 500)
+            workers: Collections or partitions processed at the same time
+            max_in_flight: Maximum number of concurrent batch commits
+            rate_controller: Write throttle (a default one is created if omitted)
+            report_interval: Seconds between docs/sec progress lines
+        """
+        self.db = db
+        self.page_size = min(page_size, DEFAULT_PAGE_SIZE)
+        self.workers = max(1, workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_controller = rate_controller or AdaptiveRateController()
+        self.report_interval = report_interval
+        self._worker_slots = asyncio.Semaphore(self.workers)
+        self._commit_slots = asyncio.Semaphore(self.max_in_flight)
+        self._pending: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "AsyncFirestoreEngine":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Wait for commits already sent, then close the client's channel"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        close = getattr(self.db, "close", None)
+        if close is not None:
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def _iter_pages(self, ordered_query, cursor: Optional[Dict[str, Any]] = None
+                          ) -> AsyncIterator[List[Any]]:
+        """Async counterpart of iter_query_pages: one limit() query per page"""
+        label = collection_label(ordered_query)
+        while True:
+            query = ordered_query.limit(self.page_size)
+            if cursor is not None:
+                query = query.start_after(cursor)
+
+            with tracer.span("firestore.read_page", collection=label) as span:
+                started_at = time.monotonic()
+                snapshots = [snapshot async for snapshot in query.stream()]
+                metrics.observe('firestore_page_read_seconds', time.monotonic() - started_at, collection=label)
+                span.set_attribute("documents", len(snapshots))
+            metrics.inc('firestore_page_reads_total', collection=label)
+            metrics.inc('firestore_documents_read_total', len(snapshots), collection=label)
+            if not snapshots:
+                return
+
+            yield snapshots
+
+            if len(snapshots) < self.page_size:
+                return
+            cursor = {DOCUMENT_ID: snapshots[-1].reference}
+
+    async def _commit(self, operations: List[tuple]) -> int:
+        """Commit one batch of (kind, reference, data, merge) operations with retries"""
+        label = document_collection(operations[0][1])
+        attempt = 0
+        with tracer.span("firestore.commit", collection=label, operations=len(operations)) as span:
+            while True:
+                delay = self.rate_controller.reserve(len(operations))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                batch = self.db.batch()
+                deletes = 0
+                for kind, ref, data, merge in operations:
+                    if kind == "delete":
+                        batch.delete(ref)
+                        deletes += 1
+                    else:
+                        batch.set(ref, data, merge=merge)
+                try:
+                    started_at = time.monotonic()
+                    await batch.commit()
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if not is_contention_error(e) or attempt > self.rate_controller.max_retries:
+                        metrics.inc('firestore_commit_errors_total', collection=label,
+                                    error=type(e).__name__)
+                        raise
+                    metrics.inc('firestore_retries_total', collection=label, error=type(e).__name__)
+                    delay = self.rate_controller.record_contention()
+                    metrics.set('firestore_target_ops_per_second', self.rate_controller.target_ops_per_second)
+                    await asyncio.sleep(delay)
+            seconds = time.monotonic() - started_at
+            span.set_attribute("retries", attempt)
+
+        record_commit(self.rate_controller, label, len(operations), deletes, seconds)
+        return len(operations)
+
+    def _release(self, task: asyncio.Task):
+        self._pending.discard(task)
+        self._commit_slots.release()
+
+    async def submit(self, operations: List[tuple]) -> List[asyncio.Task]:
+        """
+        Start committing operations, split into batches, and return one task per batch
+
+        Waits for a free commit slot before each batch, which is what
+        applies backpressure to the page readers.
+        """
+        batch_size = min(self.page_size, self.rate_controller.batch_size)
+        tasks = []
+        for i in range(0, len(operations), batch_size):
+            await self._commit_slots.acquire()
+            task = asyncio.create_task(self._commit(operations[i:i + batch_size]))
+            self._pending.add(task)
+            task.add_done_callback(self._release)
+            tasks.append(task)
+        return tasks
+
+    async def count_documents(self, collection_name: str) -> int:
+        """Count one collection with a server-side aggregation query"""
+        collection_ref = self.db.collection(collection_name)
+        async with self._worker_slots:
+            started_at = time.monotonic()
+            results = await collection_ref.count(alias="count").get()
+            metrics.observe('firestore_count_seconds', time.monotonic() - started_at,
+                            collection=collection_name)
+        return int(results[0][0].value)
+
+    async def _count_or_error(self, collection_name: str) -> int:
+        try:
+            return await self.count_documents(collection_name)
+        except Exception as e:
+            print(f"  ❌ Error getting stats for {collection_name}: {e}")
+            return -1
+
+    async def get_collection_stats(self, collections: List[str]) -> Dict[str, int]:
+        """Count every collection concurrently, returning -1 for collections that failed"""
+        print("📊 Getting database statistics...")
+        counts = await asyncio.gather(*(self._count_or_error(name) for name in collections))
+        stats = dict(zip(collections, counts))
+
+        for collection_name, count in stats.items():
+            if count >= 0:
+                print(f"  📁 {collection_name}: {count} documents")
+        print(f"📊 Total documents: {sum(count for count in stats.values() if count > 0)}")
+        return stats
+
+    async def discover_collections(self) -> List[str]:
+        """List root collection IDs without reading any documents"""
+        return sorted([collection_ref.id async for collection_ref in self.db.collections()])
+
+    async def delete_collection(self, collection_name: str, recursive: bool = False,
+                                checkpoint=None) -> int:
+        """
+        Delete every document in a collection and return the number deleted
+
+        Pages of keys are read while earlier pages are still committing. As
+        in StreamingDeleter, the checkpoint cursor only advances once every
+        earlier page has been committed.
+        """
+        collection_ref = self.db.collection(collection_name)
+        if recursive:
+            query = collection_ref.recursive().select([DOCUMENT_ID])
+        else:
+            query = collection_ref.select([DOCUMENT_ID]).order_by(DOCUMENT_ID)
+        cursor = None
+        if checkpoint is not None and checkpoint.cursor:
+            cursor = {DOCUMENT_ID: self.db.document(checkpoint.cursor)}
+            print(f"  ↩️ {collection_name}: resuming after {checkpoint.cursor} "
+                  f"({checkpoint.processed} documents already deleted)")
+
+        meter = ThroughputMeter(collection_name, self.report_interval)
+        pending = deque()
+
+        async def _finish_head():
+            tasks, last_ref = pending.popleft()
+            count = sum([await task for task in tasks])
+            meter.add(count)
+            if checkpoint is not None:
+                checkpoint.advance(last_ref.path, count)
+
+        with tracer.span("firestore.delete_collection", collection=collection_name, recursive=recursive) as span:
+            try:
+                async for snapshots in self._iter_pages(query, cursor):
+                    operations = [("delete", snapshot.reference, None, False) for snapshot in snapshots]
+                    pending.append((await self.submit(operations), snapshots[-1].reference))
+                    while pending and all(task.done() for task in pending[0][0]):
+                        await _finish_head()
+
+                while pending:
+                    await _finish_head()
+            except BaseException:
+                # Cancelled or failed: keep the progress of every page committed so far
+                if checkpoint is not None:
+                    checkpoint.flush()
+                raise
+            span.set_attribute("documents", meter.count)
+
+        if checkpoint is not None:
+            checkpoint.complete()
+        if meter.count:
+            print(f"  ⏱️ {collection_name}: {meter.count} documents in {meter.elapsed:.1f}s "
+                  f"({meter.rate:.0f} docs/sec)")
+        return meter.count
+
+    async def _clear_one(self, collection_name: str, recursive: bool,
+                         journal: Optional[JobJournal]) -> int:
+        checkpoint = None
+        if journal is not None:
+            checkpoint = journal.checkpoint(CLEAR_JOB, collection_name)
+            if checkpoint.done:
+                print(f"  ⏭️ {collection_name}: Cleared in the previous run "
+                      f"({checkpoint.processed} documents)")
+                return 0
+        try:
+            async with self._worker_slots:
+                deleted = await self.delete_collection(collection_name, recursive, checkpoint)
+        except Exception as e:
+            print(f"  ❌ Error clearing {collection_name}: {e}")
+            return -1
+
+        if deleted:
+            print(f"  ✅ {collection_name}: Cleared {deleted} documents")
+        else:
+            print(f"  📭 {collection_name}: Already empty")
+        return deleted
+
+    async def clear_collections(self, collections: List[str], recursive: bool = False,
+                                journal: Optional[JobJournal] = None,
+                                resume: bool = False) -> Dict[str, int]:
+        """Clear collections concurrently and return documents deleted per collection (-1 on error)"""
+        if journal is not None:
+            journal.start(CLEAR_JOB, resume=resume)
+        print(f"⚡ Async mode: {self.workers} collections at once, {self.max_in_flight} commits in flight")
+        counts = await asyncio.gather(*(self._clear_one(name, recursive, journal) for name in collections))
+        return dict(zip(collections, counts))
+
+    async def _export_partition(self, output_dir: str, collection_name: str, index: int,
+                                query, max_docs_per_shard: int) -> Dict[str, Any]:
+        """Stream one key range into its shards; encoding and gzip run off the event loop"""
+        writer = ShardWriter(os.path.join(output_dir, collection_name), f"part-{index:03d}",
+                             max_docs_per_shard)
+        meter = ThroughputMeter(f"{collection_name}#{index}", self.report_interval, icon="📦")
+        started_at = time.monotonic()
+        try:
+            async with self._worker_slots:
+                with tracer.span("firestore.export_partition", collection=collection_name,
+                                 partition=index) as span:
+                    async for snapshots in self._iter_pages(query):
+                        await asyncio.to_thread(_write_page, writer, snapshots)
+                        meter.add(len(snapshots))
+                    span.set_attribute("documents", writer.count)
+        except Exception as e:
+            print(f"  ❌ Error exporting {collection_name}#{index}: {e}")
+            return {'partition': index, 'documents': 0, 'shards': [], 'error': str(e)}
+        finally:
+            writer.close()
+        return {'partition': index, 'documents': writer.count, 'shards': writer.shards,
+                'seconds': round(time.monotonic() - started_at, 3)}
+
+    async def export_collections(self, collections: List[str], output_dir: str, partitions: int = 4,
+                                 max_docs_per_shard: int = 100_000) -> Dict[str, Any]:
+        """Export whole collections in the FirestoreExporter layout and return the manifest"""
+        print(f"📦 Exporting {len(collections)} collections to {output_dir} "
+              f"({partitions} partitions each, {self.workers} at once, async)")
+        os.makedirs(output_dir, exist_ok=True)
+        started_at = datetime.now(timezone.utc)
+        tasks = [(collection_name, index, query)
+                 for collection_name in collections
+                 for index, query in enumerate(partition_queries(self.db.collection(collection_name),
+                                                                 partitions))]
+        results = await asyncio.gather(*(self._export_partition(output_dir, collection_name, index,
+                                                                query, max_docs_per_shard)
+                                         for collection_name, index, query in tasks))
+        manifest = write_manifest(output_dir, "full", started_at,
+                                  list(zip([task[0] for task in tasks], results)))
+
+        for collection_name, entry in manifest['collections'].items():
+            print(f"  ✅ {collection_name}: {entry['documents']} documents exported")
+        total = sum(entry['documents'] for entry in manifest['collections'].values())
+        print(f"📦 Exported {total} documents")
+        return manifest
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Firebase Benchmarks
+Throughput, latency percentiles and peak memory of the admin tools and the app's hot queries
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from firebase_export import FirestoreExporter
+from firebase_import import EMULATOR_INITIAL_OPS_PER_SECOND, FirestoreImporter, emulator_host
+from firebase_rate_control import AdaptiveRateController
+from firebase_schema import to_iso_string
+from firebase_streaming import PipelinedWriter
+from firebase_synthetic import GENERATED_COLLECTIONS, SyntheticDataset, generate_dataset, user_id_for
+
+RESULTS_VERSION = 1
+
+# Fixed end of the synthetic activity window, so every run benchmarks the same data
+BENCHMARK_END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+GENERATED_MARKER = "generated.json"
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), int(round(q / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def reset_peak_rss():
+    """Reset the process's peak resident set size where the OS allows it (Linux)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB since the last reset, if known"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def reset_emulator(project_id: str, host: Optional[str] = None):
+    """Delete every document in the emulator's default database"""
+    host = host or emulator_host()
+    url = f"http://{host}/emulator/v1/projects/{project_id}/databases/(default)/documents"
+    urllib.request.urlopen(urllib.request.Request(url, method="DELETE")).close()
+
+
+def git_commit() -> Optional[str]:
+    """Commit the benchmarked code was checked out at, if this is a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LatencyRecorder:
+    def __init__(self):
+        """Collect latency samples (in seconds) from one or more threads"""
+        self.samples: List[float] = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def on_commit(self, operations: int, seconds: float):
+        """PipelinedWriter on_commit hook"""
+        self.record(seconds)
+
+    def time(self, func: Callable[[], Any]) -> Any:
+        """Call func, record how long it took and return its result"""
+        started_at = time.perf_counter()
+        result = func()
+        self.record(time.perf_counter() - started_at)
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        def _ms(value):
+            return round(value * 1000, 3) if value is not None else None
+        return {
+            'samples': len(self.samples),
+            'p50_ms': _ms(percentile(self.samples, 50)),
+            'p99_ms': _ms(percentile(self.samples, 99)),
+        }
+
+
+# Python replays of the app's queries: (db, user_id) -> documents read.
+# Each mirrors the service method named in its key, including its full reads.
+def _read_all(db, collection_name: str) -> int:
+    return sum(1 for _ in db.collection(collection_name).stream())
+
+
+def replay_get_house_stats(db, user_id: str) -> int:
+    """balanceService.getHouseStats: every bet and every user"""
+    return _read_all(db, 'bets') + _read_all(db, 'users')
+
+
+def replay_get_security_stats(db, user_id: str) -> int:
+    """quizSecurityService.getSecurityStats"""
+    recent = db.collection('quiz_sessions').order_by('startedAt', direction='DESCENDING').limit(100)
+    return (_read_all(db, 'users')
+            + len(db.collection('user_blocks').where('status', '==', 'active').get())
+            + _read_all(db, 'security_flags')
+            + len(recent.get()))
+
+
+def replay_get_tournament_stats(db, user_id: str) -> int:
+    """tournamentService.getTournamentStats: every tournament"""
+    return _read_all(db, 'tournaments')
+
+
+def replay_get_active_tournaments(db, user_id: str) -> int:
+    """tournamentService.getActiveTournaments (uncached)"""
+    return len(db.collection('tournaments').where('status', '==', 'active').get())
+
+
+def replay_get_user_tournaments(db, user_id: str) -> int:
+    """tournamentService.getUserTournaments"""
+    query = db.collection('tournaments').where('participants', 'array_contains', {'userId': user_id})
+    return len(query.get())
+
+
+def replay_check_daily_limit(db, user_id: str) -> int:
+    """quizSecurityService.checkDailyLimit: one user document"""
+    return int(db.collection('users').document(user_id).get().exists)
+
+
+def replay_check_hourly_limit(db, user_id: str) -> int:
+    """quizSecurityService.checkHourlyLimit, with 'now' at the end of the synthetic window"""
+    one_hour_ago = to_iso_string(BENCHMARK_END - timedelta(hours=1))
+    query = (db.collection('quiz_sessions')
+             .where('userId', '==', user_id)
+             .where('startedAt', '>=', one_hour_ago))
+    return len(query.get())
+
+
+def replay_get_user_betting_history(db, user_id: str) -> int:
+    """balanceService.getUserBettingHistory"""
+    return len(db.collection('bets').where('userId', '==', user_id).limit(50).get())
+
+
+def replay_get_transactions(db, user_id: str) -> int:
+    """firebaseService.getTransactions(userId)"""
+    return len(db.collection('transactions').where('userId', '==', user_id).get())
+
+
+# name -> (replay, reads whole collections)
+QUERY_REPLAYS = {
+    'getHouseStats': (replay_get_house_stats, True),
+    'getSecurityStats': (replay_get_security_stats, True),
+    'getTournamentStats': (replay_get_tournament_stats, True),
+    'getActiveTournaments': (replay_get_active_tournaments, False),
+    'getUserTournaments': (replay_get_user_tournaments, False),
+    'checkDailyLimit': (replay_check_daily_limit, False),
+    'checkHourlyLimit': (replay_check_hourly_limit, False),
+    'getUserBettingHistory': (replay_get_user_betting_history, False),
+    'getTransactions': (replay_get_transactions, False),
+}
+
+
+class FirestoreBenchmark:
+    def __init__(self, clearer, work_dir: str = "benchmarks", seed: int = 42,
+                 iterations: int = 50, scan_iterations: int = 3, workers: int = 8,
+                 max_in_flight: int = 32, processes: Optional[int] = None):
+        """
+        Benchmark the admin tools and query replays against the Firestore emulator
+
+        For every dataset size the emulator is wiped, a cached synthetic
+        dataset is imported, and then stats, the query replays, export and
+        clear run in that order, the clear leaving the emulator empty again.
+        Every scenario reports wall time, documents per second, p50/p99
+        latency of its unit of work and the process's peak RSS while it ran.
+
+        Args:
+            clearer: FirebaseDataClearer connected to the emulator
+            work_dir: Directory for cached datasets and temporary exports
+            seed: Seed for the synthetic datasets and the sampled user IDs
+            iterations: Calls per single-user query replay
+            scan_iterations: Calls per full-collection replay and stats run
+            workers: Parallel shards/partitions/collections for bulk paths
+            max_in_flight: Concurrent batch commits for bulk writes
+            processes: Processes used to generate datasets (default: CPU count)
+        """
+        self.clearer = clearer
+        self.db = clearer.db
+        self.work_dir = work_dir
+        self.seed = seed
+        self.iterations = iterations
+        self.scan_iterations = scan_iterations
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.processes = processes
+
+    def _measure(self, name: str, func: Callable[[LatencyRecorder], int]) -> Dict[str, Any]:
+        """Run one scenario and summarize it"""
+        recorder = LatencyRecorder()
+        reset_peak_rss()
+        started_at = time.perf_counter()
+        documents = func(recorder)
+        seconds = time.perf_counter() - started_at
+
+        result = {
+            'seconds': round(seconds, 3),
+            'documents': documents,
+            'docs_per_sec': round(documents / seconds, 1) if seconds > 0 else None,
+        }
+        result.update(recorder.summary())
+        result['peak_rss_mb'] = peak_rss_mb()
+        print(f"  ⏱️ {name}: {result['seconds']}s, {result['docs_per_sec']} docs/sec, "
+              f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, peak RSS {result['peak_rss_mb']} MiB")
+        return result
+
+    def dataset_dir(self, users: int) -> str:
+        """Generate (once) and return the NDJSON dataset for a size"""
+        directory = os.path.join(self.work_dir, "datasets",
+                                 f"seed{self.seed}-users{users}-{BENCHMARK_END:%Y%m%d}")
+        marker = os.path.join(directory, GENERATED_MARKER)
+        if not os.path.exists(marker):
+            shutil.rmtree(directory, ignore_errors=True)
+            dataset = SyntheticDataset(users, users // 100, seed=self.seed, end=BENCHMARK_END)
+            totals = generate_dataset(dataset, output_dir=directory, processes=self.processes)
+            with open(marker, "w", encoding="utf-8") as f:
+                json.dump(totals, f, indent=2)
+        return directory
+
+    def _bench_import(self, directory: str, recorder: LatencyRecorder) -> int:
+        writer = PipelinedWriter(self.db, max_in_flight=self.max_in_flight,
+                                 rate_controller=AdaptiveRateController(EMULATOR_INITIAL_OPS_PER_SECOND),
+                                 on_commit=recorder.on_commit)
+        try:
+            counts = FirestoreImporter(self.db, writer, workers=self.workers).import_directory(directory)
+        finally:
+            writer.close()
+        return sum(counts.values())
+
+    def _bench_stats(self, recorder: LatencyRecorder) -> int:
+        documents = 0
+        for _ in range(self.scan_iterations):
+            stats = recorder.time(self.clearer.get_collection_stats)
+            documents += sum(count for count in stats.values() if count > 0)
+        return documents
+
+    def _bench_query(self, replay, iterations: int, users: int, recorder: LatencyRecorder) -> int:
+        rng = random.Random(self.seed)
+        documents = 0
+        for _ in range(iterations):
+            user_id = user_id_for(rng.randrange(users))
+            documents += recorder.time(lambda: replay(self.db, user_id))
+        return documents
+
+    def _bench_export(self, recorder: LatencyRecorder) -> int:
+        directory = os.path.join(self.work_dir, "export")
+        shutil.rmtree(directory, ignore_errors=True)
+        exporter = FirestoreExporter(self.db, directory, workers=self.workers, partitions=self.workers)
+        try:
+            manifest = exporter.export_collections(GENERATED_COLLECTIONS)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        for entry in manifest['collections'].values():
+            for partition in entry['partitions']:
+                if 'seconds' in partition:
+                    recorder.record(partition['seconds'])
+        return sum(entry['documents'] for entry in manifest['collections'].values())
+
+    def _bench_clear(self, recorder: LatencyRecorder) -> int:
+        self.clearer.rate_controller = AdaptiveRateController(EMULATOR_INITIAL_OPS_PER_SECOND)
+        self.clearer.configure_concurrency(self.workers, self.max_in_flight)
+        self.clearer.writer.on_commit = recorder.on_commit
+        return sum(count for count in self.clearer.clear_collections(GENERATED_COLLECTIONS).values() if count > 0)
+
+    def run_size(self, users: int) -> Dict[str, Any]:
+        """Benchmark every scenario at one dataset size"""
+        print(f"\n🏁 Dataset: {users} users")
+        directory = self.dataset_dir(users)
+        with open(os.path.join(directory, GENERATED_MARKER), encoding="utf-8") as f:
+            generated = json.load(f)
+        reset_emulator(self.clearer.project_id)
+
+        scenarios = {}
+        scenarios['import'] = self._measure("import", lambda r: self._bench_import(directory, r))
+        scenarios['stats'] = self._measure("stats", self._bench_stats)
+        for name, (replay, scan) in QUERY_REPLAYS.items():
+            iterations = self.scan_iterations if scan else self.iterations
+            scenarios[f"query:{name}"] = self._measure(
+                f"query:{name}", lambda r: self._bench_query(replay, iterations, users, r))
+        scenarios['export'] = self._measure("export", self._bench_export)
+        scenarios['clear'] = self._measure("clear", self._bench_clear)
+        return {'users': users, 'documents': sum(generated.values()), 'scenarios': scenarios}
+
+    def run(self, sizes: List[int]) -> Dict[str, Any]:
+        """Benchmark every dataset size and return the results document"""
+        results = {
+            'version': RESULTS_VERSION,
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'emulator_host': emulator_host(),
+            'seed': self.seed,
+            'iterations': self.iterations,
+            'scan_iterations': self.scan_iterations,
+            'workers': self.workers,
+            'max_in_flight': self.max_in_flight,
+            'sizes': [self.run_size(users) for users in sizes],
+        }
+        results['finished_at'] = datetime.now(timezone.utc).isoformat()
+        return results
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print throughput and latency changes between two results documents"""
+    previous = {(size['users'], name): scenario
+                for size in baseline['sizes'] for name, scenario in size['scenarios'].items()}
+    print(f"\n📊 Compared with {baseline.get('git_commit') or baseline['started_at']}:")
+    for size in current['sizes']:
+        for name, scenario in size['scenarios'].items():
+            old = previous.get((size['users'], name))
+            if old is None:
+                continue
+            changes = []
+            for key, label in (('docs_per_sec', 'docs/sec'), ('p50_ms', 'p50'), ('p99_ms', 'p99')):
+                if old.get(key) and scenario.get(key) is not None:
+                    changes.append(f"{label} {100 * (scenario[key] / old[key] - 1):+.1f}%")
+            if changes:
+                print(f"  {size['users']:>9} users  {name:<28} " + ", ".join(changes))
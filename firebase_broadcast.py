@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Firebase Notification Fan-out
+Deliver broadcast requests from the broadcasts collection as one notification
+per user, streaming users page by page through rate-controlled bulk writes
+"""
+
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from firebase_checkpoint import JobJournal
+from firebase_metrics import tracer
+from firebase_rate_control import DEFAULT_INITIAL_OPS_PER_SECOND, AdaptiveRateController
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter, ThroughputMeter, iter_query_pages
+
+# Broadcast requests written by tournamentService.notifyAllUsers
+BROADCASTS_COLLECTION = "broadcasts"
+NOTIFICATIONS_COLLECTION = "notifications"
+
+# Job name used for per-broadcast checkpoints in the journal
+BROADCAST_JOB = "broadcast"
+
+# Broadcast status values: waiting, being delivered (or interrupted), delivered
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+
+
+def notification_id(broadcast_id: str, user_doc_id: str) -> str:
+    """
+    Stable document ID for one user's copy of a broadcast
+
+    Re-sending a page after a restart overwrites the same documents instead
+    of duplicating them. The ID is a hash rather than broadcastId_userId so
+    that a fan-out spreads its writes over the key space instead of
+    hot-spotting one key range.
+    """
+    return hashlib.sha1(f"{broadcast_id}/{user_doc_id}".encode("utf-8")).hexdigest()[:20]
+
+
+class BroadcastWorker:
+    def __init__(self, db, journal: JobJournal, page_size: int = 500, max_in_flight: int = 8,
+                 max_ops_per_second: float = 2000, initial_ops_per_second: float = DEFAULT_INITIAL_OPS_PER_SECOND,
+                 report_interval: float = 5.0):
+        """
+        Fan broadcasts out into per-user notification documents
+
+        Users are read one page of IDs at a time and each page becomes one
+        bulk write, with up to max_in_flight commits running while the next
+        page is read. Memory stays bounded by the pages in flight whatever
+        the number of users. Writes start at initial_ops_per_second and ramp
+        up (the 500/50/5 rule for a fresh key range) under the adaptive rate
+        controller, backing off on contention.
+
+        Progress is checkpointed per broadcast once every earlier page has
+        been committed, so an interrupted broadcast stays `sending` and the
+        next run resumes after the last confirmed user.
+
+        Args:
+            db: Firestore client
+            journal: Journal the per-broadcast checkpoints are kept in
+            page_size: Users read (and notifications written) per page
+            max_in_flight: Maximum number of concurrent batch commits
+            max_ops_per_second: Ceiling for the write rate
+            initial_ops_per_second: Starting write rate
+            report_interval: Seconds between progress lines
+        """
+        self.db = db
+        self.journal = journal
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self.rate_controller = AdaptiveRateController(
+            initial_ops_per_second=min(initial_ops_per_second, max_ops_per_second),
+            max_ops_per_second=max_ops_per_second)
+        self.writer = PipelinedWriter(db, page_size, max_in_flight=max_in_flight,
+                                      rate_controller=self.rate_controller)
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the worker to finish the pages in flight and exit"""
+        self._stop.set()
+
+    def pending_broadcasts(self) -> List[Any]:
+        """Interrupted broadcasts first, then new ones oldest first"""
+        broadcasts = self.db.collection(BROADCASTS_COLLECTION)
+        # Two equality queries sorted here, so no composite index is needed
+        interrupted = list(broadcasts.where('status', '==', SENDING).stream())
+        waiting = list(broadcasts.where('status', '==', PENDING).stream())
+
+        def created(snapshot) -> str:
+            return str((snapshot.to_dict() or {}).get('createdAt') or "")
+        return sorted(interrupted, key=created) + sorted(waiting, key=created)
+
+    def _notifications(self, broadcast_id: str, request: Dict[str, Any], users: List[Any]) -> List[tuple]:
+        now = datetime.now(timezone.utc)
+        collection_ref = self.db.collection(NOTIFICATIONS_COLLECTION)
+        items = []
+        for snapshot in users:
+            user_id = (snapshot.to_dict() or {}).get('userId') or snapshot.id
+            items.append((collection_ref.document(notification_id(broadcast_id, snapshot.id)), {
+                'userId': user_id,
+                'type': request.get('type'),
+                'data': request.get('data') or {},
+                'read': False,
+                'broadcastId': broadcast_id,
+                'createdAt': now,
+                'updatedAt': now
+            }))
+        return items
+
+    def send(self, broadcast) -> Optional[int]:
+        """Deliver one broadcast; return the number of notifications, or None if it stopped early"""
+        broadcast_id = broadcast.id
+        request = broadcast.to_dict() or {}
+        checkpoint = self.journal.checkpoint(BROADCAST_JOB, broadcast_id)
+        meter = ThroughputMeter(f"broadcast {broadcast_id}", self.report_interval, icon="📣")
+
+        cursor = None
+        if checkpoint.cursor:
+            cursor = {DOCUMENT_ID: self.db.document(checkpoint.cursor)}
+            print(f"  ↩️ {meter.label}: resuming after {checkpoint.cursor} "
+                  f"({checkpoint.processed} notifications already written)")
+        else:
+            broadcast.reference.set({'status': SENDING, 'startedAt': datetime.now(timezone.utc)}, merge=True)
+
+        pending = deque()
+
+        def _finish_head():
+            future, last_path = pending.popleft()
+            count = future.result()
+            meter.add(count)
+            checkpoint.advance(last_path, count)
+
+        query = self.db.collection('users').select(['userId']).order_by(DOCUMENT_ID)
+        try:
+            for users in iter_query_pages(query, self.page_size, cursor):
+                pending.append((self.writer.set_many(self._notifications(broadcast_id, request, users)),
+                                users[-1].reference.path))
+                while pending and pending[0][0].done():
+                    _finish_head()
+                if self._stop.is_set():
+                    break
+            while pending:
+                _finish_head()
+        except BaseException as e:
+            checkpoint.flush()
+            broadcast.reference.set({'status': SENDING, 'lastError': str(e)}, merge=True)
+            raise
+
+        if self._stop.is_set():
+            checkpoint.flush()
+            print(f"  ⏸️ {meter.label}: stopped after {checkpoint.processed} notifications")
+            return None
+
+        checkpoint.complete()
+        broadcast.reference.set({'status': SENT, 'recipients': checkpoint.processed,
+                                 'completedAt': datetime.now(timezone.utc)}, merge=True)
+        print(f"  ✅ {meter.label}: {checkpoint.processed} notifications in {meter.elapsed:.1f}s "
+              f"({meter.rate:.0f} docs/sec)")
+        return checkpoint.processed
+
+    def run_once(self) -> Dict[str, int]:
+        """Deliver every pending broadcast (-1 marks a broadcast that failed and will be retried)"""
+        results = {}
+        for broadcast in self.pending_broadcasts():
+            if self._stop.is_set():
+                break
+            try:
+                with tracer.span("firestore.broadcast", broadcast=broadcast.id) as span:
+                    sent = self.send(broadcast)
+                    span.set_attribute("documents", sent or 0)
+                if sent is not None:
+                    results[broadcast.id] = sent
+            except Exception as e:
+                print(f"  ❌ Error sending broadcast {broadcast.id}: {e}")
+                results[broadcast.id] = -1
+        return results
+
+    def run_forever(self, interval: float = 30.0, after_cycle: Optional[Callable[[], None]] = None):
+        """Poll for broadcast requests until stop() is called"""
+        print(f"📣 Watching {BROADCASTS_COLLECTION} every {interval:g}s")
+        while not self._stop.is_set():
+            results = {key: sent for key, sent in self.run_once().items() if sent >= 0}
+            if results:
+                stats = self.rate_controller.stats()
+                print(f"✅ Sent {len(results)} broadcasts, {sum(results.values())} notifications "
+                      f"(target {stats['target_ops_per_second']:.0f} ops/sec)")
+            if after_cycle is not None:
+                after_cycle()
+            self._stop.wait(interval)
+        self.writer.close()
+        print("👋 Broadcast worker stopped")
+
+
+def create_broadcast(db, notification_type: str, data: Dict[str, Any]) -> str:
+    """Queue a broadcast request the way tournamentService.notifyAllUsers does"""
+    now = datetime.now(timezone.utc)
+    ref = db.collection(BROADCASTS_COLLECTION).document()
+    ref.set({'type': notification_type, 'data': data, 'audience': 'all', 'status': PENDING,
+             'createdAt': now, 'updatedAt': now})
+    return ref.id
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Firebase Job Journal
+SQLite checkpoint file that lets long clear/migration jobs resume where they stopped
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_JOURNAL_PATH = "firebase_jobs.sqlite3"
+
+
+class JobJournal:
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        """
+        Open (or create) the checkpoint file
+
+        Each row tracks one unit of work, usually a collection, inside a named
+        job: the path of the last document fully processed, how many documents
+        were processed and whether the unit has finished.
+
+        Args:
+            path: Location of the SQLite checkpoint file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                job TEXT NOT NULL,
+                unit TEXT NOT NULL,
+                cursor TEXT,
+                processed INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'running',
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job, unit)
+            )
+        """)
+
+    def start(self, job: str, resume: bool = False):
+        """Begin a job, discarding its previous checkpoints unless resuming"""
+        if not resume:
+            with self._lock:
+                self._conn.execute("DELETE FROM checkpoints WHERE job = ?", (job,))
+
+    def load(self, job: str, unit: str) -> Optional[Dict[str, Any]]:
+        """Return the saved checkpoint for a unit of work, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cursor, processed, status, updated_at FROM checkpoints "
+                "WHERE job = ? AND unit = ?", (job, unit)).fetchone()
+        if row is None:
+            return None
+        return {'cursor': row[0], 'processed': row[1], 'status': row[2], 'updated_at': row[3]}
+
+    def save(self, job: str, unit: str, cursor: Optional[str], processed: int,
+             status: str = "running"):
+        """Record progress for a unit of work"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO checkpoints (job, unit, cursor, processed, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (job, unit) DO UPDATE SET cursor = excluded.cursor, "
+                "processed = excluded.processed, status = excluded.status, "
+                "updated_at = excluded.updated_at",
+                (job, unit, cursor, processed, status, time.time()))
+
+    def checkpoint(self, job: str, unit: str, save_interval: float = 1.0) -> "Checkpoint":
+        """Return a progress handle for one unit of work"""
+        return Checkpoint(self, job, unit, save_interval)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Checkpoint:
+    def __init__(self, journal: JobJournal, job: str, unit: str, save_interval: float = 1.0):
+        """
+        Progress handle for one unit of work inside a job
+
+        Progress is written at most once per save_interval. Resuming from a
+        slightly older cursor only repeats work that is idempotent (deleting
+        or rewriting the same documents), so no progress is lost.
+
+        Args:
+            journal: Journal the checkpoint is stored in
+            job: Job name, e.g. "clear"
+            unit: Unit of work within the job, usually a collection path
+            save_interval: Minimum seconds between writes to the journal
+        """
+        self.journal = journal
+        self.job = job
+        self.unit = unit
+        self.save_interval = save_interval
+
+        saved = journal.load(job, unit) or {}
+        self.cursor: Optional[str] = saved.get('cursor')
+        self.processed: int = saved.get('processed', 0)
+        self.done: bool = saved.get('status') == "done"
+        self._last_saved_at = 0.0
+
+    def advance(self, cursor: str, count: int):
+        """Record that every document up to and including cursor is processed"""
+        self.cursor = cursor
+        self.processed += count
+        now = time.monotonic()
+        if now - self._last_saved_at >= self.save_interval:
+            self.journal.save(self.job, self.unit, self.cursor, self.processed)
+            self._last_saved_at = now
+
+    def flush(self):
+        """Write the latest progress immediately"""
+        self.journal.save(self.job, self.unit, self.cursor, self.processed)
+
+    def complete(self):
+        """Mark the unit of work as finished"""
+        self.done = True
+        self.journal.save(self.job, self.unit, self.cursor, self.processed, status="done")
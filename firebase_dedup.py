@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Firebase Question Deduplicator
+Find near-duplicate quiz questions with a MinHash/LSH index kept on disk and
+updated from the questions written since the previous run
+"""
+
+import hashlib
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from firebase_checkpoint import JobJournal
+from firebase_metrics import tracer
+from firebase_rate_control import AdaptiveRateController
+from firebase_rollup import advance_watermark, changes_query
+from firebase_schema import change_field_for, epoch_seconds
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter, ThroughputMeter, iter_query_pages
+
+# Bound on first use by _load_numpy; the CLI and the index advisor import this module
+# for its constants only
+np = None
+
+# Collection firebaseService.createQuestion/getQuestions use (firebaseService.collections.questions)
+QUESTIONS_COLLECTION = "questions"
+
+# Job name used for change watermarks in the journal
+DEDUP_JOB = "dedup"
+
+QUESTION_FIELDS = ['question', 'options', 'createdAt']
+
+# MinHash permutations and LSH bands; 16 bands of 8 rows make pairs above
+# ~0.7 Jaccard similarity likely to share a bucket
+NUM_PERM = 128
+BANDS = 16
+
+# Characters per shingle of the normalized text
+SHINGLE_SIZE = 5
+
+# Estimated Jaccard similarity from which two questions count as duplicates
+DEFAULT_THRESHOLD = 0.8
+
+# What happens to a duplicate: listed only, marked inactive, or deleted
+ACTIONS = ('report', 'flag', 'delete')
+
+# Status flagged duplicates get; getQuestions({status: 'active'}) no longer returns them
+DUPLICATE_STATUS = "duplicate"
+
+# Status a flagged question gets back when the question it duplicated is gone
+ACTIVE_STATUS = "active"
+
+# Modulus of the permutation hashes: a prime below 2**31, so a * hash + b fits in 64 bits
+_PRIME = (1 << 31) - 1
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            print("❌ NumPy not installed!")
+            print("📦 Install it with: pip install numpy")
+            sys.exit(1)
+        np = numpy
+
+
+def normalize_question(question: Any, options: Any) -> str:
+    """Question text and options, case-folded, without punctuation, options in a fixed order"""
+    def clean(text: Any) -> str:
+        text = unicodedata.normalize("NFKC", str(text or "")).casefold()
+        return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+    choices = sorted(clean(option) for option in options) if isinstance(options, list) else []
+    return " # ".join([clean(question)] + [choice for choice in choices if choice])
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    if len(text) <= size:
+        return [text]
+    return list({text[i:i + size] for i in range(len(text) - size + 1)})
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        """
+        MinHash signatures over character shingles
+
+        Every shingle is hashed once (CRC32) and the num_perm permutations
+        are applied to all of a question's shingle hashes in one array
+        operation. The seed is fixed so signatures stored by one run can be
+        compared with the next.
+        """
+        _load_numpy()
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = generator.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self.b = generator.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str):
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)], dtype=np.uint64)
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(left, right) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(left == right))
+
+
+class QuestionIndex:
+    def __init__(self, path: str, num_perm: int = NUM_PERM, bands: int = BANDS):
+        """
+        Local LSH index of question signatures
+
+        Each indexed question has its signature and one row per band in a
+        bucket table indexed by (band, bucket), so finding the candidates
+        for a question is `bands` index lookups whatever the bank size, and
+        adding one is a handful of inserts. Duplicates are recorded with the
+        question they duplicate but kept out of the buckets, so a cluster is
+        matched against its original only. The original is the oldest
+        question of the cluster by createdAt, whatever order they were read in.
+
+        Args:
+            path: SQLite file; usually the job journal's
+            num_perm: Signature length
+            bands: LSH bands (num_perm must be a multiple)
+        """
+        _load_numpy()
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dedup_questions (
+                path TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                duplicate_of TEXT,
+                similarity REAL,
+                action TEXT,
+                created REAL
+            );
+            CREATE INDEX IF NOT EXISTS dedup_questions_duplicates
+                ON dedup_questions (duplicate_of);
+            CREATE TABLE IF NOT EXISTS dedup_buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                path TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dedup_buckets_lookup ON dedup_buckets (band, bucket);
+            CREATE INDEX IF NOT EXISTS dedup_buckets_path ON dedup_buckets (path);
+            CREATE TABLE IF NOT EXISTS dedup_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(dedup_questions)")}
+        if 'created' not in columns:
+            # Indexes from before creation times were kept are rebuilt by the next run
+            self._conn.execute("ALTER TABLE dedup_questions ADD COLUMN created REAL")
+            self._conn.execute("DELETE FROM dedup_meta WHERE name = 'layout'")
+
+    def _transaction(self, work: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    @property
+    def layout(self) -> str:
+        return f"{self.num_perm}x{self.bands}"
+
+    def matches_layout(self) -> bool:
+        """Whether the stored signatures were built with this index's num_perm and bands"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM dedup_meta WHERE name = 'layout'").fetchone()
+        return row is not None and row[0] == self.layout
+
+    def buckets(self, signature) -> List[Tuple[int, int]]:
+        """(band, bucket) keys of a signature"""
+        return [(band, int.from_bytes(hashlib.blake2b(rows.tobytes(), digest_size=8).digest(), "big", signed=True))
+                for band, rows in enumerate(signature.reshape(self.bands, self.rows))]
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT fingerprint FROM dedup_questions WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def created(self, path: str) -> float:
+        """Creation time of an indexed question in epoch seconds (infinity if unknown)"""
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM dedup_questions WHERE path = ?", (path,)).fetchone()
+        return row[0] if row and row[0] is not None else float("inf")
+
+    def candidates(self, signature, threshold: float, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Indexed questions sharing a bucket with signature and at least threshold similar, best first"""
+        keys = self.buckets(signature)
+        clause = " OR ".join(["(band = ? AND bucket = ?)"] * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT q.path, q.signature FROM dedup_questions q WHERE q.path IN "
+                f"(SELECT DISTINCT path FROM dedup_buckets WHERE {clause})",
+                [value for key in keys for value in key]).fetchall()
+        matches = []
+        for path, blob in rows:
+            if path == exclude:
+                continue
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score >= threshold:
+                matches.append((path, round(score, 4)))
+        return sorted(matches, key=lambda match: (-match[1], match[0]))
+
+    def add(self, path: str, fingerprint: str, signature, duplicate_of: Optional[str] = None,
+            score: Optional[float] = None, created: Optional[float] = None):
+        """
+        Index a question, or record it as a duplicate; replaces any earlier entry for path
+
+        A duplicate's action is cleared so it is handled again with its
+        current original. A question that becomes an original keeps its
+        action, so a flag set while it was a duplicate can be undone.
+        """
+        def work():
+            self._add(path, fingerprint, signature, duplicate_of, score, created)
+        self._transaction(work)
+
+    def _add(self, path: str, fingerprint: str, signature, duplicate_of: Optional[str],
+             score: Optional[float], created: Optional[float]):
+        self._conn.execute("DELETE FROM dedup_buckets WHERE path = ?", (path,))
+        self._conn.execute(
+            "INSERT INTO dedup_questions (path, fingerprint, signature, duplicate_of, similarity, action, created) "
+            "VALUES (?, ?, ?, ?, ?, NULL, ?) ON CONFLICT (path) DO UPDATE SET "
+            "fingerprint = excluded.fingerprint, signature = excluded.signature, "
+            "duplicate_of = excluded.duplicate_of, similarity = excluded.similarity, created = excluded.created, "
+            "action = CASE WHEN excluded.duplicate_of IS NULL THEN action END",
+            (path, fingerprint, signature.tobytes(), duplicate_of, score, created))
+        if duplicate_of is None:
+            self._conn.executemany("INSERT INTO dedup_buckets (band, bucket, path) VALUES (?, ?, ?)",
+                                   [(band, bucket, path) for band, bucket in self.buckets(signature)])
+
+    def promote(self, path: str, original: str, score: float):
+        """Make an indexed question the original of another original's cluster"""
+        def work():
+            self._conn.execute("UPDATE dedup_questions SET duplicate_of = ?, action = NULL WHERE duplicate_of = ?",
+                               (path, original))
+            self._conn.execute("UPDATE dedup_questions SET duplicate_of = ?, similarity = ?, action = NULL "
+                               "WHERE path = ?", (path, score, original))
+            self._conn.execute("DELETE FROM dedup_buckets WHERE path = ?", (original,))
+        self._transaction(work)
+
+    def forget(self, paths: Iterable[str]) -> List[Tuple[str, str, bytes, Optional[float]]]:
+        """
+        Drop questions that no longer exist from the index
+
+        Returns the duplicates of the dropped questions as (path,
+        fingerprint, signature, created), oldest first, so the caller can
+        match them again.
+        """
+        paths = list(paths)
+
+        def work():
+            orphans = []
+            for path in paths:
+                orphans.extend(self._conn.execute(
+                    "SELECT path, fingerprint, signature, created FROM dedup_questions WHERE duplicate_of = ?",
+                    (path,)).fetchall())
+                self._conn.execute("DELETE FROM dedup_questions WHERE path = ?", (path,))
+                self._conn.execute("DELETE FROM dedup_buckets WHERE path = ?", (path,))
+            gone = set(paths)
+            orphans = [orphan for orphan in orphans if orphan[0] not in gone]
+            return sorted(orphans, key=lambda orphan: (orphan[3] is None, orphan[3] or 0, orphan[0]))
+        return self._transaction(work)
+
+    def originals(self, after: str, limit: int) -> List[str]:
+        """Questions with recorded duplicates, by path, starting after the given one"""
+        with self._lock:
+            return [path for (path,) in self._conn.execute(
+                "SELECT DISTINCT duplicate_of FROM dedup_questions WHERE duplicate_of > ? "
+                "ORDER BY duplicate_of LIMIT ?", (after, limit))]
+
+    def restorable(self, limit: int) -> List[str]:
+        """Originals still flagged from when they were duplicates"""
+        with self._lock:
+            return [path for (path,) in self._conn.execute(
+                "SELECT path FROM dedup_questions WHERE duplicate_of IS NULL AND action = 'flag' "
+                "ORDER BY path LIMIT ?", (limit,))]
+
+    def pending(self, action: str, limit: int) -> List[Tuple[str, str, float]]:
+        """Duplicates action has not been taken on yet: (path, duplicate_of, similarity)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, duplicate_of, similarity FROM dedup_questions "
+                "WHERE duplicate_of IS NOT NULL AND (action IS NULL OR action != ?) ORDER BY path LIMIT ?",
+                (action, limit)).fetchall()
+
+    def mark(self, paths: Iterable[str], action: Optional[str]):
+        """Record the action taken on duplicates (None once a flag is undone); deleted ones leave the index"""
+        def work():
+            if action == 'delete':
+                self._conn.executemany("DELETE FROM dedup_questions WHERE path = ?", [(path,) for path in paths])
+            else:
+                self._conn.executemany("UPDATE dedup_questions SET action = ? WHERE path = ?",
+                                       [(action, path) for path in paths])
+        self._transaction(work)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            indexed, duplicates = self._conn.execute(
+                "SELECT COUNT(*) - COUNT(duplicate_of), COUNT(duplicate_of) FROM dedup_questions").fetchone()
+        return {'indexed': indexed, 'duplicates': duplicates}
+
+    def reset(self):
+        """Drop every entry and record the current layout"""
+        def work():
+            self._conn.execute("DELETE FROM dedup_questions")
+            self._conn.execute("DELETE FROM dedup_buckets")
+            self._conn.execute("INSERT OR REPLACE INTO dedup_meta (name, value) VALUES ('layout', ?)",
+                               (self.layout,))
+        self._transaction(work)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QuestionDeduplicator:
+    def __init__(self, db, journal: JobJournal, collection_name: str = QUESTIONS_COLLECTION,
+                 threshold: float = DEFAULT_THRESHOLD, action: str = 'report', page_size: int = 500,
+                 overlap_seconds: float = 300.0, max_ops_per_second: float = 100):
+        """
+        Keep a near-duplicate index of the question bank and act on duplicates
+
+        The first run (or --rebuild) reads the whole collection; later runs
+        read only questions written since the watermark (`updatedAt >
+        watermark - overlap`). Each question is normalized, signed with
+        MinHash and looked up in the LSH index: a match at or above
+        threshold makes the newer of the two (by createdAt) a duplicate of
+        the older one, anything else is added to the index. Checking a
+        question costs a few bucket lookups, not a comparison with every
+        question.
+
+        Duplicates are then flagged (`status: 'duplicate'` plus
+        `duplicateOf`) or deleted in rate-limited batch commits; with the
+        default 'report' action they are only listed. Before acting, both
+        sides of every pair are read back: questions deleted outside this
+        tool leave the index, their duplicates are matched again, and a
+        flagged question left without an original is set active again.
+
+        Args:
+            db: Firestore client
+            journal: Journal the watermark is kept in; the index lives in the same file
+            collection_name: Question collection
+            threshold: Estimated Jaccard similarity from which questions are duplicates
+            action: 'report', 'flag' or 'delete'
+            page_size: Documents read per query page
+            overlap_seconds: How far before the watermark each change query starts
+            max_ops_per_second: Ceiling for the flag/delete write rate
+        """
+        _load_numpy()
+        if action not in ACTIONS:
+            raise ValueError(f"action must be one of {', '.join(ACTIONS)}")
+        self.db = db
+        self.journal = journal
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.action = action
+        self.page_size = page_size
+        self.overlap_seconds = overlap_seconds
+        self.hasher = MinHasher()
+        self.index = QuestionIndex(journal.path)
+        self.rate_controller = AdaptiveRateController(
+            initial_ops_per_second=min(max_ops_per_second, 100), max_ops_per_second=max_ops_per_second)
+        self.writer = PipelinedWriter(db, max_in_flight=1, rate_controller=self.rate_controller)
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the service loop to finish the current page and exit"""
+        self._stop.set()
+
+    def lookup(self, question: str, options: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Indexed questions a new question would duplicate, best match first"""
+        return self.index.candidates(self.hasher.signature(normalize_question(question, options or [])),
+                                     self.threshold)
+
+    def index_question(self, snapshot) -> Optional[Tuple[str, str, float]]:
+        """Add one question to the index; return (duplicate, original, similarity) if it forms a pair"""
+        data = snapshot.to_dict() or {}
+        text = normalize_question(data.get('question'), data.get('options'))
+        path = snapshot.reference.path
+        fingerprint = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        # Re-reads in the overlap window, and flags written by this tool, leave the text unchanged
+        if self.index.fingerprint(path) == fingerprint or not text:
+            return None
+        created = epoch_seconds(data.get('createdAt'))
+        created = created if created == created else None
+        return self._match(path, fingerprint, self.hasher.signature(text), created)
+
+    def _match(self, path: str, fingerprint: str, signature,
+               created: Optional[float]) -> Optional[Tuple[str, str, float]]:
+        matches = self.index.candidates(signature, self.threshold, exclude=path)
+        if not matches:
+            self.index.add(path, fingerprint, signature, created=created)
+            return None
+        original, score = matches[0]
+        if created is not None and created < self.index.created(original):
+            # The question read now is the older one; it takes over the cluster
+            self.index.add(path, fingerprint, signature, created=created)
+            self.index.promote(path, original, score)
+            return original, path, score
+        self.index.add(path, fingerprint, signature, original, score, created)
+        return path, original, score
+
+    def read_questions(self, rebuild: bool = False) -> Dict[str, int]:
+        """Index the questions written since the watermark (all of them on the first run)"""
+        change_field, _ = change_field_for(self.collection_name)
+        saved = self.journal.load(DEDUP_JOB, self.collection_name)
+        if rebuild or not self.index.matches_layout():
+            saved = None
+        watermark = saved['cursor'] if saved else None
+        started_at = datetime.now(timezone.utc).isoformat()
+
+        if watermark:
+            query, order_field = changes_query(self.db, self.collection_name, watermark, self.overlap_seconds,
+                                               QUESTION_FIELDS), change_field
+        else:
+            self.index.reset()
+            query, order_field = (self.db.collection(self.collection_name)
+                                  .select(QUESTION_FIELDS + [change_field]).order_by(DOCUMENT_ID)), None
+
+        meter = ThroughputMeter(self.collection_name, icon="🔎")
+        counts = {'read': 0, 'found': 0}
+        latest = None
+        for snapshots in iter_query_pages(query, self.page_size, order_field=order_field):
+            for snapshot in snapshots:
+                match = self.index_question(snapshot)
+                if match:
+                    counts['found'] += 1
+                    print(f"  🔁 {match[0]} ≈ {match[1]} ({match[2]:.2f})")
+                value = (snapshot.to_dict() or {}).get(change_field)
+                if value is not None and (latest is None or value > latest):
+                    latest = value
+            counts['read'] += len(snapshots)
+            meter.add(len(snapshots))
+            if self._stop.is_set():
+                return counts
+
+        new_watermark = advance_watermark(watermark, latest) if watermark else started_at
+        if new_watermark:
+            processed = saved.get('processed', 0) if saved else 0
+            self.journal.save(DEDUP_JOB, self.collection_name, new_watermark, processed + counts['read'],
+                              status="done")
+        if watermark is None:
+            print(f"  🔎 {self.collection_name}: indexed {counts['read']} questions")
+        return counts
+
+    def missing(self, paths: Iterable[str]) -> List[str]:
+        """The given document paths that no longer exist"""
+        paths = sorted(set(paths))
+        found = set()
+        for i in range(0, len(paths), self.page_size):
+            # A one-field mask keeps the existence check to a few bytes per question
+            snapshots = self.db.get_all([self.db.document(path) for path in paths[i:i + self.page_size]],
+                                        field_paths=['status'])
+            found.update(snapshot.reference.path for snapshot in snapshots if snapshot.exists)
+        return [path for path in paths if path not in found]
+
+    def forget(self, paths: List[str]):
+        """Drop deleted questions from the index and match their duplicates again"""
+        for path, fingerprint, blob, created in self.index.forget(paths):
+            match = self._match(path, fingerprint, np.frombuffer(blob, dtype=np.uint32), created)
+            if match:
+                print(f"  🔁 {match[0]} ≈ {match[1]} ({match[2]:.2f})")
+            else:
+                print(f"  ↩️ {path}: its original is gone; no longer a duplicate")
+        print(f"  🗑️ {len(paths)} questions deleted outside the deduplicator left the index")
+
+    def restore(self) -> int:
+        """Set flagged questions that are no longer duplicates active again; return how many"""
+        restored = 0
+        while not self._stop.is_set():
+            paths = self.index.restorable(self.page_size)
+            if not paths:
+                break
+            gone = self.missing(paths)
+            if gone:
+                self.forget(gone)
+                continue
+            now = datetime.now(timezone.utc)
+            self.writer.set_many([(self.db.document(path), {
+                'status': ACTIVE_STATUS,
+                'duplicateOf': None,
+                'duplicateSimilarity': None,
+                'updatedAt': now
+            }) for path in paths], merge=True).result()
+            self.index.mark(paths, None)
+            restored += len(paths)
+        if restored:
+            print(f"  ↩️ {restored} flagged questions set active again")
+        return restored
+
+    def resolve(self) -> int:
+        """Flag or delete the recorded duplicates not yet handled that way; return how many"""
+        if self.action == 'report':
+            return 0
+        # Originals deleted elsewhere since their duplicates were flagged; one masked read per cluster
+        after = ""
+        while not self._stop.is_set():
+            originals = self.index.originals(after, self.page_size)
+            if not originals:
+                break
+            gone = self.missing(originals)
+            if gone:
+                self.forget(gone)
+            after = originals[-1]
+        resolved = 0
+        while not self._stop.is_set():
+            duplicates = self.index.pending(self.action, self.page_size)
+            if not duplicates:
+                break
+            # Never act on a pair whose original (or the duplicate itself) was deleted elsewhere
+            gone = self.missing([path for path, _, _ in duplicates] + [original for _, original, _ in duplicates])
+            if gone:
+                self.forget(gone)
+                continue
+            if self.action == 'delete':
+                self.writer.delete_many([self.db.document(path) for path, _, _ in duplicates]).result()
+            else:
+                now = datetime.now(timezone.utc)
+                self.writer.set_many([(self.db.document(path), {
+                    'status': DUPLICATE_STATUS,
+                    'duplicateOf': self.db.document(original).id,
+                    'duplicateSimilarity': score,
+                    'updatedAt': now
+                }) for path, original, score in duplicates], merge=True).result()
+            self.index.mark([path for path, _, _ in duplicates], self.action)
+            resolved += len(duplicates)
+        if resolved:
+            verb = "deleted" if self.action == 'delete' else "flagged"
+            print(f"  🧹 {resolved} duplicate questions {verb}")
+        self.restore()
+        return resolved
+
+    def run_once(self, rebuild: bool = False) -> Dict[str, int]:
+        """Index new questions and act on the duplicates found"""
+        with tracer.span("firestore.dedup", collection=self.collection_name) as span:
+            results = self.read_questions(rebuild)
+            span.set_attribute("documents", results['read'])
+        results['resolved'] = self.resolve()
+        results.update(self.index.counts())
+        return results
+
+    def run_forever(self, interval: float = 300.0, after_cycle: Optional[Callable[[], None]] = None):
+        """Index new questions repeatedly, sleeping between cycles, until stop() is called"""
+        print(f"🔎 Checking new {self.collection_name} for near-duplicates every {interval:g}s")
+        while not self._stop.is_set():
+            try:
+                results = self.run_once()
+                if results['read']:
+                    print(f"✅ {results['read']} questions checked, {results['found']} duplicates found")
+            except Exception as e:
+                print(f"  ❌ Error checking questions: {e}")
+            if after_cycle is not None:
+                after_cycle()
+            self._stop.wait(interval)
+        self.close()
+        print("👋 Question deduplicator stopped")
+
+    def close(self):
+        """Wait for pending writes and close the index"""
+        self.writer.close()
+        self.index.close()
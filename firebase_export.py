@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Firebase Export
+Stream collections page by page into compressed NDJSON shards on local disk,
+as full exports or as incremental deltas on top of a baseline
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from firebase_metrics import tracer
+from firebase_ndjson import ShardWriter, encode_document, find_shards, iter_shard_lines
+from firebase_schema import change_field_for, time_value
+from firebase_streaming import DOCUMENT_ID, ThroughputMeter, count_documents, iter_query_pages
+
+# Characters Firestore auto-generated document IDs are drawn from, in sort order
+AUTO_ID_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+MANIFEST_FILE = "manifest.json"
+
+
+def key_range_bounds(partitions: int) -> List[Optional[str]]:
+    """
+    Split the document ID key space into contiguous ranges
+
+    Returns partitions + 1 boundaries; the first and last are None (open).
+    Auto IDs are uniformly random, so the ranges hold similar numbers of
+    documents; custom IDs still land in exactly one range, just less evenly.
+    """
+    partitions = max(1, min(partitions, len(AUTO_ID_ALPHABET)))
+    step = len(AUTO_ID_ALPHABET) / partitions
+    inner = [AUTO_ID_ALPHABET[round(i * step)] for i in range(1, partitions)]
+    return [None] + inner + [None]
+
+
+def partition_queries(collection_ref, partitions: int) -> List[Any]:
+    """Build one document ID-ordered query per key range of a collection"""
+    bounds = key_range_bounds(partitions)
+    queries = []
+    for lower, upper in zip(bounds, bounds[1:]):
+        query = collection_ref.order_by(DOCUMENT_ID)
+        if lower is not None:
+            query = query.start_at({DOCUMENT_ID: collection_ref.document(lower)})
+        if upper is not None:
+            query = query.end_before({DOCUMENT_ID: collection_ref.document(upper)})
+        queries.append(query)
+    return queries
+
+
+def write_manifest(output_dir: str, mode: str, started_at: datetime, results: List[tuple],
+                   extra: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Write manifest.json for (collection, partition result) pairs and return the manifest"""
+    manifest = {
+        'mode': mode,
+        'started_at': started_at.isoformat(),
+        'collections': {}
+    }
+    manifest.update(extra or {})
+    for collection_name, result in results:
+        entry = manifest['collections'].setdefault(collection_name, {'documents': 0, 'partitions': []})
+        entry['documents'] += result['documents']
+        entry['partitions'].append(result)
+
+    manifest['finished_at'] = datetime.now(timezone.utc).isoformat()
+    manifest['complete'] = not any('error' in partition
+                                   for entry in manifest['collections'].values()
+                                   for partition in entry['partitions'])
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def default_export_dir(base_dir: str = "backups") -> str:
+    """Return a new timestamped export directory path"""
+    return os.path.join(base_dir, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"))
+
+
+class FirestoreExporter:
+    def __init__(self, db, output_dir: str, workers: int = 4, partitions: int = 4,
+                 page_size: int = 300, max_docs_per_shard: int = 100_000,
+                 report_interval: float = 5.0):
+        """
+        Export collections to gzip NDJSON shards with bounded memory
+
+        Every collection is split into key-range partitions by document ID and
+        each (collection, partition) pair is streamed by its own worker, one
+        page at a time, into its own shard files. A worker never holds more
+        than one page of documents.
+
+        Args:
+            db: Firestore client
+            output_dir: Directory the export is written to
+            workers: Number of partitions exported at the same time
+            partitions: Key-range partitions per collection
+            page_size: Documents read per query page
+            max_docs_per_shard: Documents per shard file
+            report_interval: Seconds between docs/sec progress lines
+        """
+        self.db = db
+        self.output_dir = output_dir
+        self.workers = max(1, workers)
+        self.partitions = max(1, partitions)
+        self.page_size = page_size
+        self.max_docs_per_shard = max_docs_per_shard
+        self.report_interval = report_interval
+
+    def export_partition(self, collection_name: str, index: int, query,
+                         order_field: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream one partition query into its shards and return its manifest entry
+
+        For queries ordered by order_field (ascending), the entry also records
+        the largest value seen as 'max_value'.
+        """
+        writer = ShardWriter(os.path.join(self.output_dir, collection_name),
+                             f"part-{index:03d}", self.max_docs_per_shard)
+        meter = ThroughputMeter(f"{collection_name}#{index}", self.report_interval, icon="📦")
+        started_at = time.monotonic()
+        max_value = None
+        try:
+            for snapshots in iter_query_pages(query, self.page_size, order_field=order_field):
+                writer.write_lines([encode_document(snapshot) for snapshot in snapshots])
+                meter.add(len(snapshots))
+                if order_field:
+                    max_value = snapshots[-1].get(order_field)
+        finally:
+            writer.close()
+
+        result = {'partition': index, 'documents': writer.count, 'shards': writer.shards,
+                  'seconds': round(time.monotonic() - started_at, 3)}
+        if max_value is not None:
+            result['max_value'] = max_value.isoformat() if isinstance(max_value, datetime) else max_value
+        return result
+
+    def _export_task(self, task: tuple) -> Dict[str, Any]:
+        collection_name, index, query, order_field = task
+        try:
+            with tracer.span("firestore.export_partition", collection=collection_name, partition=index) as span:
+                result = self.export_partition(collection_name, index, query, order_field)
+                span.set_attribute("documents", result['documents'])
+            return result
+        except Exception as e:
+            print(f"  ❌ Error exporting {collection_name}#{index}: {e}")
+            return {'partition': index, 'documents': 0, 'shards': [], 'error': str(e)}
+
+    def _tasks(self, collection_name: str) -> List[tuple]:
+        queries = partition_queries(self.db.collection(collection_name), self.partitions)
+        return [(collection_name, i, query, None) for i, query in enumerate(queries)]
+
+    def _run(self, tasks: List[tuple], mode: str, extra: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Run export tasks on the worker pool and write the manifest"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        started_at = datetime.now(timezone.utc)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(zip([task[0] for task in tasks], executor.map(self._export_task, tasks)))
+        return write_manifest(self.output_dir, mode, started_at, results, extra)
+
+    def export_collections(self, collections: List[str]) -> Dict[str, Any]:
+        """Export whole collections and return the manifest"""
+        print(f"📦 Exporting {len(collections)} collections to {self.output_dir} "
+              f"({self.partitions} partitions each, {self.workers} workers)")
+        tasks = [task for collection_name in collections for task in self._tasks(collection_name)]
+        manifest = self._run(tasks, "full")
+
+        for collection_name, entry in manifest['collections'].items():
+            print(f"  ✅ {collection_name}: {entry['documents']} documents exported")
+        total = sum(entry['documents'] for entry in manifest['collections'].values())
+        print(f"📦 Exported {total} documents")
+        return manifest
+
+
+STATE_FILE = "state.json"
+
+
+class IncrementalExporter:
+    def __init__(self, db, root_dir: str, workers: int = 4, partitions: int = 4,
+                 page_size: int = 300, max_docs_per_shard: int = 100_000,
+                 overlap_seconds: float = 300.0):
+        """
+        Nightly snapshots that only read documents changed since the last run
+
+        The root directory holds one baseline export, the delta exports taken
+        since, and state.json with each collection's change watermark (the
+        largest updatedAt exported so far). A delta queries
+        `updatedAt > watermark - overlap`, so its cost grows with churn rather
+        than with collection size; the overlap covers writes whose server
+        timestamp was assigned before, but committed after, the previous run.
+
+        Deletes are not visible to a change query. compact() folds deltas into
+        a new baseline; take a fresh full baseline periodically to drop
+        documents deleted in the meantime.
+
+        Documents without the change field (written by tools other than
+        firebaseService.create/update, or seeded directly) never match a
+        change query either, so their edits only show up in the next full
+        baseline. Every delta counts them with two aggregation queries and
+        reports the number per collection.
+
+        Args:
+            db: Firestore client
+            root_dir: Directory holding the baseline, deltas and state file
+            workers: Number of partitions/collections exported at the same time
+            partitions: Key-range partitions per collection for baselines
+            page_size: Documents read per query page
+            max_docs_per_shard: Documents per shard file
+            overlap_seconds: How far before the watermark each delta starts reading
+        """
+        self.db = db
+        self.root_dir = root_dir
+        self.workers = workers
+        self.partitions = partitions
+        self.page_size = page_size
+        self.max_docs_per_shard = max_docs_per_shard
+        self.overlap_seconds = overlap_seconds
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        path = os.path.join(self.root_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {'baseline': None, 'deltas': [], 'watermarks': {}}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        path = os.path.join(self.root_dir, STATE_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _new_dir(self, kind: str) -> str:
+        """Return an unused timestamped directory name such as delta-20240101T000000Z"""
+        name = f"{kind}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+        suffix = 1
+        candidate = name
+        while os.path.exists(os.path.join(self.root_dir, candidate)):
+            candidate = f"{name}-{suffix}"
+            suffix += 1
+        return candidate
+
+    def _exporter(self, name: str) -> FirestoreExporter:
+        return FirestoreExporter(self.db, os.path.join(self.root_dir, name), workers=self.workers,
+                                 partitions=self.partitions, page_size=self.page_size,
+                                 max_docs_per_shard=self.max_docs_per_shard)
+
+    def export_baseline(self, collections: List[str]) -> Dict[str, Any]:
+        """Take a full export and restart the delta chain from it"""
+        started_at = datetime.now(timezone.utc) - timedelta(seconds=self.overlap_seconds)
+        name = self._new_dir("baseline")
+        manifest = self._exporter(name).export_collections(collections)
+        if not manifest['complete']:
+            print("⚠️ Baseline incomplete; state not updated")
+            return manifest
+
+        self.state = {
+            'baseline': name,
+            'deltas': [],
+            # Anything written after the export started is picked up by the next delta
+            'watermarks': {collection_name: started_at.isoformat() for collection_name in collections}
+        }
+        self._save_state()
+        return manifest
+
+    def _since(self, collection_name: str) -> Any:
+        """Lower bound for the change query of one collection"""
+        field, kind = change_field_for(collection_name)
+        watermark = self.state['watermarks'].get(collection_name)
+        if watermark is None:
+            return None
+        moment = datetime.fromisoformat(watermark.replace("Z", "+00:00"))
+        return time_value(moment - timedelta(seconds=self.overlap_seconds), kind)
+
+    def untracked_documents(self, collection_name: str) -> int:
+        """Documents of a collection without its change field, which deltas cannot see"""
+        field, _ = change_field_for(collection_name)
+        collection_ref = self.db.collection(collection_name)
+        # Ordering by a field leaves out the documents that do not have it
+        return count_documents(collection_ref) - count_documents(collection_ref.order_by(field))
+
+    def export_delta(self, collections: List[str]) -> Optional[Dict[str, Any]]:
+        """Export documents changed since each collection's watermark"""
+        if not self.state['baseline']:
+            print("❌ No baseline yet; run a baseline export first")
+            return None
+
+        name = self._new_dir("delta")
+        exporter = self._exporter(name)
+        tasks = []
+        for collection_name in collections:
+            field, _ = change_field_for(collection_name)
+            since = self._since(collection_name)
+            query = self.db.collection(collection_name)
+            if since is not None:
+                query = query.where(field, '>', since)
+            query = query.order_by(field).order_by(DOCUMENT_ID)
+            tasks.append((collection_name, 0, query, field))
+
+        untracked = {}
+        for collection_name in collections:
+            try:
+                untracked[collection_name] = self.untracked_documents(collection_name)
+            except Exception as e:
+                print(f"  ⚠️ {collection_name}: could not count documents without a change field: {e}")
+
+        print(f"📦 Exporting changes for {len(collections)} collections to {exporter.output_dir}")
+        manifest = exporter._run(tasks, "delta", {'baseline': self.state['baseline'], 'untracked': untracked})
+
+        for collection_name, entry in manifest['collections'].items():
+            partition = entry['partitions'][0]
+            if 'error' in partition:
+                continue
+            if partition.get('max_value'):
+                self.state['watermarks'][collection_name] = partition['max_value']
+            elif collection_name not in self.state['watermarks']:
+                self.state['watermarks'][collection_name] = manifest['started_at']
+            print(f"  ✅ {collection_name}: {entry['documents']} changed documents")
+            if untracked.get(collection_name):
+                field, _ = change_field_for(collection_name)
+                print(f"  ⚠️ {collection_name}: {untracked[collection_name]} documents have no {field}; "
+                      f"their changes are only captured by a new baseline")
+
+        self.state['deltas'].append(name)
+        self._save_state()
+        return manifest
+
+    def _compact_collection(self, collection_name: str, target: str) -> int:
+        """Merge one collection's baseline with its deltas into the target baseline"""
+        # Later deltas win; memory grows with the number of changed documents only
+        changes: Dict[str, str] = {}
+        for delta in self.state['deltas']:
+            for shard in find_shards(os.path.join(self.root_dir, delta), [collection_name]):
+                for record in iter_shard_lines(shard):
+                    changes[record[0]] = record[1]
+        pending = sorted(changes)
+        next_change = 0
+        emitted = set()
+
+        writer = ShardWriter(os.path.join(self.root_dir, target, collection_name),
+                             "part-000", self.max_docs_per_shard)
+        try:
+            baseline_dir = os.path.join(self.root_dir, self.state['baseline'])
+            for shard in find_shards(baseline_dir, [collection_name]):
+                for path, line in iter_shard_lines(shard):
+                    # New documents that sort before this one keep the output ordered by ID
+                    while next_change < len(pending) and pending[next_change] < path:
+                        new_path = pending[next_change]
+                        next_change += 1
+                        if new_path in changes:
+                            writer.write_lines([changes.pop(new_path)])
+                            emitted.add(new_path)
+                    if path in changes:
+                        writer.write_lines([changes.pop(path)])
+                    elif path not in emitted:
+                        writer.write_lines([line])
+            for path in pending[next_change:]:
+                if path in changes:
+                    writer.write_lines([changes.pop(path)])
+        finally:
+            writer.close()
+        return writer.count
+
+    def compact(self) -> Optional[str]:
+        """Fold every delta into a new baseline and return its directory name"""
+        if not self.state['baseline']:
+            print("❌ No baseline to compact")
+            return None
+
+        target = self._new_dir("baseline")
+        collections = sorted(self.state['watermarks'])
+        print(f"🗜️ Compacting {len(self.state['deltas'])} deltas into {target}")
+        manifest = {'mode': 'compacted', 'started_at': datetime.now(timezone.utc).isoformat(),
+                    'sources': [self.state['baseline']] + self.state['deltas'], 'collections': {}}
+        for collection_name in collections:
+            count = self._compact_collection(collection_name, target)
+            manifest['collections'][collection_name] = {'documents': count}
+            print(f"  ✅ {collection_name}: {count} documents")
+
+        manifest['finished_at'] = datetime.now(timezone.utc).isoformat()
+        manifest['complete'] = True
+        os.makedirs(os.path.join(self.root_dir, target), exist_ok=True)
+        with open(os.path.join(self.root_dir, target, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        self.state['baseline'] = target
+        self.state['deltas'] = []
+        self._save_state()
+        return target
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Firebase Import
+Stream NDJSON export shards back into Firestore with pipelined, rate-controlled bulk writes
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Optional
+
+from firebase_checkpoint import JobJournal
+from firebase_metrics import tracer
+from firebase_ndjson import decode_value, find_shards, iter_shard_records
+from firebase_streaming import DEFAULT_PAGE_SIZE, PipelinedWriter, ThroughputMeter
+
+# Job name used for per-shard progress in the journal
+IMPORT_JOB = "import"
+
+# The emulator has no 500/50/5 ramp to respect, so imports into it start unthrottled
+EMULATOR_INITIAL_OPS_PER_SECOND = 1_000_000
+
+
+def emulator_host() -> Optional[str]:
+    """Return the Firestore emulator address the client will connect to, if any"""
+    return os.environ.get("FIRESTORE_EMULATOR_HOST") or None
+
+
+class FirestoreImporter:
+    def __init__(self, db, writer: PipelinedWriter, journal: Optional[JobJournal] = None,
+                 workers: int = 4, page_size: int = DEFAULT_PAGE_SIZE, merge: bool = False,
+                 report_interval: float = 5.0):
+        """
+        Restore documents from gzip NDJSON shards with bounded memory
+
+        Each worker streams one shard at a time and hands pages of decoded
+        documents to the shared PipelinedWriter, so parsing the next page
+        overlaps with committing the previous ones. Documents are written
+        with set() at their original path, which makes an import an
+        idempotent upsert: running it twice leaves the same data behind.
+
+        With a journal, every shard records how many of its lines are
+        committed (advanced in order, like the deleter's cursor), so an
+        interrupted import resumes without rewriting finished shards.
+
+        Args:
+            db: Firestore client
+            writer: Shared writer every shard commits through
+            journal: Checkpoint file for per-shard progress (optional)
+            workers: Number of shards imported at the same time
+            page_size: Documents per submitted page
+            merge: Merge fields into existing documents instead of replacing them
+            report_interval: Seconds between docs/sec progress lines
+        """
+        self.db = db
+        self.writer = writer
+        self.journal = journal
+        self.workers = max(1, workers)
+        self.page_size = min(page_size, DEFAULT_PAGE_SIZE)
+        self.merge = merge
+        self.report_interval = report_interval
+        self._meter: Optional[ThroughputMeter] = None
+        self._meter_lock = threading.Lock()
+        self.failed_shards = 0  # Shards of the last import_directory() that hit an error
+
+    def _record(self, count: int):
+        with self._meter_lock:
+            self._meter.add(count)
+
+    def import_shard(self, path: str, unit: str) -> int:
+        """Import one shard and return the number of documents written by this run"""
+        checkpoint = self.journal.checkpoint(IMPORT_JOB, unit) if self.journal else None
+        if checkpoint is not None and checkpoint.done:
+            return 0
+
+        skip = int(checkpoint.cursor) if checkpoint is not None and checkpoint.cursor else 0
+        if skip:
+            print(f"  ↩️ {unit}: resuming after line {skip}")
+
+        records = islice(iter_shard_records(path), skip, None)
+        pending = deque()
+        line = skip
+        written = 0
+
+        def _finish_head():
+            nonlocal written
+            future, last_line = pending.popleft()
+            count = future.result()
+            written += count
+            self._record(count)
+            if checkpoint is not None:
+                checkpoint.advance(str(last_line), count)
+
+        try:
+            while True:
+                page = list(islice(records, self.page_size))
+                if not page:
+                    break
+                items = [(self.db.document(record['path']), decode_value(record['data'], self.db))
+                         for record in page]
+                line += len(page)
+                pending.append((self.writer.set_many(items, merge=self.merge), line))
+                while pending and pending[0][0].done():
+                    _finish_head()
+
+            while pending:
+                _finish_head()
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.flush()
+            raise
+
+        if checkpoint is not None:
+            checkpoint.complete()
+        return written
+
+    def _import_task(self, task: tuple) -> Dict[str, object]:
+        path, unit = task
+        try:
+            with tracer.span("firestore.import_shard", shard=unit) as span:
+                documents = self.import_shard(path, unit)
+                span.set_attribute("documents", documents)
+            return {'shard': unit, 'documents': documents}
+        except Exception as e:
+            print(f"  ❌ Error importing {unit}: {e}")
+            return {'shard': unit, 'documents': 0, 'error': str(e)}
+
+    def import_directory(self, directory: str, collections: Optional[List[str]] = None,
+                         resume: bool = False) -> Dict[str, int]:
+        """
+        Import every shard of an export directory and return documents written per collection
+
+        Shards of one collection are spread over the workers like any other,
+        so a single large collection still loads in parallel.
+        """
+        shards = find_shards(directory, collections)
+        if not shards:
+            print(f"⚠️ No shards found in {directory}")
+            return {}
+
+        if self.journal is not None:
+            self.journal.start(IMPORT_JOB, resume)
+
+        tasks = [(path, os.path.relpath(path, directory).replace(os.sep, "/")) for path in shards]
+        print(f"📥 Importing {len(tasks)} shards from {directory} ({self.workers} workers, "
+              f"{'merge' if self.merge else 'replace'} mode)")
+
+        self._meter = ThroughputMeter("import", self.report_interval, icon="📥")
+        results: Dict[str, int] = {}
+        self.failed_shards = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for result in executor.map(self._import_task, tasks):
+                collection_name = result['shard'].split("/")[0]
+                results[collection_name] = results.get(collection_name, 0) + result['documents']
+                self.failed_shards += 'error' in result
+        self.writer.flush()
+
+        for collection_name, count in results.items():
+            print(f"  ✅ {collection_name}: {count} documents imported")
+        print(f"⏱️ Imported {self._meter.count} documents in {self._meter.elapsed:.1f}s "
+              f"({self._meter.rate:.0f} docs/sec)")
+        if self.failed_shards:
+            print(f"⚠️ {self.failed_shards} shards failed; run again with --resume to retry them")
+        return results
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Firebase Leaderboard Materializer
+Build the leaderboard collection from users and quiz_sessions changes,
+keeping global, daily and per-tournament top-K rankings up to date
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from firebase_checkpoint import JobJournal
+from firebase_metrics import tracer
+from firebase_rollup import advance_watermark, changes_query
+from firebase_schema import change_field_for
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter, ThroughputMeter, iter_query_pages
+
+LEADERBOARD_COLLECTION = "leaderboard"
+
+# Job name used for change watermarks in the journal
+LEADERBOARD_JOB = "leaderboard"
+
+# Board keys: the global board, "daily:<YYYY-MM-DD>" and "tournament:<tournament ID>"
+GLOBAL_BOARD = "global"
+DAILY = "daily"
+TOURNAMENT = "tournament"
+
+# Fields read from each source collection
+USER_FIELDS = ['userId', 'username', 'totalEarned']
+SESSION_FIELDS = ['userId', 'startedAt', 'status', 'reward', 'score', 'tournamentId']
+
+
+def board_kind(board: str) -> Tuple[str, Optional[str]]:
+    """Split a board key into (kind, daily date or tournament ID)"""
+    if board == GLOBAL_BOARD:
+        return GLOBAL_BOARD, None
+    kind, key = board.split(":", 1)
+    return kind, key
+
+
+def board_document(db, board: str):
+    """Parent document of a daily or tournament board (the global board has none)"""
+    kind, key = board_kind(board)
+    return db.collection(LEADERBOARD_COLLECTION).document(f"{kind}-{key}")
+
+
+def entry_reference(db, board: str, user_id: str):
+    """Global entries are leaderboard/<userId>; others live under leaderboard/<kind>-<key>/entries"""
+    if board == GLOBAL_BOARD:
+        return db.collection(LEADERBOARD_COLLECTION).document(user_id)
+    return board_document(db, board).collection("entries").document(user_id)
+
+
+def entry_data(board: str, user_id: str, username: str, rank: int, score: float) -> Dict[str, Any]:
+    """Entry document; the global board keeps the totalEarned field firebaseService.getLeaderboard sorts by"""
+    kind, key = board_kind(board)
+    data = {'userId': user_id, 'username': username, 'rank': rank, 'score': score, 'board': kind,
+            'updatedAt': datetime.now(timezone.utc)}
+    if kind == GLOBAL_BOARD:
+        data.update(totalEarned=score, earnings=score)
+    elif kind == DAILY:
+        data.update(date=key, earnings=score)
+    else:
+        data['tournamentId'] = key
+    return data
+
+
+def _number(value: Any) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+class LeaderboardStore:
+    def __init__(self, path: str):
+        """
+        Local score tables the rankings are read from
+
+        Every board's scores sit in one table indexed by (board, score), so
+        the top K of a board is an index range read whatever the number of
+        users, and a changed score is a single-row update instead of a
+        re-sort. Session contributions are kept so a session that changes
+        (active → completed) moves its day's total by the difference.
+
+        Args:
+            path: SQLite file; usually the job journal's
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS leaderboard_scores (
+                board TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (board, user_id)
+            );
+            CREATE INDEX IF NOT EXISTS leaderboard_scores_rank
+                ON leaderboard_scores (board, score DESC, user_id);
+            CREATE TABLE IF NOT EXISTS leaderboard_names (
+                user_id TEXT PRIMARY KEY,
+                username TEXT
+            );
+            CREATE TABLE IF NOT EXISTS leaderboard_sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                day TEXT,
+                reward REAL NOT NULL,
+                tournament TEXT,
+                score REAL
+            );
+            CREATE INDEX IF NOT EXISTS leaderboard_sessions_tournament
+                ON leaderboard_sessions (tournament, user_id);
+            CREATE TABLE IF NOT EXISTS leaderboard_written (
+                board TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                rank INTEGER NOT NULL,
+                score REAL NOT NULL,
+                username TEXT,
+                PRIMARY KEY (board, user_id)
+            );
+        """)
+
+    def _transaction(self, work: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _set_score(self, board: str, user_id: str, score: float):
+        if score > 1e-9:
+            self._conn.execute(
+                "INSERT INTO leaderboard_scores (board, user_id, score) VALUES (?, ?, ?) "
+                "ON CONFLICT (board, user_id) DO UPDATE SET score = excluded.score", (board, user_id, score))
+        else:
+            self._conn.execute("DELETE FROM leaderboard_scores WHERE board = ? AND user_id = ?", (board, user_id))
+
+    def _boards_with(self, user_id: str) -> Set[str]:
+        rows = self._conn.execute("SELECT board FROM leaderboard_written WHERE user_id = ?", (user_id,))
+        return {board for (board,) in rows}
+
+    def apply_users(self, users: List[tuple]) -> Set[str]:
+        """Record a page of (user ID, username, totalEarned); return the boards that changed"""
+        def work():
+            touched = set()
+            for user_id, username, total_earned in users:
+                row = self._conn.execute("SELECT username FROM leaderboard_names WHERE user_id = ?",
+                                         (user_id,)).fetchone()
+                if row is None or row[0] != username:
+                    self._conn.execute(
+                        "INSERT INTO leaderboard_names (user_id, username) VALUES (?, ?) "
+                        "ON CONFLICT (user_id) DO UPDATE SET username = excluded.username", (user_id, username))
+                    if row is not None:
+                        touched |= self._boards_with(user_id)
+                row = self._conn.execute("SELECT score FROM leaderboard_scores WHERE board = ? AND user_id = ?",
+                                         (GLOBAL_BOARD, user_id)).fetchone()
+                if (row[0] if row else 0) != total_earned:
+                    self._set_score(GLOBAL_BOARD, user_id, total_earned)
+                    touched.add(GLOBAL_BOARD)
+            return touched
+        return self._transaction(work)
+
+    def apply_sessions(self, sessions: List[tuple]) -> Set[str]:
+        """
+        Record a page of (session ID, user ID, day, reward, tournament, score)
+
+        A session adds its reward to its user's daily total and, when it
+        belongs to a tournament, counts towards the user's best score there.
+        Returns the boards that changed.
+        """
+        def work():
+            touched = set()
+            for session in sessions:
+                session_id, user_id, day, reward, tournament, score = session
+                row = self._conn.execute(
+                    "SELECT user_id, day, reward, tournament, score FROM leaderboard_sessions "
+                    "WHERE session_id = ?", (session_id,)).fetchone()
+                if row == tuple(session[1:]):
+                    continue
+                self._conn.execute(
+                    "INSERT INTO leaderboard_sessions (session_id, user_id, day, reward, tournament, score) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                    "user_id = excluded.user_id, day = excluded.day, reward = excluded.reward, "
+                    "tournament = excluded.tournament, score = excluded.score", session)
+
+                for old_or_new, sign in ((row, -1), (session[1:], 1)):
+                    if old_or_new is None:
+                        continue
+                    owner, session_day, session_reward, session_tournament, _ = old_or_new
+                    if session_day and session_reward:
+                        board = f"{DAILY}:{session_day}"
+                        current = self._conn.execute(
+                            "SELECT score FROM leaderboard_scores WHERE board = ? AND user_id = ?",
+                            (board, owner)).fetchone()
+                        self._set_score(board, owner, (current[0] if current else 0) + sign * session_reward)
+                        touched.add(board)
+                    if session_tournament:
+                        board = f"{TOURNAMENT}:{session_tournament}"
+                        best = self._conn.execute(
+                            "SELECT MAX(score) FROM leaderboard_sessions WHERE tournament = ? AND user_id = ?",
+                            (session_tournament, owner)).fetchone()[0]
+                        self._set_score(board, owner, best or 0)
+                        touched.add(board)
+            return touched
+        return self._transaction(work)
+
+    def top(self, board: str, k: int) -> List[Tuple[str, float, Optional[str]]]:
+        """The k best (user ID, score, username) of a board, best first"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT s.user_id, s.score, n.username FROM leaderboard_scores s "
+                "LEFT JOIN leaderboard_names n ON n.user_id = s.user_id "
+                "WHERE s.board = ? ORDER BY s.score DESC, s.user_id LIMIT ?", (board, k)).fetchall()
+
+    def written(self, board: str) -> Dict[str, tuple]:
+        """Entries last written for a board: user ID -> (rank, score, username)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, rank, score, username FROM leaderboard_written "
+                                      "WHERE board = ?", (board,)).fetchall()
+        return {user_id: (rank, score, username) for user_id, rank, score, username in rows}
+
+    def save_written(self, board: str, entries: Iterable[tuple]):
+        """Replace the record of what is written for a board with (user ID, rank, score, username) rows"""
+        def work():
+            self._conn.execute("DELETE FROM leaderboard_written WHERE board = ?", (board,))
+            self._conn.executemany("INSERT INTO leaderboard_written (board, user_id, rank, score, username) "
+                                   "VALUES (?, ?, ?, ?, ?)", [(board, *entry) for entry in entries])
+        self._transaction(work)
+
+    def daily_boards_before(self, day: str) -> Set[str]:
+        """Daily boards, scored or written, for days before the given one"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT board FROM leaderboard_scores WHERE board LIKE 'daily:%' AND board < ? "
+                "UNION SELECT board FROM leaderboard_written WHERE board LIKE 'daily:%' AND board < ?",
+                (f"{DAILY}:{day}", f"{DAILY}:{day}")).fetchall()
+        return {board for (board,) in rows}
+
+    def expire_days(self, day: str):
+        """Forget daily scores and non-tournament sessions from before the given day"""
+        def work():
+            self._conn.execute("DELETE FROM leaderboard_scores WHERE board LIKE 'daily:%' AND board < ?",
+                               (f"{DAILY}:{day}",))
+            self._conn.execute("DELETE FROM leaderboard_sessions WHERE tournament IS NULL AND day < ?", (day,))
+        self._transaction(work)
+
+    def reset(self, source: str) -> Set[str]:
+        """Forget everything read from one source collection before a full re-read; return its boards"""
+        def work():
+            if source == 'users':
+                where = "board = 'global'"
+            else:
+                where = "board != 'global'"
+                self._conn.execute("DELETE FROM leaderboard_sessions")
+            boards = {board for (board,) in self._conn.execute(
+                f"SELECT DISTINCT board FROM leaderboard_scores WHERE {where} "
+                f"UNION SELECT DISTINCT board FROM leaderboard_written WHERE {where}")}
+            self._conn.execute(f"DELETE FROM leaderboard_scores WHERE {where}")
+            return boards
+        return self._transaction(work)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeaderboardMaterializer:
+    def __init__(self, db, journal: JobJournal, top: int = 100, daily_days: int = 7,
+                 page_size: int = 500, overlap_seconds: float = 300.0):
+        """
+        Keep the leaderboard collection in step with users and quiz_sessions
+
+        Each cycle reads only the documents written since the previous one
+        (`updatedAt > watermark - overlap`), updates their scores in the
+        local store and re-reads the top K of just the boards those changes
+        touched. Entries are compared with what was last written, so a cycle
+        only writes entries whose rank, score or name changed and deletes
+        the ones that dropped out. Cost follows the write rate and K, not
+        the number of users.
+
+        Boards: global ranks users by totalEarned (the field
+        firebaseService.getLeaderboard sorts by); daily ranks the rewards of
+        each UTC day's completed sessions; per-tournament ranks each user's
+        best session score among sessions carrying a tournamentId.
+
+        Args:
+            db: Firestore client
+            journal: Journal the watermarks are kept in; the score store
+                lives in the same file
+            top: Entries kept per board (K)
+            daily_days: Daily boards kept, including today; also how far back
+                the first run reads quiz_sessions outside tournaments
+            page_size: Documents read per query page
+            overlap_seconds: How far before the watermark each change query starts
+        """
+        self.db = db
+        self.journal = journal
+        self.store = LeaderboardStore(journal.path)
+        self.top = top
+        self.daily_days = daily_days
+        self.page_size = page_size
+        self.overlap_seconds = overlap_seconds
+        self.writer = PipelinedWriter(db, max_in_flight=2)
+        self.cycles = 0
+        self._failed: Set[str] = set()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the service loop to finish the current page and exit"""
+        self._stop.set()
+
+    def _first_day(self) -> str:
+        return (datetime.now(timezone.utc) - timedelta(days=self.daily_days - 1)).strftime("%Y-%m-%d")
+
+    def _user_row(self, snapshot) -> tuple:
+        # Keyed by the userId field like sessions, so usernames reach the daily and tournament boards
+        data = snapshot.to_dict() or {}
+        user_id = data.get('userId') or snapshot.id
+        return user_id, data.get('username') or user_id, round(_number(data.get('totalEarned')), 6)
+
+    def _session_row(self, snapshot) -> Optional[tuple]:
+        data = snapshot.to_dict() or {}
+        if not data.get('userId'):
+            return None
+        completed = data.get('status') == 'completed'
+        started = data.get('startedAt')
+        day = started[:10] if isinstance(started, str) else None
+        if isinstance(started, datetime):
+            day = started.astimezone(timezone.utc).strftime("%Y-%m-%d")
+        if day is not None and day < self._first_day() and not data.get('tournamentId'):
+            return None
+        return (snapshot.id, data['userId'], day,
+                round(_number(data.get('reward')), 6) if completed else 0,
+                data.get('tournamentId') or None,
+                _number(data.get('score')) if completed else None)
+
+    def read_source(self, collection_name: str, rebuild: bool = False) -> Set[str]:
+        """Apply the documents of one source written since its watermark; return the boards touched"""
+        change_field, _ = change_field_for(collection_name)
+        fields = USER_FIELDS if collection_name == 'users' else SESSION_FIELDS
+        saved = self.journal.load(LEADERBOARD_JOB, collection_name)
+        watermark = saved['cursor'] if saved and not rebuild else None
+        started_at = datetime.now(timezone.utc).isoformat()
+        touched: Set[str] = set()
+
+        if watermark:
+            queries = [(changes_query(self.db, collection_name, watermark, self.overlap_seconds, fields),
+                        change_field)]
+        else:
+            touched |= self.store.reset(collection_name)
+            if collection_name == 'users':
+                queries = [(self.db.collection(collection_name)
+                            .select(fields + [change_field]).order_by(DOCUMENT_ID), None)]
+            else:
+                # Daily boards only need the kept days; tournament boards need every tournament session,
+                # however old. Sessions matched by both queries are applied once (unchanged rows are skipped).
+                queries = [(changes_query(self.db, collection_name, self._first_day() + "T00:00:00+00:00",
+                                          0, fields), change_field),
+                           (self.db.collection(collection_name)
+                            .where('tournamentId', '>', '')
+                            .select(sorted(set(fields) | {change_field}))
+                            .order_by('tournamentId')
+                            .order_by(DOCUMENT_ID), 'tournamentId')]
+
+        meter = ThroughputMeter(collection_name, icon="🏆")
+        read = 0
+        latest = None
+        for query, order_field in queries:
+            for snapshots in iter_query_pages(query, self.page_size, order_field=order_field):
+                if collection_name == 'users':
+                    touched |= self.store.apply_users([self._user_row(snapshot) for snapshot in snapshots])
+                else:
+                    rows = [self._session_row(snapshot) for snapshot in snapshots]
+                    touched |= self.store.apply_sessions([row for row in rows if row])
+                for snapshot in snapshots:
+                    value = (snapshot.to_dict() or {}).get(change_field)
+                    if value is not None and (latest is None or value > latest):
+                        latest = value
+                read += len(snapshots)
+                meter.add(len(snapshots))
+                if self._stop.is_set():
+                    return touched
+
+        if watermark:
+            new_watermark = advance_watermark(watermark, latest)
+        else:
+            new_watermark = started_at
+        if new_watermark:
+            processed = (saved or {}).get('processed', 0) if watermark else 0
+            self.journal.save(LEADERBOARD_JOB, collection_name, new_watermark, processed + read, status="done")
+        if watermark is None:
+            print(f"  🏆 {collection_name}: full read of {read} documents")
+        elif touched:
+            print(f"  🏆 {collection_name}: {read} recent writes changed {len(touched)} boards")
+        return touched
+
+    def publish(self, boards: Set[str]) -> int:
+        """Write the entries of the given boards that changed since they were last written"""
+        pending = []
+        for board in sorted(boards | self._failed):
+            top = self.store.top(board, self.top)
+            previous = self.store.written(board)
+            entries = [(user_id, rank, round(score, 6), username or user_id)
+                       for rank, (user_id, score, username) in enumerate(top, start=1)]
+
+            sets = [(entry_reference(self.db, board, user_id), entry_data(board, user_id, username, rank, score))
+                    for user_id, rank, score, username in entries
+                    if previous.get(user_id) != (rank, score, username)]
+            current = {user_id for user_id, *_ in entries}
+            deletes = [entry_reference(self.db, board, user_id) for user_id in previous if user_id not in current]
+            if board != GLOBAL_BOARD and (sets or deletes or not previous):
+                kind, key = board_kind(board)
+                if entries:
+                    sets.append((board_document(self.db, board),
+                                 {'board': kind, 'key': key, 'entries': len(entries),
+                                  'updatedAt': datetime.now(timezone.utc)}))
+                else:
+                    deletes.append(board_document(self.db, board))
+            if not (sets or deletes):
+                continue
+
+            futures = []
+            if sets:
+                futures.append(self.writer.set_many(sets))
+            if deletes:
+                futures.append(self.writer.delete_many(deletes))
+            pending.append((board, entries, futures, len(sets) + len(deletes)))
+
+        # Boards are committed concurrently; only confirmed boards are recorded as written
+        written_total = 0
+        self._failed = set()
+        for board, entries, futures, count in pending:
+            try:
+                for future in futures:
+                    future.result()
+            except Exception as e:
+                print(f"  ❌ Error writing leaderboard {board}: {e}")
+                self._failed.add(board)
+                continue
+            self.store.save_written(board, entries)
+            written_total += count
+        return written_total
+
+    def run_once(self, rebuild: bool = False) -> Dict[str, int]:
+        """Apply new score changes and rewrite the changed entries of the touched boards"""
+        touched: Set[str] = set()
+        results = {}
+        for collection_name in ('users', 'quiz_sessions'):
+            if self._stop.is_set():
+                break
+            with tracer.span("firestore.leaderboard_source", collection=collection_name) as span:
+                boards = self.read_source(collection_name, rebuild)
+                span.set_attribute("boards", len(boards))
+            touched |= boards
+            results[collection_name] = len(boards)
+
+        # Daily boards older than the window are emptied, which deletes their entries
+        first_day = self._first_day()
+        expired = self.store.daily_boards_before(first_day)
+        self.store.expire_days(first_day)
+        touched |= expired
+
+        results['entries_written'] = self.publish(touched)
+        results['failed_boards'] = len(self._failed)
+        if results['entries_written']:
+            print(f"  💾 {results['entries_written']} leaderboard entries written across {len(touched)} boards")
+        self.cycles += 1
+        return results
+
+    def run_forever(self, interval: float = 60.0, after_cycle: Optional[Callable[[], None]] = None):
+        """Update the leaderboards repeatedly, sleeping between cycles, until stop() is called"""
+        print(f"🏆 Updating leaderboards (top {self.top}) every {interval:g}s")
+        while not self._stop.is_set():
+            results = self.run_once()
+            print(f"✅ Cycle {self.cycles}: {results['entries_written']} entries written")
+            if after_cycle is not None:
+                after_cycle()
+            self._stop.wait(interval)
+        self.close()
+        print("👋 Leaderboard materializer stopped")
+
+    def close(self):
+        """Wait for pending writes and close the score store"""
+        self.writer.close()
+        self.store.close()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Firebase Metrics
+Per-collection counters, latency histograms and optional spans for the maintenance tools
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Help text for the Prometheus output; metrics not listed here get a generic one
+METRIC_HELP = {
+    'firestore_page_reads_total': "Paged read queries",
+    'firestore_documents_read_total': "Documents returned by paged read queries",
+    'firestore_page_read_seconds': "Latency of one paged read query",
+    'firestore_count_seconds': "Latency of one count aggregation query",
+    'firestore_commits_total': "Successful batch commits",
+    'firestore_writes_total': "Write operations in successful batch commits",
+    'firestore_commit_seconds': "Latency of one successful batch commit",
+    'firestore_retries_total': "Batch commits retried after a contention error",
+    'firestore_commit_errors_total': "Batch commits that failed without further retries",
+    'firestore_target_ops_per_second': "Current target write rate of the adaptive throttle",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def collection_label(source) -> str:
+    """Collection ID a collection reference or query reads from, for metric labels"""
+    parent = getattr(source, "_parent", None)
+    return getattr(source, "id", None) or getattr(parent, "id", None) or "unknown"
+
+
+def document_collection(ref) -> str:
+    """Collection ID a document reference lives in, for metric labels"""
+    parts = ref.path.rsplit("/", 2)
+    return parts[-2] if len(parts) >= 2 else "unknown"
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Fixed-bucket histogram; observing is one bisect and three additions"""
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile (0..1) by interpolating inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Thread-safe store of counters, gauges and latency histograms
+
+        Every metric is keyed by name and labels (usually the collection).
+        Recording takes one lock and a dictionary lookup, and the tools only
+        record per page or per batch commit, never per document, so the cost
+        stays negligible next to a Firestore round trip.
+
+        Args:
+            buckets: Upper bounds (seconds) of the histogram buckets
+        """
+        self.buckets = buckets
+        self.started_at = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        """Set a gauge"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        """Record a latency sample in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def reset(self):
+        """Drop every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+        self.started_at = datetime.now(timezone.utc)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return every metric as a JSON-serializable report"""
+        def _ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            gauges = [{'name': name, 'labels': dict(labels), 'value': value}
+                      for (name, labels), value in sorted(self._gauges.items())]
+            histograms = [{
+                'name': name,
+                'labels': dict(labels),
+                'count': histogram.count,
+                'sum_seconds': round(histogram.sum, 6),
+                'mean_ms': _ms(histogram.sum / histogram.count) if histogram.count else None,
+                'p50_ms': _ms(histogram.quantile(0.5)),
+                'p99_ms': _ms(histogram.quantile(0.99)),
+            } for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0])]
+        return {
+            'started_at': self.started_at.isoformat(),
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def write_json(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """Write the summary report as JSON"""
+        report = self.summary()
+        report.update(extra or {})
+        _write_atomically(path, json.dumps(report, indent=2))
+
+    def prometheus_text(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        def _labels(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines: List[str] = []
+        typed = set()
+
+        def _header(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name.replace('_', ' '))}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                _header(name, "counter")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                _header(name, "gauge")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                _header(name, "histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels, (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write a .prom file for the node_exporter textfile collector"""
+        _write_atomically(path, self.prometheus_text())
+
+
+def _write_atomically(path: str, text: str):
+    """Replace a file in one step so collectors never read a partial file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+class _NullSpan:
+    """Span used while tracing is off; entering and leaving it does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("firebase_span", default=None)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attributes", "trace_id", "span_id", "parent_id",
+                 "start_ns", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        record = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'name': self.name,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': end_ns,
+            'attributes': self.attributes,
+            'status': {'code': 'ERROR', 'message': str(exc)} if exc else {'code': 'OK'},
+        }
+        self.tracer._emit(record)
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+
+class Tracer:
+    def __init__(self):
+        """
+        Optional spans around operations, pages and commits
+
+        Off by default, in which case span() returns a shared no-op. Spans
+        can go to the OpenTelemetry API (configure("otel"), exported however
+        the OpenTelemetry SDK is configured) or, without any dependency, to a
+        JSON-lines file using OpenTelemetry's span field names. Parent spans
+        follow contextvars, which PipelinedWriter carries into its commit
+        threads, so commits nest under the clear/export/import they belong to.
+        """
+        self.enabled = False
+        self._otel_tracer = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def configure(self, target: Optional[str]):
+        """Enable tracing to "otel" or to a JSON-lines file path; None disables it"""
+        self.close()
+        if not target:
+            return
+        if target == "otel":
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                print("⚠️ opentelemetry-api is not installed; tracing disabled")
+                return
+            self._otel_tracer = trace.get_tracer("firebase-tools")
+        else:
+            self._file = open(target, "a", encoding="utf-8")
+        self.enabled = True
+
+    def span(self, name: str, **attributes: Any):
+        """Context manager timing one unit of work"""
+        if not self.enabled:
+            return NULL_SPAN
+        if self._otel_tracer is not None:
+            return self._otel_tracer.start_as_current_span(name, attributes=attributes)
+        return _Span(self, name, attributes)
+
+    def _emit(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def close(self):
+        """Flush and stop tracing"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._otel_tracer = None
+        self.enabled = False
+
+
+# Process-wide instances every tool records into
+metrics = MetricsRegistry()
+tracer = Tracer()
+
+
+def add_metrics_arguments(parser):
+    """Add the --metrics-json, --metrics-textfile and --trace options to a parser"""
+    group = parser.add_argument_group("metrics")
+    group.add_argument("--metrics-json", metavar="PATH", help="write a JSON metrics summary on exit")
+    group.add_argument("--metrics-textfile", metavar="PATH",
+                       help="write Prometheus metrics (node_exporter textfile collector, *.prom)")
+    group.add_argument("--trace", metavar="FILE|otel",
+                       help="record spans to a JSON-lines file, or to OpenTelemetry with 'otel'")
+
+
+def configure_metrics(args):
+    """Apply the metrics options parsed by add_metrics_arguments"""
+    tracer.configure(getattr(args, "trace", None))
+
+
+def write_metrics(args, **extra: Any):
+    """Write the metrics outputs requested on the command line"""
+    if getattr(args, "metrics_json", None):
+        metrics.write_json(args.metrics_json, extra)
+    if getattr(args, "metrics_textfile", None):
+        metrics.write_prometheus(args.metrics_textfile)
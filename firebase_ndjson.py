@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Firebase NDJSON Shards
+Encoding of Firestore documents as gzip-compressed, newline-delimited JSON shards
+"""
+
+import base64
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Each line of a shard is {"path": "<document path>", "data": {<fields>}}.
+# Values JSON cannot represent are wrapped in single-key tagged objects.
+TIMESTAMP_TAG = "$timestamp"
+REFERENCE_TAG = "$ref"
+GEOPOINT_TAG = "$geopoint"
+BYTES_TAG = "$bytes"
+
+SHARD_SUFFIX = ".ndjson.gz"
+
+
+def encode_value(value: Any) -> Any:
+    """Convert a Firestore field value into a JSON-serializable value"""
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, datetime):
+        return {TIMESTAMP_TAG: value.isoformat()}
+    if isinstance(value, bytes):
+        return {BYTES_TAG: base64.b64encode(value).decode("ascii")}
+    if hasattr(value, "latitude") and hasattr(value, "longitude"):
+        return {GEOPOINT_TAG: [value.latitude, value.longitude]}
+    if hasattr(value, "path") and hasattr(value, "parent"):
+        return {REFERENCE_TAG: value.path}
+    return value
+
+
+def decode_value(value: Any, db=None) -> Any:
+    """
+    Convert a value produced by encode_value back into a Firestore field value
+
+    Args:
+        value: Decoded JSON value
+        db: Firestore client, needed to rebuild document references
+    """
+    if isinstance(value, list):
+        return [decode_value(item, db) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        (tag, payload), = value.items()
+        if tag == TIMESTAMP_TAG:
+            return datetime.fromisoformat(payload)
+        if tag == BYTES_TAG:
+            return base64.b64decode(payload)
+        if tag == GEOPOINT_TAG:
+            from google.cloud.firestore import GeoPoint
+            return GeoPoint(payload[0], payload[1])
+        if tag == REFERENCE_TAG and db is not None:
+            return db.document(payload)
+    return {key: decode_value(item, db) for key, item in value.items()}
+
+
+def encode_record(path: str, data: Dict[str, Any]) -> str:
+    """Serialize a document path and its fields as one NDJSON line (without newline)"""
+    return json.dumps({'path': path, 'data': encode_value(data)},
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_document(snapshot) -> str:
+    """Serialize a document snapshot as one NDJSON line (without newline)"""
+    return encode_record(snapshot.reference.path, snapshot.to_dict())
+
+
+class ShardWriter:
+    def __init__(self, directory: str, prefix: str, max_docs_per_shard: int = 100_000,
+                 compresslevel: int = 6):
+        """
+        Write NDJSON lines into numbered gzip shards, starting a new shard
+        every max_docs_per_shard documents
+
+        Args:
+            directory: Directory the shards are written to
+            prefix: File name prefix, e.g. "part-003"
+            max_docs_per_shard: Documents per shard before rotating
+            compresslevel: gzip compression level (1 fastest, 9 smallest)
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_docs_per_shard = max_docs_per_shard
+        self.compresslevel = compresslevel
+        self.shards: List[Dict[str, Any]] = []
+        self.count = 0
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_next(self):
+        self.close()
+        name = f"{self.prefix}-{len(self.shards):05d}{SHARD_SUFFIX}"
+        self._file = gzip.open(os.path.join(self.directory, name), "wt", encoding="utf-8",
+                               compresslevel=self.compresslevel)
+        self.shards.append({'file': name, 'documents': 0})
+
+    def write_lines(self, lines: List[str]):
+        """Append encoded documents, rotating shards as needed"""
+        for line in lines:
+            if self._file is None or self.shards[-1]['documents'] >= self.max_docs_per_shard:
+                self._open_next()
+            self._file.write(line)
+            self._file.write("\n")
+            self.shards[-1]['documents'] += 1
+            self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_shard_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield {"path", "data"} records from one shard without loading it whole"""
+    with gzip.open(path, "rt", encoding="utf-8") as shard:
+        for line in shard:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_shard_lines(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (document path, raw line) pairs from one shard, keeping lines encoded"""
+    with gzip.open(path, "rt", encoding="utf-8") as shard:
+        for line in shard:
+            line = line.rstrip("\n")
+            if line:
+                yield json.loads(line)['path'], line
+
+
+def find_shards(directory: str, collections: Optional[List[str]] = None) -> List[str]:
+    """List shard files under an export directory, optionally for some collections only"""
+    shards = []
+    for root, _, files in os.walk(directory):
+        collection_name = os.path.relpath(root, directory).split(os.sep)[0]
+        if collections and collection_name not in collections:
+            continue
+        shards.extend(os.path.join(root, name) for name in files if name.endswith(SHARD_SUFFIX))
+    return sorted(shards)
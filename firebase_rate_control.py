@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Firebase Rate Control
+Adaptive write throttle following Firestore's 500/50/5 traffic ramp-up guidance
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+# Firestore guidance: start at 500 ops/sec, grow by 50% every 5 minutes
+DEFAULT_INITIAL_OPS_PER_SECOND = 500
+DEFAULT_RAMP_FACTOR = 1.5
+DEFAULT_RAMP_INTERVAL = 300.0
+
+MAX_BATCH_SIZE = 500
+MIN_BATCH_SIZE = 20
+
+CONTENTION_ERRORS = {"ResourceExhausted", "Aborted", "TooManyRequests"}
+CONTENTION_STATUS_CODES = {"RESOURCE_EXHAUSTED", "ABORTED"}
+
+
+def is_contention_error(error: Exception) -> bool:
+    """Check whether an error means Firestore wants us to slow down"""
+    if type(error).__name__ in CONTENTION_ERRORS:
+        return True
+    status_code = getattr(error, "grpc_status_code", None)
+    return getattr(status_code, "name", None) in CONTENTION_STATUS_CODES
+
+
+class AdaptiveRateController:
+    def __init__(self, initial_ops_per_second: float = DEFAULT_INITIAL_OPS_PER_SECOND,
+                 max_ops_per_second: Optional[float] = None,
+                 min_ops_per_second: float = 20,
+                 ramp_interval: float = DEFAULT_RAMP_INTERVAL,
+                 recovery_interval: float = 10.0,
+                 ramp_factor: float = DEFAULT_RAMP_FACTOR,
+                 backoff_factor: float = 0.5,
+                 base_retry_delay: float = 1.0,
+                 max_retry_delay: float = 60.0,
+                 max_retries: int = 10):
+        """
+        Token-bucket write throttle shared by every bulk write path
+
+        The target rate starts at initial_ops_per_second and grows by
+        ramp_factor after each ramp_interval without contention (500/50/5).
+        RESOURCE_EXHAUSTED/ABORTED errors cut the rate and the batch size and
+        return an exponentially growing retry delay; once commits succeed
+        again the rate climbs back to its previous peak every
+        recovery_interval before resuming the normal ramp.
+
+        Args:
+            initial_ops_per_second: Starting write rate
+            max_ops_per_second: Upper bound for the write rate (optional)
+            min_ops_per_second: Lower bound the rate never drops below
+            ramp_interval: Seconds of clean commits between normal ramp-ups
+            recovery_interval: Seconds of clean commits between ramp-ups after a backoff
+            ramp_factor: Rate multiplier applied on each ramp-up
+            backoff_factor: Rate multiplier applied on each contention error
+            base_retry_delay: Retry delay after the first contention error
+            max_retry_delay: Upper bound for the retry delay
+            max_retries: Retries allowed per batch before giving up
+        """
+        self.max_ops_per_second = max_ops_per_second
+        self.min_ops_per_second = min_ops_per_second
+        self.ramp_interval = ramp_interval
+        self.recovery_interval = recovery_interval
+        self.ramp_factor = ramp_factor
+        self.backoff_factor = backoff_factor
+        self.base_retry_delay = base_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._rate = self._clamp(initial_ops_per_second)
+        self._peak_rate = self._rate
+        self._batch_size = MAX_BATCH_SIZE
+        self._next_free_at = time.monotonic()
+        self._last_change_at = self._next_free_at
+        self._consecutive_failures = 0
+
+        self.contention_errors = 0
+        self.retries = 0
+
+    def _clamp(self, rate: float) -> float:
+        rate = max(self.min_ops_per_second, rate)
+        if self.max_ops_per_second:
+            rate = min(self.max_ops_per_second, rate)
+        return rate
+
+    @property
+    def target_ops_per_second(self) -> float:
+        """Current target write rate"""
+        return self._rate
+
+    @property
+    def batch_size(self) -> int:
+        """Operations per batch commit at the current contention level"""
+        return self._batch_size
+
+    def reserve(self, ops: int) -> float:
+        """Reserve a slot for ops writes and return how long to wait before sending them"""
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_free_at)
+            self._next_free_at = start_at + ops / self._rate
+        return start_at - now
+
+    def acquire(self, ops: int):
+        """Block until ops writes may be sent at the current target rate"""
+        delay = self.reserve(ops)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_success(self, ops: int):
+        """Record a successful commit and ramp the rate up when it is due"""
+        with self._lock:
+            self._consecutive_failures = 0
+            now = time.monotonic()
+            recovering = self._rate < self._peak_rate
+            interval = self.recovery_interval if recovering else self.ramp_interval
+            if now - self._last_change_at < interval:
+                return
+
+            new_rate = self._rate * self.ramp_factor
+            if recovering:
+                new_rate = min(new_rate, self._peak_rate)
+            self._rate = self._clamp(new_rate)
+            self._peak_rate = max(self._peak_rate, self._rate)
+            self._batch_size = min(MAX_BATCH_SIZE, self._batch_size * 2)
+            self._last_change_at = now
+
+    def record_contention(self) -> float:
+        """Back off after a contention error and return how long to wait before retrying"""
+        with self._lock:
+            self.contention_errors += 1
+            self.retries += 1
+            self._consecutive_failures += 1
+            self._rate = self._clamp(self._rate * self.backoff_factor)
+            self._batch_size = max(MIN_BATCH_SIZE, self._batch_size // 2)
+            self._last_change_at = time.monotonic()
+            delay = self.base_retry_delay * (2 ** (self._consecutive_failures - 1))
+        return min(self.max_retry_delay, delay) * random.uniform(0.5, 1.0)
+
+    def stats(self) -> Dict[str, float]:
+        """Current controller state for progress output and tuning"""
+        return {
+            'target_ops_per_second': round(self._rate, 1),
+            'peak_ops_per_second': round(self._peak_rate, 1),
+            'batch_size': self._batch_size,
+            'contention_errors': self.contention_errors,
+            'retries': self.retries
+        }
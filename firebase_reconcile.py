@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Firebase Balance Reconciler
+Check every user's stored balances against their transactions and bets in one
+merge-join pass, split by userId range across processes
+"""
+
+import heapq
+import itertools
+import json
+import os
+from datetime import datetime, timezone
+import multiprocessing
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from firebase_ndjson import ShardWriter
+from firebase_rate_control import AdaptiveRateController
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter, ThroughputMeter, count_documents, iter_query_pages
+
+# Transaction types balanceService writes; any other type is an addBalance/deductBalance adjustment
+DEPOSIT = "deposit"
+QUIZ_WIN = "quiz_win"
+QUIZ_LOSS = "quiz_loss"
+WITHDRAWAL = "withdrawal"
+
+# Statuses a rejected transaction ends up with (dataService.rejectTransaction sets 'failed',
+# rejectDeposit 'rejected'). Rejecting a withdrawal only sets the status: the app neither
+# refunds availableBalance nor takes the amount off totalWithdrawn
+REJECTED_STATUSES = {'rejected', 'failed', 'cancelled'}
+
+# User fields checked, and the fields each ledger collection is read with
+BALANCE_FIELDS = ['playableBalance', 'totalDeposited', 'totalWithdrawn']
+USER_FIELDS = ['userId', 'bonusBalance', 'updatedAt'] + BALANCE_FIELDS
+TRANSACTION_FIELDS = ['userId', 'type', 'amount', 'status']
+BET_FIELDS = ['userId', 'betAmount']
+
+# Fields apply=True writes back. playableBalance also moves on credits the ledger
+# does not attribute to a user, so it is only corrected with apply_playable=True
+CORRECTED_FIELDS = ['totalDeposited', 'totalWithdrawn']
+
+SUMMARY_FILE = "summary.json"
+
+
+def _number(value: Any) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def expected_balances(transactions: List[Dict[str, Any]], bets: List[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Balances implied by one user's ledger, following balanceService
+
+    placeBet takes betAmount from playableBalance; processBetResult adds the
+    quiz_win amount back (quiz_loss only records the loss); approveDeposit
+    adds completed deposits; addBalance/deductBalance move playableBalance
+    by their signed amount. withdrawMoney only changes availableBalance and
+    totalWithdrawn, and rejecting the withdrawal later changes neither, so
+    every withdrawal counts towards totalWithdrawn whatever its status (see
+    rejected_withdrawals).
+
+    Some credits never reach a user's ledger, so the expected
+    playableBalance can be too low: dataService.checkLevelUp writes its
+    level_bonus transaction without a userId, and the Quiz.jsx streak bonus
+    calls dataService.addTransaction, which does not exist, so no
+    transaction is written at all.
+    """
+    deposits = wins = adjustments = withdrawn = 0.0
+    for transaction in transactions:
+        kind = transaction.get('type')
+        status = transaction.get('status')
+        amount = _number(transaction.get('amount'))
+        if kind == WITHDRAWAL:
+            withdrawn += abs(amount)
+        elif status != 'completed' or kind == QUIZ_LOSS:
+            continue
+        elif kind == DEPOSIT:
+            deposits += amount
+        elif kind == QUIZ_WIN:
+            wins += amount
+        else:
+            adjustments += amount
+    staked = sum(_number(bet.get('betAmount')) for bet in bets)
+    return {
+        'playableBalance': round(deposits + wins + adjustments - staked, 2),
+        'totalDeposited': round(deposits, 2),
+        'totalWithdrawn': round(withdrawn, 2)
+    }
+
+
+def rejected_withdrawals(transactions: List[Dict[str, Any]]) -> List[float]:
+    """Amounts of the rejected withdrawals in one user's ledger, which the app never refunded"""
+    return [round(abs(_number(transaction.get('amount'))), 2) for transaction in transactions
+            if transaction.get('type') == WITHDRAWAL and transaction.get('status') in REJECTED_STATUSES]
+
+
+def userid_bounds(db, partitions: int, page_size: int = 1000) -> List[Optional[str]]:
+    """
+    Split the userId key space into ranges holding similar numbers of users
+
+    Returns partitions + 1 boundaries; the first and last are None (open).
+    userIds are not uniformly distributed (tg_..., ext_..., auth UIDs), so
+    the bounds are quantiles taken from one keys-only pass over users.
+    """
+    if partitions <= 1:
+        return [None, None]
+    users = db.collection('users')
+    total = count_documents(users)
+    step = max(1, total // partitions)
+    bounds: List[Optional[str]] = [None]
+    seen = 0
+    query = users.select(['userId']).order_by('userId').order_by(DOCUMENT_ID)
+    for snapshots in iter_query_pages(query, page_size, order_field='userId'):
+        for snapshot in snapshots:
+            seen += 1
+            user_id = (snapshot.to_dict() or {}).get('userId')
+            if seen % step == 0 and len(bounds) < partitions and isinstance(user_id, str) \
+                    and (bounds[-1] is None or user_id > bounds[-1]):
+                bounds.append(user_id)
+    return bounds + [None]
+
+
+class BalanceReconciler:
+    def __init__(self, db, page_size: int = 1000, tolerance: float = 0.01,
+                 writer: Optional[PipelinedWriter] = None):
+        """
+        Compare stored balances with the ledger for one userId range at a time
+
+        users, transactions and bets are each read ordered by userId (the
+        automatic single-field indexes), selecting only the fields the check
+        uses, and merged on userId. Memory holds one page per stream plus
+        one user's ledger rows, whatever the collection sizes.
+
+        Args:
+            db: Firestore client
+            page_size: Documents read per query page
+            tolerance: Largest difference treated as rounding
+            writer: Writer for corrective updates (only needed with apply=True)
+
+        With apply=True only totalDeposited and totalWithdrawn are written
+        back; a playableBalance mismatch may be a level or streak bonus the
+        ledger cannot see (see expected_balances) and is reported unless
+        apply_playable=True is also passed.
+        """
+        self.db = db
+        self.page_size = page_size
+        self.tolerance = tolerance
+        self.writer = writer
+
+    def _stream(self, collection_name: str, fields: List[str], lower: Optional[str],
+                upper: Optional[str]) -> Iterator[Tuple[str, str, Any]]:
+        """Yield (userId, collection, snapshot) in userId order for one range"""
+        query = self.db.collection(collection_name).select(fields)
+        if lower is not None:
+            query = query.where('userId', '>=', lower)
+        if upper is not None:
+            query = query.where('userId', '<', upper)
+        query = query.order_by('userId').order_by(DOCUMENT_ID)
+        for snapshots in iter_query_pages(query, self.page_size, order_field='userId'):
+            for snapshot in snapshots:
+                user_id = (snapshot.to_dict() or {}).get('userId')
+                # Numbers sort before strings in Firestore; they cannot be merged with string keys
+                if isinstance(user_id, str):
+                    yield user_id, collection_name, snapshot
+
+    def reconcile_range(self, lower: Optional[str], upper: Optional[str], report: ShardWriter,
+                        apply: bool = False, started_at: Optional[datetime] = None,
+                        label: str = "reconcile", apply_playable: bool = False) -> Dict[str, int]:
+        """Check every user in [lower, upper), writing discrepancies to the report"""
+        streams = [self._stream('users', USER_FIELDS, lower, upper),
+                   self._stream('transactions', TRANSACTION_FIELDS, lower, upper),
+                   self._stream('bets', BET_FIELDS, lower, upper)]
+        merged = heapq.merge(*streams, key=lambda row: row[0])
+        counts = {'users': 0, 'ledger_rows': 0, 'discrepancies': 0, 'orphans': 0, 'corrected': 0,
+                  'skipped_corrections': 0, 'rejected_withdrawals': 0}
+        meter = ThroughputMeter(label, icon="🧮")
+        lines: List[str] = []
+        corrections: List[tuple] = []
+        futures = []
+
+        for user_id, rows in itertools.groupby(merged, key=lambda row: row[0]):
+            users, transactions, bets = [], [], []
+            for _, collection_name, snapshot in rows:
+                data = snapshot.to_dict() or {}
+                if collection_name == 'users':
+                    users.append((snapshot, data))
+                elif collection_name == 'transactions':
+                    transactions.append(data)
+                else:
+                    bets.append(data)
+            counts['ledger_rows'] += len(transactions) + len(bets)
+            meter.add(len(users) + len(transactions) + len(bets))
+
+            if not users:
+                counts['orphans'] += 1
+                lines.append(json.dumps({'userId': user_id, 'issue': 'no_user',
+                                         'transactions': len(transactions), 'bets': len(bets)}))
+                continue
+
+            expected = expected_balances(transactions, bets)
+            rejected = rejected_withdrawals(transactions)
+            for snapshot, data in users:
+                counts['users'] += 1
+                if rejected:
+                    # Owed a refund the app never made; left to an admin, never corrected here
+                    counts['rejected_withdrawals'] += 1
+                    lines.append(json.dumps({'userId': user_id, 'path': snapshot.reference.path,
+                                             'issue': 'rejected_withdrawal', 'withdrawals': len(rejected),
+                                             'amount': round(sum(rejected), 2)}))
+                differences = {field: {'stored': _number(data.get(field)), 'expected': expected[field],
+                                       'difference': round(_number(data.get(field)) - expected[field], 2)}
+                               for field in BALANCE_FIELDS
+                               if abs(_number(data.get(field)) - expected[field]) > self.tolerance}
+                if not differences:
+                    continue
+                counts['discrepancies'] += 1
+                record = {'userId': user_id, 'path': snapshot.reference.path, 'issue': 'mismatch',
+                          'fields': differences, 'transactions': len(transactions), 'bets': len(bets)}
+                if len(users) > 1:
+                    record['duplicate_user_documents'] = len(users)
+
+                if apply:
+                    updated_at = data.get('updatedAt')
+                    if isinstance(updated_at, datetime) and started_at is not None and updated_at >= started_at:
+                        # Written after the ledger was read; the next run checks it again
+                        record['correction'] = 'skipped: user changed during the run'
+                        counts['skipped_corrections'] += 1
+                    else:
+                        update = {field: expected[field] for field in differences
+                                  if field in CORRECTED_FIELDS or (apply_playable and field == 'playableBalance')}
+                        if 'playableBalance' in update:
+                            update['availableBalance'] = round(update['playableBalance']
+                                                               + _number(data.get('bonusBalance')), 2)
+                        if update:
+                            update['reconciledAt'] = datetime.now(timezone.utc)
+                            corrections.append((snapshot.reference, update))
+                            counts['corrected'] += 1
+                        if 'playableBalance' in differences and 'playableBalance' not in update:
+                            record['correction'] = ('applied except playableBalance' if update
+                                                    else 'skipped: playableBalance needs --apply-playable')
+                        else:
+                            record['correction'] = 'applied'
+                lines.append(json.dumps(record))
+
+            if len(lines) >= self.page_size:
+                report.write_lines(lines)
+                lines = []
+            if len(corrections) >= self.page_size:
+                futures.append(self.writer.set_many(corrections, merge=True))
+                corrections = []
+
+        report.write_lines(lines)
+        if corrections:
+            futures.append(self.writer.set_many(corrections, merge=True))
+        for future in futures:
+            future.result()
+        return counts
+
+
+# Per-process state, set up by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(project_id: Optional[str], service_account_path: Optional[str], page_size: int,
+                 tolerance: float, apply: bool, max_ops_per_second: float):
+    from clear_firebase_data import connect_firestore
+
+    db = connect_firestore(project_id, service_account_path)
+    _worker['reconciler'] = _make_reconciler(db, page_size, tolerance, apply, max_ops_per_second)
+
+
+def _make_reconciler(db, page_size: int, tolerance: float, apply: bool,
+                     max_ops_per_second: float) -> BalanceReconciler:
+    writer = None
+    if apply:
+        writer = PipelinedWriter(db, max_in_flight=2, rate_controller=AdaptiveRateController(
+            initial_ops_per_second=min(max_ops_per_second, 100), max_ops_per_second=max_ops_per_second))
+    return BalanceReconciler(db, page_size, tolerance, writer)
+
+
+def _run_partition(task: tuple) -> Dict[str, Any]:
+    index, lower, upper, output_dir, apply, apply_playable, started_at = task
+    reconciler = _worker['reconciler']
+    report = ShardWriter(output_dir, f"part-{index:03d}")
+    try:
+        counts = reconciler.reconcile_range(lower, upper, report, apply, started_at, label=f"range {index}",
+                                            apply_playable=apply_playable)
+    finally:
+        report.close()
+    return dict(counts, partition=index, lower=lower, upper=upper, shards=report.shards)
+
+
+def reconcile_balances(output_dir: str, db=None, project_id: Optional[str] = None,
+                       service_account_path: Optional[str] = None, partitions: int = 8,
+                       processes: int = 1, page_size: int = 1000, tolerance: float = 0.01,
+                       apply: bool = False, max_ops_per_second: float = 200,
+                       apply_playable: bool = False) -> Dict[str, Any]:
+    """
+    Reconcile every user and write the discrepancy report to output_dir
+
+    The userId space is cut into partitions ranges. With processes > 1 the
+    ranges run on a pool of spawned processes, each with its own Firestore
+    client (a forked child would inherit the parent's gRPC channel, which
+    userid_bounds has already used); otherwise they run one after another on db. The report is one NDJSON
+    shard set per range plus summary.json with the totals. apply writes
+    back totalDeposited and totalWithdrawn; apply_playable also writes
+    playableBalance and availableBalance.
+    """
+    started_at = datetime.now(timezone.utc)
+    if db is None:
+        from clear_firebase_data import connect_firestore
+        db = connect_firestore(project_id, service_account_path)
+
+    bounds = userid_bounds(db, partitions, page_size)
+    tasks = [(index, lower, upper, output_dir, apply, apply and apply_playable, started_at)
+             for index, (lower, upper) in enumerate(zip(bounds, bounds[1:]))]
+    mode = "report only"
+    if apply:
+        mode = "applying corrections" + (" including playableBalance" if apply_playable else " to totals only")
+    print(f"🧮 Reconciling balances over {len(tasks)} userId ranges with {processes} processes ({mode})")
+
+    results = []
+    if processes > 1:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes, _init_worker, (project_id, service_account_path, page_size, tolerance,
+                                                    apply, max_ops_per_second)) as pool:
+            results = list(pool.imap_unordered(_run_partition, tasks))
+    else:
+        _worker['reconciler'] = _make_reconciler(db, page_size, tolerance, apply, max_ops_per_second)
+        try:
+            results = [_run_partition(task) for task in tasks]
+        finally:
+            writer = _worker.pop('reconciler').writer
+            if writer is not None:
+                writer.close()
+
+    totals = {key: sum(result[key] for result in results)
+              for key in ('users', 'ledger_rows', 'discrepancies', 'orphans', 'corrected', 'skipped_corrections',
+                          'rejected_withdrawals')}
+    summary = dict(totals, started_at=started_at.isoformat(), finished_at=datetime.now(timezone.utc).isoformat(),
+                   tolerance=tolerance, applied=apply, applied_playable=apply and apply_playable,
+                   partitions=sorted(results, key=lambda result: result['partition']))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"  ✅ {totals['users']} users, {totals['ledger_rows']} ledger rows checked")
+    print(f"  {'⚠️' if totals['discrepancies'] else '✅'} {totals['discrepancies']} users with mismatched balances, "
+          f"{totals['orphans']} userIds with ledger rows but no user")
+    if totals['rejected_withdrawals']:
+        print(f"  ⚠️ {totals['rejected_withdrawals']} users with rejected withdrawals that were never refunded")
+    if apply:
+        print(f"  🔧 {totals['corrected']} corrected, {totals['skipped_corrections']} skipped (changed during the run)")
+    print(f"  📄 Report: {output_dir}")
+    return summary
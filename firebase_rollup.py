@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Firebase Stats Rollup
+Maintain the admin dashboard aggregates in precomputed stats documents so a
+dashboard load reads one document instead of whole collections
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from firebase_checkpoint import JobJournal
+from firebase_metrics import tracer
+from firebase_schema import change_field_for, time_value
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter, ThroughputMeter, iter_query_pages
+
+# Collection holding one precomputed document per dashboard
+STATS_COLLECTION = "stats"
+
+# Job name used for change watermarks in the journal
+ROLLUP_JOB = "rollup"
+
+
+def changes_query(db, collection_name: str, watermark: str, overlap_seconds: float, fields: List[str]):
+    """Query for documents written after watermark - overlap, ordered by the change field"""
+    change_field, kind = change_field_for(collection_name)
+    moment = datetime.fromisoformat(watermark.replace("Z", "+00:00"))
+    since = time_value(moment - timedelta(seconds=overlap_seconds), kind)
+    return (db.collection(collection_name)
+            .where(change_field, '>', since)
+            .select(sorted(set(fields) | {change_field}))
+            .order_by(change_field)
+            .order_by(DOCUMENT_ID))
+
+
+def advance_watermark(watermark: str, value: Any) -> Optional[str]:
+    """Return the change value as a new watermark if it is later than the current one"""
+    if value is None:
+        return None
+    value = value.isoformat() if isinstance(value, datetime) else value
+    if datetime.fromisoformat(value.replace("Z", "+00:00")) > datetime.fromisoformat(watermark.replace("Z", "+00:00")):
+        return value
+    return None
+
+
+def _number(value: Any) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def _tidy(value: float) -> float:
+    """Drop the float noise summed deltas pick up; counts come back as ints"""
+    value = round(value, 6)
+    return int(value) if value.is_integer() else value
+
+
+def bet_counters(data: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        'totalBets': 1,
+        'totalBetAmount': _number(data.get('betAmount')),
+        'totalWinAmount': _number(data.get('winAmount')),
+        'totalLossAmount': _number(data.get('lossAmount')),
+        'wonBets': 1 if data.get('status') == 'won' else 0
+    }
+
+
+def tournament_counters(data: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        'totalTournaments': 1,
+        'activeTournaments': 1 if data.get('status') == 'active' else 0,
+        'completedTournaments': 1 if data.get('status') == 'completed' else 0,
+        'totalParticipants': _number(data.get('currentParticipants')),
+        'totalPool': _number(data.get('totalPool')),
+        'totalFees': _number(data.get('appFee'))
+    }
+
+
+def house_stats(totals: Dict[str, float]) -> Dict[str, Any]:
+    """Same fields as balanceService.getHouseStats()"""
+    stats = {name: totals.get(name, 0) for name in
+             ('totalUsers', 'totalBets', 'totalBetAmount', 'totalWinAmount', 'totalLossAmount')}
+    stats['houseProfit'] = 0
+    stats['averageWinRate'] = 0
+    if stats['totalBets'] > 0:
+        stats['houseProfit'] = stats['totalLossAmount'] - stats['totalWinAmount']
+        stats['averageWinRate'] = totals.get('wonBets', 0) / stats['totalBets'] * 100
+    return stats
+
+
+def tournament_stats(totals: Dict[str, float]) -> Dict[str, Any]:
+    """Same fields as tournamentService.getTournamentStats()"""
+    return {name: totals.get(name, 0) for name in
+            ('totalTournaments', 'activeTournaments', 'completedTournaments',
+             'totalParticipants', 'totalPool', 'totalFees')}
+
+
+def security_stats(totals: Dict[str, float]) -> Dict[str, Any]:
+    """The collection-wide fields of quizSecurityService.getSecurityStats()"""
+    return {name: totals.get(name, 0) for name in ('totalUsers', 'blockedUsers', 'securityFlags')}
+
+
+# Stats documents: the counters each source collection contributes per document,
+# and how the summed counters become the fields the dashboard reads
+ROLLUPS = {
+    'house': {
+        'sources': {
+            'bets': (bet_counters, ['betAmount', 'winAmount', 'lossAmount', 'status']),
+            'users': (lambda data: {'totalUsers': 1}, [])
+        },
+        'finalize': house_stats
+    },
+    'tournaments': {
+        'sources': {
+            'tournaments': (tournament_counters, ['status', 'currentParticipants', 'totalPool', 'appFee'])
+        },
+        'finalize': tournament_stats
+    },
+    'security': {
+        'sources': {
+            'users': (lambda data: {'totalUsers': 1}, []),
+            'user_blocks': (lambda data: {'blockedUsers': 1 if data.get('status') == 'active' else 0},
+                            ['status']),
+            'security_flags': (lambda data: {'securityFlags': 1}, [])
+        },
+        'finalize': security_stats
+    }
+}
+
+
+class RollupStore:
+    def __init__(self, path: str):
+        """
+        Local record of what every document contributed to the rollup totals
+
+        A changed document is applied as the difference between its new and
+        its recorded counters, so re-reading an unchanged document (the
+        watermark overlap, a restart) changes nothing. Every row carries the
+        generation of the full pass that last saw it; after a full pass the
+        rows it did not see belong to deleted documents and are subtracted.
+
+        Args:
+            path: SQLite file; usually the job journal's
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_documents (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                counters TEXT NOT NULL,
+                generation INTEGER NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_totals (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            )
+        """)
+
+    def generation(self, collection_name: str) -> int:
+        """Generation of the latest full pass over a collection (0 before the first)"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(generation) FROM rollup_documents WHERE collection = ?",
+                                     (collection_name,)).fetchone()
+        return row[0] or 0
+
+    def _add(self, deltas: Dict[str, float], counters: Dict[str, float], sign: int):
+        for name, value in counters.items():
+            deltas[name] = deltas.get(name, 0) + sign * value
+
+    def apply(self, collection_name: str, documents: List[tuple], generation: int) -> int:
+        """Record a page of (document ID, counters) and update the totals; return how many changed"""
+        deltas: Dict[str, float] = {}
+        changed = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for doc_id, counters in documents:
+                    row = self._conn.execute(
+                        "SELECT counters FROM rollup_documents WHERE collection = ? AND doc_id = ?",
+                        (collection_name, doc_id)).fetchone()
+                    previous = json.loads(row[0]) if row else {}
+                    if previous != counters:
+                        self._add(deltas, previous, -1)
+                        self._add(deltas, counters, 1)
+                        changed += 1
+                    self._conn.execute(
+                        "INSERT INTO rollup_documents (collection, doc_id, counters, generation) "
+                        "VALUES (?, ?, ?, ?) ON CONFLICT (collection, doc_id) DO UPDATE SET "
+                        "counters = excluded.counters, generation = excluded.generation",
+                        (collection_name, doc_id, json.dumps(counters, sort_keys=True), generation))
+                self._apply_totals(deltas)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return changed
+
+    def sweep(self, collection_name: str, generation: int) -> int:
+        """Subtract and forget documents a full pass of the given generation did not see"""
+        deltas: Dict[str, float] = {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                rows = self._conn.execute(
+                    "SELECT counters FROM rollup_documents WHERE collection = ? AND generation < ?",
+                    (collection_name, generation)).fetchall()
+                for (counters,) in rows:
+                    self._add(deltas, json.loads(counters), -1)
+                self._conn.execute("DELETE FROM rollup_documents WHERE collection = ? AND generation < ?",
+                                   (collection_name, generation))
+                self._apply_totals(deltas)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def _apply_totals(self, deltas: Dict[str, float]):
+        for name, delta in deltas.items():
+            if delta:
+                self._conn.execute(
+                    "INSERT INTO rollup_totals (name, value) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (name, delta))
+
+    def totals(self) -> Dict[str, float]:
+        """Current sum of every counter, keyed '<collection>.<counter>'"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, value FROM rollup_totals").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class StatsRollup:
+    def __init__(self, db, journal: JobJournal, rollups: List[str] = None, page_size: int = 500,
+                 overlap_seconds: float = 300.0, rescan_every: int = 288):
+        """
+        Keep the stats documents up to date from each collection's change watermark
+
+        The first run reads every source collection once (users feed both
+        the house and security stats from the same pass), selecting only
+        the fields the counters use. After that, cycles query
+        `updatedAt > watermark - overlap`, so their cost follows the write
+        rate instead of the data size. Deletes are invisible to that query;
+        a full pass every rescan_every cycles (or run_once(rebuild=True))
+        picks them up.
+
+        Args:
+            db: Firestore client
+            journal: Journal the watermarks are kept in; the contribution
+                store lives in the same file
+            rollups: Names of the stats documents to maintain (default: all of ROLLUPS)
+            page_size: Documents read per query page
+            overlap_seconds: How far before the watermark each change query starts,
+                covering server timestamps committed out of order
+            rescan_every: Cycles of a running service between full passes (0 never rescans)
+        """
+        self.db = db
+        self.journal = journal
+        self.store = RollupStore(journal.path)
+        self.rollups = {name: ROLLUPS[name] for name in (rollups or ROLLUPS)}
+        self.page_size = page_size
+        self.overlap_seconds = overlap_seconds
+        self.rescan_every = rescan_every
+        self.writer = PipelinedWriter(db, max_in_flight=1)
+        self.cycles = 0
+        self._written: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+
+        # collection -> [(counter prefix, counters function)] and the fields to select
+        self.sources: Dict[str, List[tuple]] = {}
+        self.fields: Dict[str, set] = {}
+        for name, rollup in self.rollups.items():
+            for collection_name, (counters, fields) in rollup['sources'].items():
+                self.sources.setdefault(collection_name, []).append((name, counters))
+                self.fields.setdefault(collection_name, {change_field_for(collection_name)[0]}).update(fields)
+
+    def stop(self):
+        """Ask the service loop to finish the current page and exit"""
+        self._stop.set()
+
+    def _counters(self, collection_name: str, data: Dict[str, Any]) -> Dict[str, float]:
+        counters = {}
+        for name, function in self.sources[collection_name]:
+            for counter, value in function(data).items():
+                counters[f"{name}.{counter}"] = value
+        return counters
+
+    def _read(self, collection_name: str, query, generation: int, change_field: str,
+              order_field: Optional[str] = None) -> tuple:
+        """Apply every page of a query; return (documents read, documents changed, largest change value)"""
+        meter = ThroughputMeter(collection_name, icon="📊")
+        read = changed = 0
+        latest = None
+        for snapshots in iter_query_pages(query, self.page_size, order_field=order_field):
+            page = []
+            for snapshot in snapshots:
+                data = snapshot.to_dict() or {}
+                value = data.get(change_field)
+                if value is not None and (latest is None or value > latest):
+                    latest = value
+                page.append((snapshot.id, self._counters(collection_name, data)))
+            changed += self.store.apply(collection_name, page, generation)
+            read += len(snapshots)
+            meter.add(len(snapshots))
+            if self._stop.is_set():
+                break
+        return read, changed, latest
+
+    def rebuild_collection(self, collection_name: str) -> int:
+        """Full pass over one collection; forgets documents that no longer exist"""
+        change_field, _ = change_field_for(collection_name)
+        started_at = datetime.now(timezone.utc)
+        generation = self.store.generation(collection_name) + 1
+        query = (self.db.collection(collection_name)
+                 .select(sorted(self.fields[collection_name]))
+                 .order_by(DOCUMENT_ID))
+        read, changed, _ = self._read(collection_name, query, generation, change_field)
+        if self._stop.is_set():
+            # An unfinished pass leaves earlier rows in place; they are still correct
+            return changed
+        removed = self.store.sweep(collection_name, generation)
+        self.journal.save(ROLLUP_JOB, collection_name, started_at.isoformat(), read, status="done")
+        print(f"  📊 {collection_name}: full pass over {read} documents "
+              f"({changed} changed, {removed} deleted)")
+        return changed + removed
+
+    def update_collection(self, collection_name: str, watermark: str) -> int:
+        """Apply documents changed since the watermark"""
+        change_field, _ = change_field_for(collection_name)
+        query = changes_query(self.db, collection_name, watermark, self.overlap_seconds,
+                              self.fields[collection_name])
+        read, changed, latest = self._read(collection_name, query, self.store.generation(collection_name),
+                                           change_field, order_field=change_field)
+        latest = advance_watermark(watermark, latest)
+        if latest:
+            saved = self.journal.load(ROLLUP_JOB, collection_name) or {}
+            self.journal.save(ROLLUP_JOB, collection_name, latest,
+                              saved.get('processed', 0) + read, status="done")
+        if changed:
+            print(f"  📊 {collection_name}: {changed} of {read} recently written documents changed")
+        return changed
+
+    def write_stats(self, names: Iterable[str], force: bool = False) -> List[str]:
+        """Write the named stats documents whose values changed since they were last written"""
+        totals = self.store.totals()
+        items = []
+        for name in names:
+            rollup = self.rollups[name]
+            prefix = f"{name}."
+            stats = rollup['finalize']({counter[len(prefix):]: _tidy(value)
+                                        for counter, value in totals.items() if counter.startswith(prefix)})
+            if not force and self._written.get(name) == stats:
+                continue
+            self._written[name] = stats
+            items.append((self.db.collection(STATS_COLLECTION).document(name),
+                          dict(stats, computedAt=datetime.now(timezone.utc))))
+        if items:
+            self.writer.set_many(items).result()
+        return [ref.id for ref, _ in items]
+
+    def run_once(self, rebuild: bool = False) -> Dict[str, int]:
+        """Bring every source collection up to date and rewrite the changed stats documents (-1 on error)"""
+        results = {}
+        complete = set()
+        full_pass = rebuild or (self.rescan_every > 0 and self.cycles and self.cycles % self.rescan_every == 0)
+        for collection_name in self.sources:
+            if self._stop.is_set():
+                break
+            saved = self.journal.load(ROLLUP_JOB, collection_name)
+            try:
+                with tracer.span("firestore.rollup_collection", collection=collection_name) as span:
+                    if full_pass or not (saved and saved['cursor']):
+                        results[collection_name] = self.rebuild_collection(collection_name)
+                    else:
+                        results[collection_name] = self.update_collection(collection_name, saved['cursor'])
+                    span.set_attribute("documents", results[collection_name])
+                if not self._stop.is_set():
+                    complete.add(collection_name)
+            except Exception as e:
+                print(f"  ❌ Error rolling up {collection_name}: {e}")
+                results[collection_name] = -1
+
+        # A stats document is only trusted once every source it sums was read in full
+        ready = [name for name, rollup in self.rollups.items() if complete.issuperset(rollup['sources'])]
+        written = self.write_stats(ready, force=self.cycles == 0)
+        if written:
+            print(f"  💾 Updated {STATS_COLLECTION}/" + f", {STATS_COLLECTION}/".join(written))
+        self.cycles += 1
+        return results
+
+    def run_forever(self, interval: float = 60.0, after_cycle: Optional[Callable[[], None]] = None):
+        """Roll up repeatedly, sleeping between cycles, until stop() is called"""
+        print(f"📊 Rolling up {', '.join(self.rollups)} stats every {interval:g}s")
+        while not self._stop.is_set():
+            results = self.run_once()
+            print(f"✅ Cycle {self.cycles}: {sum(count for count in results.values() if count > 0)} documents changed")
+            if after_cycle is not None:
+                after_cycle()
+            self._stop.wait(interval)
+        self.close()
+        print("👋 Rollup stopped")
+
+    def close(self):
+        """Wait for pending writes and close the contribution store"""
+        self.writer.close()
+        self.store.close()
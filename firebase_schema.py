@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Firebase Schema Notes
+Per-collection field conventions used by the app's services, shared by the Python tools
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Tuple
+
+# How a time field is stored: "timestamp" for serverTimestamp() values written by
+# firebaseService.create/update, "iso" for new Date().toISOString() strings
+TIMESTAMP = "timestamp"
+ISO_STRING = "iso"
+
+# Field documents are time-ordered by, per collection. activities and transactions
+# use `timestamp` so purges line up with their userId+timestamp indexes.
+TIME_FIELDS = {
+    'activities': ('timestamp', ISO_STRING),
+    'transactions': ('timestamp', ISO_STRING),
+    'quiz_sessions': ('startedAt', ISO_STRING),
+}
+DEFAULT_TIME_FIELD = ('createdAt', TIMESTAMP)
+
+# Field that changes on every write, per collection. firebaseService.create/update
+# stamp updatedAt with serverTimestamp(); collections written another way go here.
+CHANGE_FIELDS = {}
+DEFAULT_CHANGE_FIELD = ('updatedAt', TIMESTAMP)
+
+# Fields holding a related user's ID, per collection
+USER_FIELDS = {
+    'referrals': ('referrerId', 'referredUserId'),
+}
+DEFAULT_USER_FIELDS = ('userId',)
+
+
+def time_field_for(collection_name: str) -> Tuple[str, str]:
+    """Return (field, storage kind) of the time field for a collection"""
+    return TIME_FIELDS.get(collection_name, DEFAULT_TIME_FIELD)
+
+
+def change_field_for(collection_name: str) -> Tuple[str, str]:
+    """Return (field, storage kind) of the field updated on every write to a collection"""
+    return CHANGE_FIELDS.get(collection_name, DEFAULT_CHANGE_FIELD)
+
+
+def user_fields_for(collection_name: str) -> Tuple[str, ...]:
+    """Return the fields holding a related user's ID for a collection"""
+    return USER_FIELDS.get(collection_name, DEFAULT_USER_FIELDS)
+
+
+def to_iso_string(moment: datetime) -> str:
+    """Format a datetime exactly like JavaScript's Date.toISOString()"""
+    moment = moment.astimezone(timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"
+
+
+def time_value(moment: datetime, kind: str) -> Any:
+    """Convert a datetime into the value stored in a time field of the given kind"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    if kind == ISO_STRING:
+        return to_iso_string(moment)
+    return moment
+
+
+def epoch_seconds(value: Any) -> float:
+    """Seconds since the epoch for an ISO string or datetime; NaN if missing or unparseable"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return float("nan")
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float("nan")
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Firebase Streaming Helpers
+Key-only, cursor-based paging and pipelined deletes for large Firestore collections
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from firebase_metrics import collection_label, document_collection, metrics, tracer
+from firebase_rate_control import AdaptiveRateController, is_contention_error
+
+# Field path Firestore uses for the document key (FieldPath.document_id())
+DOCUMENT_ID = "__name__"
+
+# Firestore allows at most 500 writes per batch commit
+DEFAULT_PAGE_SIZE = 500
+
+
+def iter_query_pages(ordered_query, page_size: int = DEFAULT_PAGE_SIZE,
+                     cursor: Optional[Dict[str, Any]] = None,
+                     order_field: Optional[str] = None) -> Iterator[List[Any]]:
+    """
+    Yield pages of snapshots from a query already ordered by (order_field,) document ID
+
+    Each page is a separate limit() query that starts after the last
+    snapshot of the previous page, so only one page is held in memory.
+
+    Args:
+        ordered_query: Query ordered by document ID (after order_field, if given)
+        page_size: Number of snapshots per page
+        cursor: Cursor values to start after (optional)
+        order_field: Field the query is ordered by before the document ID (optional)
+    """
+    label = collection_label(ordered_query)
+    while True:
+        query = ordered_query.limit(page_size)
+        if cursor is not None:
+            query = query.start_after(cursor)
+
+        with tracer.span("firestore.read_page", collection=label) as span:
+            started_at = time.monotonic()
+            snapshots = list(query.stream())
+            metrics.observe('firestore_page_read_seconds', time.monotonic() - started_at, collection=label)
+            span.set_attribute("documents", len(snapshots))
+        metrics.inc('firestore_page_reads_total', collection=label)
+        metrics.inc('firestore_documents_read_total', len(snapshots), collection=label)
+        if not snapshots:
+            return
+
+        yield snapshots
+
+        if len(snapshots) < page_size:
+            return
+        last = snapshots[-1]
+        cursor = {DOCUMENT_ID: last.reference}
+        if order_field:
+            cursor[order_field] = last.get(order_field)
+
+
+def iter_document_pages(source, page_size: int = DEFAULT_PAGE_SIZE,
+                        start_after=None, recursive: bool = False,
+                        order_field: Optional[str] = None,
+                        descending: bool = False) -> Iterator[List[Any]]:
+    """
+    Yield pages of document references from a collection or filtered query
+
+    Each page is fetched with a key-only query ordered by document ID and
+    resumed from the last reference of the previous page, so only one page
+    is held in memory and no single stream stays open for the whole collection.
+
+    With recursive=True the query also returns every document in nested
+    subcollections (an all-descendants query scoped to the collection).
+    Document paths sort parent-first, so pages walk the tree depth-first.
+
+    Queries with a range filter must be ordered by the filtered field first;
+    pass it as order_field and only that field is fetched besides the key.
+
+    Args:
+        source: Collection reference or query (with where filters) to page through
+        page_size: Number of document references per page
+        start_after: Document reference to resume after (not with order_field)
+        recursive: Include documents from nested subcollections
+        order_field: Field to order by before the document ID (optional)
+        descending: Order descending, to match an index declared that way
+    """
+    direction = "DESCENDING" if descending else "ASCENDING"
+    if recursive:
+        # recursive() already orders by document ID to scope the query
+        base_query = source.recursive().select([DOCUMENT_ID])
+    elif order_field:
+        base_query = (source.select([order_field])
+                      .order_by(order_field, direction=direction)
+                      .order_by(DOCUMENT_ID, direction=direction))
+    else:
+        base_query = source.select([DOCUMENT_ID]).order_by(DOCUMENT_ID)
+    cursor = {DOCUMENT_ID: start_after} if start_after is not None else None
+
+    for snapshots in iter_query_pages(base_query, page_size, cursor, order_field):
+        yield [snapshot.reference for snapshot in snapshots]
+
+
+def discover_collections(db) -> List[str]:
+    """List root collection IDs without reading any documents"""
+    return sorted(collection_ref.id for collection_ref in db.collections())
+
+
+def subcollection_path(ref) -> Optional[str]:
+    """
+    Return the subcollection pattern a reference lives in, e.g. users/*/sessions
+
+    Returns None for documents in a root collection.
+    """
+    parts = ref.path.split("/")
+    if len(parts) <= 2:
+        return None
+    return "/".join("*" if i % 2 else part for i, part in enumerate(parts[:-1]))
+
+
+def count_documents(collection_ref) -> int:
+    """Count documents with a server-side aggregation query (no document reads)"""
+    started_at = time.monotonic()
+    results = collection_ref.count(alias="count").get()
+    metrics.observe('firestore_count_seconds', time.monotonic() - started_at,
+                    collection=collection_label(collection_ref))
+    return int(results[0][0].value)
+
+
+def is_collection_empty(collection_ref) -> bool:
+    """Check for at least one document with a key-only limit(1) probe"""
+    return not list(collection_ref.select([DOCUMENT_ID]).limit(1).stream())
+
+
+def record_commit(rate_controller: AdaptiveRateController, label: str, operations: int,
+                  deletes: int, seconds: float):
+    """Feed a successful batch commit to the rate controller and the commit metrics"""
+    rate_controller.record_success(operations)
+    metrics.observe('firestore_commit_seconds', seconds, collection=label)
+    metrics.inc('firestore_commits_total', collection=label)
+    if deletes:
+        metrics.inc('firestore_writes_total', deletes, collection=label, kind="delete")
+    if deletes < operations:
+        metrics.inc('firestore_writes_total', operations - deletes, collection=label, kind="set")
+    metrics.set('firestore_target_ops_per_second', rate_controller.target_ops_per_second)
+
+
+class ThroughputMeter:
+    def __init__(self, label: str, report_interval: float = 5.0, icon: str = "🗑️"):
+        """
+        Track processed documents and periodically report docs/sec
+
+        Args:
+            label: Name printed with each progress line
+            report_interval: Minimum seconds between progress lines
+            icon: Emoji printed at the start of each progress line
+        """
+        self.label = label
+        self.icon = icon
+        self.report_interval = report_interval
+        self.count = 0
+        self.started_at = time.monotonic()
+        self._last_report_at = self.started_at
+        self._last_report_count = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Average docs/sec since the meter started"""
+        elapsed = self.elapsed
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def add(self, count: int):
+        """Record processed documents and report if the interval has passed"""
+        self.count += count
+        now = time.monotonic()
+        if now - self._last_report_at >= self.report_interval:
+            window_rate = (self.count - self._last_report_count) / (now - self._last_report_at)
+            print(f"  {self.icon} {self.label}: {self.count} documents "
+                  f"({window_rate:.0f} docs/sec, avg {self.rate:.0f} docs/sec)")
+            self._last_report_at = now
+            self._last_report_count = self.count
+
+
+class PipelinedWriter:
+    def __init__(self, db, batch_size: int = DEFAULT_PAGE_SIZE, max_in_flight: int = 8,
+                 rate_controller: Optional[AdaptiveRateController] = None,
+                 on_commit: Optional[Callable[[int, float], None]] = None):
+        """
+        Commit write batches with several commits in flight at once
+
+        Callers hand over whole pages of operations and get a Future back;
+        once max_in_flight commits are running, further submissions block
+        until one finishes, which keeps memory bounded and applies
+        backpressure to the readers feeding the writer. A single writer can
+        be shared by several collection workers.
+
+        Every commit is paced by the rate controller and retried with
+        backoff on RESOURCE_EXHAUSTED/ABORTED errors.
+
+        Args:
+            db: Firestore client
+            batch_size: Largest number of operations per batch commit (max 500)
+            max_in_flight: Maximum number of concurrent batch commits
+            rate_controller: Shared throttle (a default one is created if omitted)
+            on_commit: Called with (operations, seconds) after every successful commit
+        """
+        self.db = db
+        self.batch_size = min(batch_size, DEFAULT_PAGE_SIZE)
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_controller = rate_controller or AdaptiveRateController()
+        self.on_commit = on_commit
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                            thread_name_prefix="firestore-writer")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.committed = 0
+
+    def _commit(self, operations: List[tuple]) -> int:
+        """Commit one batch of (kind, reference, data, merge) operations"""
+        label = document_collection(operations[0][1])
+        attempt = 0
+        with tracer.span("firestore.commit", collection=label, operations=len(operations)) as span:
+            while True:
+                self.rate_controller.acquire(len(operations))
+                batch = self.db.batch()
+                deletes = 0
+                for kind, ref, data, merge in operations:
+                    if kind == "delete":
+                        batch.delete(ref)
+                        deletes += 1
+                    else:
+                        batch.set(ref, data, merge=merge)
+                try:
+                    started_at = time.monotonic()
+                    batch.commit()
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if not is_contention_error(e) or attempt > self.rate_controller.max_retries:
+                        metrics.inc('firestore_commit_errors_total', collection=label,
+                                    error=type(e).__name__)
+                        raise
+                    metrics.inc('firestore_retries_total', collection=label, error=type(e).__name__)
+                    delay = self.rate_controller.record_contention()
+                    metrics.set('firestore_target_ops_per_second', self.rate_controller.target_ops_per_second)
+                    time.sleep(delay)
+            seconds = time.monotonic() - started_at
+            span.set_attribute("retries", attempt)
+
+        record_commit(self.rate_controller, label, len(operations), deletes, seconds)
+        if self.on_commit is not None:
+            self.on_commit(len(operations), seconds)
+        with self._lock:
+            self.committed += len(operations)
+        return len(operations)
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def _submit(self, operations: List[tuple]) -> Future:
+        self._slots.acquire()
+        # Run the commit in the caller's context so its span nests under the caller's
+        future = self._executor.submit(contextvars.copy_context().run, self._commit, operations)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._release)
+        return future
+
+    def submit(self, operations: List[tuple]) -> Future:
+        """
+        Queue operations for commit, splitting them into batches
+
+        Returns a Future resolving to the number of operations committed.
+        """
+        if not operations:
+            done = Future()
+            done.set_result(0)
+            return done
+
+        batch_size = min(self.batch_size, self.rate_controller.batch_size)
+        futures = [self._submit(operations[i:i + batch_size])
+                   for i in range(0, len(operations), batch_size)]
+        if len(futures) == 1:
+            return futures[0]
+
+        combined = Future()
+        remaining = [len(futures)]
+
+        def _collect(_):
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                combined.set_result(sum(f.result() for f in futures))
+            except Exception as e:
+                combined.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(_collect)
+        return combined
+
+    def delete_many(self, refs: List[Any]) -> Future:
+        """Queue deletes for a page of document references"""
+        return self.submit([("delete", ref, None, False) for ref in refs])
+
+    def set_many(self, items: List[tuple], merge: bool = False) -> Future:
+        """Queue sets for a page of (reference, data) pairs"""
+        return self.submit([("set", ref, data, merge) for ref, data in items])
+
+    def flush(self):
+        """Wait until every queued commit has finished"""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.exception()
+
+    def close(self):
+        """Flush outstanding commits and stop the commit threads"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+
+class StreamingDeleter:
+    def __init__(self, db, page_size: int = DEFAULT_PAGE_SIZE, report_interval: float = 5.0,
+                 writer: Optional[PipelinedWriter] = None):
+        """
+        Delete collections page by page with bounded memory
+
+        Pages of references are handed to a PipelinedWriter while the next
+        page is being fetched, so reads and writes overlap and only the
+        pages currently being committed are held in memory.
+
+        Args:
+            db: Firestore client
+            page_size: Documents per page (max 500)
+            report_interval: Seconds between docs/sec progress lines
+            writer: Shared writer to commit through (defaults to one commit in flight)
+        """
+        self.db = db
+        self.page_size = min(page_size, DEFAULT_PAGE_SIZE)
+        self.report_interval = report_interval
+        self.writer = writer or PipelinedWriter(db, self.page_size, max_in_flight=1)
+
+    def delete_query(self, query, label: str, order_field: Optional[str] = None,
+                     descending: bool = False) -> int:
+        """
+        Delete every document matching a filtered query
+
+        Filters run on the server, so only matching keys are read. No
+        checkpoint is needed: deleted documents stop matching, so running
+        the same query again simply continues where it stopped.
+        """
+        return self.delete_collection(query, label, order_field=order_field,
+                                      descending=descending)
+
+    def delete_collection(self, collection_ref, label: Optional[str] = None,
+                          recursive: bool = False, checkpoint=None,
+                          order_field: Optional[str] = None, descending: bool = False) -> int:
+        """
+        Delete every document in a collection and return the number deleted
+
+        With recursive=True documents in nested subcollections are deleted
+        too, including subcollections whose parent document no longer exists.
+
+        When a checkpoint is given, deletion resumes after its saved cursor
+        and the cursor is advanced only once every earlier page has been
+        committed, so a restarted run never skips undeleted documents.
+        """
+        label = label or collection_ref.id
+        with tracer.span("firestore.delete_collection", collection=label, recursive=recursive) as span:
+            deleted = self._delete_collection(collection_ref, label, recursive, checkpoint,
+                                              order_field, descending)
+            span.set_attribute("documents", deleted)
+        return deleted
+
+    def _delete_collection(self, collection_ref, label: str, recursive: bool, checkpoint,
+                           order_field: Optional[str], descending: bool) -> int:
+        meter = ThroughputMeter(label, self.report_interval)
+        pending = deque()
+        subcollections: Set[str] = set()
+
+        start_after = None
+        if checkpoint is not None and checkpoint.cursor:
+            start_after = self.db.document(checkpoint.cursor)
+            print(f"  ↩️ {meter.label}: resuming after {checkpoint.cursor} "
+                  f"({checkpoint.processed} documents already deleted)")
+
+        def _finish_head():
+            future, last_ref = pending.popleft()
+            count = future.result()
+            meter.add(count)
+            if checkpoint is not None:
+                checkpoint.advance(last_ref.path, count)
+
+        try:
+            for refs in iter_document_pages(collection_ref, self.page_size,
+                                            start_after=start_after, recursive=recursive,
+                                            order_field=order_field, descending=descending):
+                if recursive:
+                    for ref in refs:
+                        pattern = subcollection_path(ref)
+                        if pattern and pattern not in subcollections:
+                            subcollections.add(pattern)
+                            print(f"  🌿 {meter.label}: found subcollection {pattern}")
+                pending.append((self.writer.delete_many(refs), refs[-1]))
+                while pending and pending[0][0].done():
+                    _finish_head()
+
+            while pending:
+                _finish_head()
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.flush()
+            raise
+
+        if checkpoint is not None:
+            checkpoint.complete()
+
+        if meter.count:
+            print(f"  ⏱️ {meter.label}: {meter.count} documents in {meter.elapsed:.1f}s "
+                  f"({meter.rate:.0f} docs/sec)")
+        return meter.count
@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Firebase Synthetic Data
+Seeded, production-shaped test data matching the documents the app's services write
+"""
+
+import hashlib
+import math
+import os
+import random
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from firebase_export import AUTO_ID_ALPHABET
+from firebase_ndjson import ShardWriter, encode_record
+from firebase_schema import to_iso_string
+from firebase_streaming import DEFAULT_PAGE_SIZE, ThroughputMeter
+
+# Collections the generator writes
+GENERATED_COLLECTIONS = ['users', 'referrals', 'quiz_sessions', 'bets', 'transactions', 'tournaments']
+
+# Betting rules from balanceService.js
+MIN_BET = 0.1
+MAX_BET = 10.0
+MINIMUM_BALANCE = 10.0
+CORRECT_ANSWER_MULTIPLIER = 2.0
+
+# Quiz rules from dataService.js / quizSecurityService.js
+DIFFICULTY_REWARDS = {'easy': 0.5, 'medium': 1.0, 'hard': 2.0}
+MAX_DAILY_QUIZZES = 10
+REFERRAL_WELCOME_BONUS = 2.0
+
+# Tournament rules from tournamentService.js
+TOURNAMENT_APP_FEE_RATE = 0.20
+TOURNAMENT_ENTRY_FEES = [1, 5, 10, 25]
+TOURNAMENT_SIZES = [10, 20, 50, 100]
+
+REFERRAL_CODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+FIRST_NAMES = ["Alex", "Sam", "Maria", "Ivan", "Li", "Omar", "Nina", "Yuki", "Ana", "Tom",
+               "Aisha", "Diego", "Elena", "Kofi", "Mei", "Pavel", "Sara", "Ravi", "Zoe", "Jonas"]
+LAST_NAMES = ["Smith", "Ivanov", "Garcia", "Chen", "Khan", "Silva", "Novak", "Tanaka", "Okafor",
+              "Muller", "Rossi", "Kim", "Haddad", "Petrov", "Lopez", "Nguyen", "Costa", "Sato"]
+
+# (collection, document path, fields)
+Document = Tuple[str, str, Dict[str, Any]]
+
+
+def auto_id(rng: random.Random) -> str:
+    """Return a 20-character document ID shaped like Firestore's auto IDs"""
+    return "".join(rng.choices(AUTO_ID_ALPHABET, k=20))
+
+
+def user_id_for(index: int) -> str:
+    """Return the userId (and users document ID) of the index-th synthetic user"""
+    return f"tg_{100_000_000 + index}"
+
+
+def user_name_for(index: int) -> str:
+    """Return a stable display name for the index-th synthetic user"""
+    return f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+
+
+def referral_code_for(seed: int, index: int) -> str:
+    """Return the 8-character referral code of the index-th synthetic user"""
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return "".join(REFERRAL_CODE_ALPHABET[byte % len(REFERRAL_CODE_ALPHABET)] for byte in digest)
+
+
+def rank_for(level: int, total_earned: float) -> str:
+    """Rank rule from dataService.calculateRank"""
+    if level >= 20 and total_earned >= 1000:
+        return "Diamond"
+    if level >= 15 and total_earned >= 500:
+        return "Platinum"
+    if level >= 10 and total_earned >= 200:
+        return "Gold"
+    if level >= 5 and total_earned >= 50:
+        return "Silver"
+    return "Bronze"
+
+
+def capped_pareto_mean(alpha: float, cap: float) -> float:
+    """Mean of min(X, cap) for a Pareto(alpha) variable with minimum 1"""
+    return (alpha - cap ** (1 - alpha)) / (alpha - 1)
+
+
+def millis(moment: datetime) -> int:
+    """Milliseconds since the epoch, as Date.now() would have returned"""
+    return int(moment.timestamp() * 1000)
+
+
+class SyntheticDataset:
+    def __init__(self, users: int, tournaments: int = 0, seed: int = 42, days: int = 90,
+                 end: Optional[datetime] = None, sessions_per_user: float = 8.0,
+                 payer_rate: float = 0.35, referral_rate: float = 0.3,
+                 cheater_rate: float = 0.005, chunk_size: int = 5_000,
+                 activity_alpha: float = 1.16, max_activity: float = 500.0):
+        """
+        Describe a synthetic dataset and generate it chunk by chunk
+
+        Every chunk of users (and of tournaments) has its own random stream
+        derived from the seed and the chunk number, so the output is the same
+        whatever the number of processes or the order chunks run in.
+
+        Users sign up over the time window with growth towards its end.
+        Activity per user is power-law distributed (a few users play most
+        sessions) and sessions arrive in bursts of back-to-back quizzes.
+        Documents are correlated the way the services write them: challenge
+        mode sessions place one bet per question, every bet has a matching
+        quiz_win/quiz_loss transaction, and each user's counters and
+        playableBalance (deposits, minus every bet, plus every win) follow
+        from their own sessions. Tournament participants are drawn from the
+        same users, favouring early sign-ups. A small share of users cheat:
+        near-perfect scores at implausible answer speeds.
+
+        Args:
+            users: Number of users
+            tournaments: Number of tournaments
+            seed: Seed for every random stream
+            days: Length of the time window in days
+            end: End of the time window (default: start of today, UTC)
+            sessions_per_user: Mean quiz sessions per user
+            payer_rate: Share of users who deposit and play challenge mode
+            referral_rate: Share of users who signed up with a referral code
+            cheater_rate: Share of users with cheating behaviour
+            chunk_size: Users or tournaments per generation task
+            activity_alpha: Pareto shape of per-user activity (1.16 is roughly 80/20)
+            max_activity: Cap on a single user's activity multiplier
+        """
+        if end is None:
+            end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        self.users = users
+        self.tournaments = tournaments
+        self.seed = seed
+        self.end = end
+        self.window = timedelta(days=days)
+        self.start = end - self.window
+        self.sessions_per_user = sessions_per_user
+        self.payer_rate = payer_rate
+        self.referral_rate = referral_rate
+        self.cheater_rate = cheater_rate
+        self.chunk_size = max(1, chunk_size)
+        self.activity_alpha = activity_alpha
+        self.max_activity = max_activity
+        self._activity_mean = capped_pareto_mean(activity_alpha, max_activity)
+
+    def tasks(self) -> List[Tuple[str, int, int, int]]:
+        """Split the dataset into (kind, chunk, first index, end index) generation tasks"""
+        tasks = []
+        for kind, total in (("users", self.users), ("tournaments", self.tournaments)):
+            for chunk, first in enumerate(range(0, total, self.chunk_size)):
+                tasks.append((kind, chunk, first, min(total, first + self.chunk_size)))
+        return tasks
+
+    def generate(self, task: Tuple[str, int, int, int]) -> Iterator[Document]:
+        """Yield the documents of one generation task"""
+        kind, chunk, first, end_index = task
+        rng = random.Random(f"{self.seed}:{kind}:{chunk}")
+        make = self._user_documents if kind == "users" else self._tournament_documents
+        for index in range(first, end_index):
+            yield from make(rng, index)
+
+    def _signup_time(self, index: int) -> datetime:
+        # Sign-up density grows linearly over the window
+        return self.start + self.window * math.sqrt((index + 0.5) / max(1, self.users))
+
+    def _session_starts(self, rng: random.Random, count: int, signed_up: datetime) -> List[datetime]:
+        """Spread sessions over bursts of consecutive quizzes between sign-up and the end"""
+        starts = []
+        active = (self.end - signed_up).total_seconds()
+        while len(starts) < count:
+            moment = signed_up + timedelta(seconds=active * rng.random())
+            for _ in range(min(count - len(starts), 1 + int(rng.expovariate(1 / 2.5)))):
+                if moment >= self.end:
+                    break
+                starts.append(moment)
+                moment += timedelta(seconds=60 + rng.expovariate(1 / 240))
+        return sorted(starts)
+
+    def _user_documents(self, rng: random.Random, index: int) -> Iterator[Document]:
+        user_id = user_id_for(index)
+        name = user_name_for(index)
+        signed_up = self._signup_time(index)
+        activity = min(rng.paretovariate(self.activity_alpha), self.max_activity)
+        sessions = int(rng.expovariate(1.0) * self.sessions_per_user * activity / self._activity_mean + 0.5)
+        payer = rng.random() < self.payer_rate
+        cheater = rng.random() < self.cheater_rate
+        skill = rng.uniform(0.95, 1.0) if cheater else rng.betavariate(4, 3)
+        answer_seconds = rng.uniform(1.0, 2.0) if cheater else rng.uniform(5.0, 12.0)
+
+        documents: List[Document] = []
+        user = {
+            'userId': user_id,
+            'username': f"player{index}",
+            'fullName': name,
+            'telegramId': 100_000_000 + index,
+            'telegramUsername': f"player{index}",
+            'telegramFullName': name,
+            'telegramLanguageCode': rng.choice(["en", "en", "en", "ru", "es", "pt", "tr"]),
+            'telegramIsPremium': rng.random() < 0.05,
+            'totalEarned': 0.0,
+            'totalDeposited': 0.0,
+            'totalWithdrawn': 0,
+            'playableBalance': 0.0,
+            'bonusBalance': 0.0,
+            'level': 1,
+            'xp': 0,
+            'streak': 0,
+            'dailyQuizzesCompleted': 0,
+            'maxDailyQuizzes': MAX_DAILY_QUIZZES,
+            'weeklyEarnings': 0,
+            'monthlyEarnings': 0,
+            'referralEarnings': 0,
+            'tournamentsWon': 0,
+            'totalTournaments': 0,
+            'questionsAnswered': 0,
+            'correctAnswers': 0,
+            'isVerified': False,
+            'withdrawalEnabled': False,
+            'invitedFriends': 0,
+            'maxInvites': 10,
+            'referralCode': referral_code_for(self.seed, index),
+            'referralSource': None,
+            'status': 'active',
+            'hasDeposited': False,
+            'createdAt': signed_up,
+        }
+
+        if index and rng.random() < self.referral_rate:
+            # Early users refer more people than late ones
+            referrer = int(index * rng.random() ** 2)
+            code = referral_code_for(self.seed, referrer)
+            user['referralSource'] = code
+            user['referralEarnings'] = REFERRAL_WELCOME_BONUS
+            user['bonusBalance'] = REFERRAL_WELCOME_BONUS
+            documents.append(('referrals', f"referrals/{auto_id(rng)}", {
+                'referredUserId': user_id,
+                'referralCode': code,
+                'referrerId': user_id_for(referrer),
+                'status': 'completed',
+                'processedAt': to_iso_string(signed_up),
+                'createdAt': signed_up,
+                'updatedAt': signed_up,
+            }))
+
+        balance = 0.0
+        bets_placed = bets_won = 0
+        score_total = 0
+        last_activity = signed_up
+        for started in self._session_starts(rng, sessions, signed_up):
+            questions = rng.randint(5, 10)
+            difficulty = rng.choices(list(DIFFICULTY_REWARDS), weights=(5, 3, 2))[0]
+            challenge = payer and rng.random() < 0.6
+            if challenge and balance < MINIMUM_BALANCE:
+                amount = float(rng.choice([10, 20, 20, 50, 50, 100, 250]))
+                deposit_id = f"deposit_{millis(started)}_{user_id}"
+                documents.append(('transactions', f"transactions/{auto_id(rng)}", {
+                    'id': deposit_id,
+                    'userId': user_id,
+                    'type': 'deposit',
+                    'amount': amount,
+                    'status': 'completed',
+                    'txHash': f"Deposit_{millis(started)}",
+                    'timestamp': to_iso_string(started),
+                    'details': {
+                        'paymentMethod': 'crypto',
+                        'walletAddress': '',
+                        'transactionId': '',
+                        'proofUrl': '',
+                        'adminApprovalRequired': True,
+                        'submittedBy': user_id,
+                        'submittedAt': to_iso_string(started),
+                    },
+                    'createdAt': started,
+                    'updatedAt': started,
+                }))
+                balance += amount
+                user['totalDeposited'] += amount
+                user['hasDeposited'] = True
+
+            moment = started
+            correct = 0
+            for _ in range(questions):
+                question_id = f"q_{rng.randrange(5_000):05d}"
+                is_correct = rng.random() < skill
+                correct += is_correct
+                placed = moment
+                moment += timedelta(seconds=rng.lognormvariate(math.log(answer_seconds), 0.35))
+                bet_amount = round(min(MAX_BET, max(MIN_BET, rng.lognormvariate(0.0, 0.8))), 2)
+                if not challenge or bet_amount > balance:
+                    continue
+
+                bet_id = f"bet_{millis(placed)}_{user_id}"
+                bet = {
+                    'id': bet_id,
+                    'userId': user_id,
+                    'questionId': question_id,
+                    'betAmount': bet_amount,
+                    'placedAt': to_iso_string(placed),
+                    'processedAt': to_iso_string(moment),
+                    'createdAt': placed,
+                    'updatedAt': moment,
+                }
+                balance -= bet_amount
+                bets_placed += 1
+                if is_correct:
+                    win_amount = round(bet_amount * CORRECT_ANSWER_MULTIPLIER, 2)
+                    bet.update(status='won', result='correct', winAmount=win_amount,
+                               netWin=round(win_amount - bet_amount, 2))
+                    transaction = {'type': 'quiz_win', 'amount': win_amount, 'txHash': f"Win_{bet_id}",
+                                   'details': {'betAmount': bet_amount, 'winAmount': win_amount,
+                                               'netWin': bet['netWin'], 'questionValue': 1.0}}
+                    balance += win_amount
+                    bets_won += 1
+                    user['totalEarned'] += win_amount
+                else:
+                    bet.update(status='lost', result='incorrect', lossAmount=bet_amount)
+                    transaction = {'type': 'quiz_loss', 'amount': -bet_amount, 'txHash': f"Loss_{bet_id}",
+                                   'details': {'betAmount': bet_amount, 'lossAmount': bet_amount,
+                                               'questionValue': 1.0}}
+                transaction.update(userId=user_id, status='completed', timestamp=to_iso_string(moment),
+                                   createdAt=moment, updatedAt=moment)
+                documents.append(('bets', f"bets/{auto_id(rng)}", bet))
+                documents.append(('transactions', f"transactions/{auto_id(rng)}", transaction))
+
+            score = round(100 * correct / questions)
+            completed = moment
+            documents.append(('quiz_sessions', f"quiz_sessions/{auto_id(rng)}", {
+                'id': f"quiz_{millis(started)}_{user_id}",
+                'userId': user_id,
+                'difficulty': difficulty,
+                'startedAt': to_iso_string(started),
+                'status': 'completed',
+                'isChallengeMode': challenge,
+                'completedAt': to_iso_string(completed),
+                'score': score,
+                'totalTime': int((completed - started).total_seconds() * 1000),
+                'reward': round(DIFFICULTY_REWARDS[difficulty] * score / 100, 4),
+                'createdAt': started,
+                'updatedAt': completed,
+            }))
+            user['questionsAnswered'] += questions
+            user['correctAnswers'] += correct
+            user['xp'] += correct * 10
+            score_total += score
+            if started >= self.end - timedelta(days=1):
+                user['dailyQuizzesCompleted'] += 1
+            last_activity = max(last_activity, completed)
+
+        user['level'] = user['xp'] // 100 + 1
+        user['totalEarned'] = round(user['totalEarned'], 2)
+        user['rank'] = rank_for(user['level'], user['totalEarned'])
+        user['playableBalance'] = round(balance, 2)
+        user['availableBalance'] = round(balance + user['bonusBalance'], 2)
+        user['winRate'] = round(100 * bets_won / bets_placed, 2) if bets_placed else 0
+        user['averageScore'] = round(score_total / sessions, 2) if sessions else 0
+        user['lastActivity'] = to_iso_string(last_activity)
+        user['updatedAt'] = last_activity
+
+        yield 'users', f"users/{user_id}", user
+        yield from documents
+
+    def _tournament_documents(self, rng: random.Random, index: int) -> Iterator[Document]:
+        created = self.start + self.window * rng.random()
+        max_participants = rng.choice(TOURNAMENT_SIZES)
+        entry_fee = rng.choice(TOURNAMENT_ENTRY_FEES)
+        wanted = min(max_participants, int(rng.paretovariate(1.3)))
+
+        members = []
+        seen = set()
+        while len(members) < wanted and len(seen) < self.users:
+            member = int(self.users * rng.random() ** 2)
+            if member not in seen:
+                seen.add(member)
+                members.append(member)
+        if not members:
+            return
+
+        participants = []
+        moment = created
+        for position, member in enumerate(members):
+            participants.append({
+                'userId': user_id_for(member),
+                'userName': user_name_for(member),
+                'joinedAt': to_iso_string(moment),
+                'isCreator': position == 0,
+            })
+            moment += timedelta(seconds=rng.expovariate(1 / 600))
+
+        total_pool = entry_fee * len(participants)
+        tournament = {
+            'id': f"tournament_{millis(created)}",
+            'name': f"{rng.choice(['Daily', 'Weekend', 'Blitz', 'Crypto', 'Trivia', 'Masters'])} Cup #{index + 1}",
+            'description': '',
+            'entryFee': entry_fee,
+            'maxParticipants': max_participants,
+            'currentParticipants': len(participants),
+            'totalPool': total_pool,
+            'status': 'active',
+            'creatorId': participants[0]['userId'],
+            'creatorName': participants[0]['userName'],
+            'participants': participants,
+            'quizQuestions': [],
+            'timeLimit': 300,
+            'startsAt': to_iso_string(created),
+            'endsAt': None,
+            'createdAt': created,
+            'updatedAt': moment,
+        }
+
+        if created < self.end - timedelta(days=1):
+            finished = min(self.end, moment + timedelta(hours=rng.uniform(1, 24)))
+            if rng.random() < 0.9:
+                winner = rng.choice(participants)
+                app_fee = round(total_pool * TOURNAMENT_APP_FEE_RATE, 2)
+                tournament.update(status='completed', winnerId=winner['userId'],
+                                  winnerScore=rng.randint(60, 100),
+                                  winnerAmount=round(total_pool - app_fee, 2), appFee=app_fee)
+            else:
+                tournament['status'] = 'cancelled'
+            tournament['endsAt'] = to_iso_string(finished)
+            tournament['updatedAt'] = finished
+
+        yield 'tournaments', f"tournaments/{auto_id(rng)}", tournament
+
+
+class NdjsonSink:
+    def __init__(self, output_dir: str, prefix: str, max_docs_per_shard: int = 100_000):
+        """
+        Write generated documents into per-collection NDJSON shards
+
+        The layout matches an export directory, so the result can be loaded
+        with import_firebase_data.py.
+
+        Args:
+            output_dir: Directory holding one subdirectory per collection
+            prefix: Shard file name prefix, unique per generation task
+            max_docs_per_shard: Documents per shard file
+        """
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_docs_per_shard = max_docs_per_shard
+        self._writers: Dict[str, ShardWriter] = {}
+
+    def write(self, collection_name: str, path: str, data: Dict[str, Any]):
+        writer = self._writers.get(collection_name)
+        if writer is None:
+            writer = ShardWriter(os.path.join(self.output_dir, collection_name), self.prefix,
+                                 self.max_docs_per_shard, compresslevel=1)
+            self._writers[collection_name] = writer
+        writer.write_lines([encode_record(path, data)])
+
+    def close(self) -> Dict[str, int]:
+        """Close every shard and return documents written per collection"""
+        for writer in self._writers.values():
+            writer.close()
+        return {name: writer.count for name, writer in self._writers.items()}
+
+
+class FirestoreSink:
+    def __init__(self, db, writer, page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        Write generated documents straight into Firestore through a PipelinedWriter
+
+        Args:
+            db: Firestore client
+            writer: Writer the pages are committed through
+            page_size: Documents per submitted page
+        """
+        self.db = db
+        self.writer = writer
+        self.page_size = page_size
+        self._page: List[tuple] = []
+        self._pending = deque()
+        self._counts: Dict[str, int] = {}
+
+    def write(self, collection_name: str, path: str, data: Dict[str, Any]):
+        self._page.append((self.db.document(path), data))
+        self._counts[collection_name] = self._counts.get(collection_name, 0) + 1
+        if len(self._page) >= self.page_size:
+            self._submit()
+
+    def _submit(self):
+        self._pending.append(self.writer.set_many(self._page))
+        self._page = []
+        while self._pending and self._pending[0].done():
+            self._pending.popleft().result()
+
+    def close(self) -> Dict[str, int]:
+        """Commit the last page, wait for every commit and return documents written per collection"""
+        if self._page:
+            self._submit()
+        while self._pending:
+            self._pending.popleft().result()
+        counts, self._counts = self._counts, {}
+        return counts
+
+
+# Per-process generation state, set up by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(dataset: SyntheticDataset, output_dir: Optional[str], project_id: Optional[str],
+                 max_docs_per_shard: int, max_in_flight: int):
+    _worker['dataset'] = dataset
+    _worker['output_dir'] = output_dir
+    _worker['max_docs_per_shard'] = max_docs_per_shard
+    if output_dir is None:
+        from clear_firebase_data import connect_firestore
+        from firebase_import import EMULATOR_INITIAL_OPS_PER_SECOND
+        from firebase_rate_control import AdaptiveRateController
+        from firebase_streaming import PipelinedWriter
+
+        db = connect_firestore(project_id)
+        writer = PipelinedWriter(db, max_in_flight=max_in_flight,
+                                 rate_controller=AdaptiveRateController(EMULATOR_INITIAL_OPS_PER_SECOND))
+        _worker['sink'] = FirestoreSink(db, writer)
+
+
+def _run_task(task: Tuple[str, int, int, int]) -> Dict[str, int]:
+    kind, chunk, _, _ = task
+    sink = _worker.get('sink')
+    if sink is None:
+        sink = NdjsonSink(_worker['output_dir'], f"gen-{kind}-{chunk:05d}", _worker['max_docs_per_shard'])
+    for collection_name, path, data in _worker['dataset'].generate(task):
+        sink.write(collection_name, path, data)
+    return sink.close()
+
+
+def generate_dataset(dataset: SyntheticDataset, output_dir: Optional[str] = None,
+                     project_id: Optional[str] = None, processes: Optional[int] = None,
+                     max_docs_per_shard: int = 100_000, max_in_flight: int = 8,
+                     report_interval: float = 5.0) -> Dict[str, int]:
+    """
+    Generate a dataset on a pool of processes and return documents written per collection
+
+    With output_dir the documents go to NDJSON shards there; otherwise each
+    process connects to Firestore (the emulator) and writes them directly.
+    """
+    tasks = dataset.tasks()
+    processes = processes or os.cpu_count() or 1
+    target = output_dir or f"Firestore project {project_id}"
+    print(f"🧪 Generating {dataset.users} users and {dataset.tournaments} tournaments "
+          f"(seed {dataset.seed}) into {target} with {processes} processes")
+
+    totals: Dict[str, int] = {}
+    meter = ThroughputMeter("generate", report_interval, icon="🧪")
+    with Pool(processes, _init_worker,
+              (dataset, output_dir, project_id, max_docs_per_shard, max_in_flight)) as pool:
+        for counts in pool.imap_unordered(_run_task, tasks):
+            for collection_name, count in counts.items():
+                totals[collection_name] = totals.get(collection_name, 0) + count
+            meter.add(sum(counts.values()))
+
+    for collection_name in GENERATED_COLLECTIONS:
+        if collection_name in totals:
+            print(f"  ✅ {collection_name}: {totals[collection_name]} documents")
+    print(f"⏱️ Generated {meter.count} documents in {meter.elapsed:.1f}s ({meter.rate:.0f} docs/sec)")
+    return totals
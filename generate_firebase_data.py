@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Firebase Synthetic Data Script
+Generate a seeded, production-shaped dataset into NDJSON shards or the Firestore emulator
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from clear_firebase_data import DEFAULT_PROJECT_ID
+from firebase_import import emulator_host
+from firebase_synthetic import SyntheticDataset, generate_dataset
+
+
+def parse_date(text: str) -> datetime:
+    """Parse a YYYY-MM-DD (or ISO 8601) date as UTC"""
+    moment = datetime.fromisoformat(text)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Firebase Synthetic Data Generator")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output-dir", help="write NDJSON shards here (loadable with import_firebase_data.py)")
+    target.add_argument("--emulator", action="store_true",
+                        help="write straight into the emulator at FIRESTORE_EMULATOR_HOST")
+    parser.add_argument("--users", type=int, default=10_000, help="number of users")
+    parser.add_argument("--tournaments", type=int, help="number of tournaments (default: users / 100)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--days", type=int, default=90, help="length of the activity window")
+    parser.add_argument("--end", type=parse_date,
+                        help="end of the activity window, YYYY-MM-DD (default: today); "
+                             "fix it to reproduce a dataset exactly")
+    parser.add_argument("--sessions-per-user", type=float, default=8.0, help="mean quiz sessions per user")
+    parser.add_argument("--cheater-rate", type=float, default=0.005, help="share of cheating users")
+    parser.add_argument("--processes", type=int, help="generator processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=5_000, help="users per generation task")
+    parser.add_argument("--shard-size", type=int, default=100_000, help="documents per shard file")
+    parser.add_argument("--max-in-flight", type=int, default=8,
+                        help="concurrent batch commits per process (emulator only)")
+    parser.add_argument("--project-id", default=DEFAULT_PROJECT_ID, help="emulator project ID")
+    args = parser.parse_args()
+
+    print("🧪 Firebase Synthetic Data Generator")
+    print("=" * 40)
+
+    if args.emulator and not emulator_host():
+        # Never seed a real project by accident
+        print("❌ FIRESTORE_EMULATOR_HOST is not set; refusing to write synthetic data to a live project")
+        sys.exit(1)
+
+    tournaments = args.tournaments if args.tournaments is not None else args.users // 100
+    dataset = SyntheticDataset(args.users, tournaments, seed=args.seed, days=args.days, end=args.end,
+                               sessions_per_user=args.sessions_per_user,
+                               cheater_rate=args.cheater_rate, chunk_size=args.chunk_size)
+    generate_dataset(dataset, output_dir=args.output_dir,
+                     project_id=args.project_id if args.emulator else None,
+                     processes=args.processes, max_docs_per_shard=args.shard_size,
+                     max_in_flight=args.max_in_flight)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Firebase Import Script
+Restore an NDJSON export (or seed data in the same format) into Firestore
+"""
+
+import sys
+
+from manage_firebase_data import main as manage_main
+
+
+def main():
+    """Main function; same as `manage_firebase_data.py import`"""
+    return manage_main(["import", *sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
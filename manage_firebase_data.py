@@ -0,0 +1,760 @@
+#!/usr/bin/env python3
+"""
+Firebase Data Management CLI
+One non-interactive command line for the Firestore maintenance tools,
+suitable for cron jobs and CI (stats, clear, export, import, prune, rollup,
+leaderboard, broadcast, reconcile, anticheat, dedup, indexes)
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+from typing import Any, Dict, List, Optional
+
+from clear_firebase_data import (CONTENT_DATA_COLLECTIONS, DEFAULT_COLLECTIONS, DEFAULT_PROJECT_ID,
+                                 USER_DATA_COLLECTIONS, FirebaseDataClearer, connect_firestore,
+                                 find_service_account_path)
+from create_firebase_indexes import DEFAULT_INDEXES_FILE, DEFAULT_SOURCE_PATTERNS, create_firebase_indexes
+from firebase_anticheat import RiskScorer
+from firebase_async import AsyncFirestoreEngine
+from firebase_broadcast import BroadcastWorker, create_broadcast
+from firebase_checkpoint import DEFAULT_JOURNAL_PATH, JobJournal
+from firebase_dedup import ACTIONS, DEFAULT_THRESHOLD, QUESTIONS_COLLECTION, QuestionDeduplicator
+from firebase_export import FirestoreExporter, IncrementalExporter, default_export_dir
+from firebase_import import EMULATOR_INITIAL_OPS_PER_SECOND, FirestoreImporter, emulator_host
+from firebase_leaderboard import LEADERBOARD_COLLECTION, LeaderboardMaterializer
+from firebase_metrics import add_metrics_arguments, configure_metrics, tracer, write_metrics
+from firebase_rate_control import DEFAULT_INITIAL_OPS_PER_SECOND, AdaptiveRateController
+from firebase_reconcile import reconcile_balances
+from firebase_rollup import ROLLUPS, STATS_COLLECTION, StatsRollup
+from firebase_streaming import PipelinedWriter
+from prune_firebase_data import DEFAULT_RETENTION_POLICIES, RetentionPruner, parse_policy
+
+# Exit codes: success, operation failed, refused to run (bad or unsafe arguments)
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_REFUSED = 2
+
+
+def parse_list(text: Optional[str]) -> List[str]:
+    """Split a comma-separated argument into its non-empty items"""
+    if not text:
+        return []
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def print_header(title: str):
+    """Print a tool's banner"""
+    print(title)
+    print("=" * 40)
+
+
+def open_clearer(args, **options) -> FirebaseDataClearer:
+    """Connect to Firestore with the connection arguments shared by every command"""
+    service_account_path = args.service_account or find_service_account_path()
+    return FirebaseDataClearer(args.project_id, service_account_path, **options)
+
+
+def open_async_engine(args, **options) -> AsyncFirestoreEngine:
+    """Connect an AsyncClient with the shared connection arguments; call it inside the event loop"""
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path, use_async=True)
+    return AsyncFirestoreEngine(db, **options)
+
+
+def clear_targets(args, known: List[str]) -> List[str]:
+    """Collections selected by the clear command's target options"""
+    if args.all:
+        return known
+    if args.user_data:
+        return USER_DATA_COLLECTIONS
+    if args.content_data:
+        return CONTENT_DATA_COLLECTIONS
+    return parse_list(args.collections)
+
+
+async def known_collections(engine: AsyncFirestoreEngine, args) -> List[str]:
+    """--collections, or the default collections plus any discovered with --discover"""
+    collections = parse_list(getattr(args, "collections", None)) or list(DEFAULT_COLLECTIONS)
+    if args.discover:
+        discovered = await engine.discover_collections()
+        collections.extend(name for name in discovered if name not in collections)
+    return collections
+
+
+async def async_stats(args) -> Dict[str, int]:
+    async with open_async_engine(args) as engine:
+        return await engine.get_collection_stats(await known_collections(engine, args))
+
+
+async def async_clear(args) -> Dict[str, int]:
+    journal = JobJournal(args.checkpoint_file)
+    try:
+        async with open_async_engine(args, workers=args.workers, max_in_flight=args.max_in_flight) as engine:
+            known = list(DEFAULT_COLLECTIONS)
+            if args.discover:
+                known.extend(name for name in await engine.discover_collections() if name not in known)
+            results = await engine.clear_collections(clear_targets(args, known), recursive=args.recursive,
+                                                     journal=journal, resume=args.resume)
+            stats = engine.rate_controller.stats()
+    finally:
+        journal.close()
+    print(f"\n🎉 Cleared {sum(count for count in results.values() if count > 0)} documents "
+          f"(final target {stats['target_ops_per_second']:.0f} ops/sec, "
+          f"{stats['contention_errors']} contention retries)")
+    return results
+
+
+async def async_export(args, output_dir: str) -> Dict[str, Any]:
+    async with open_async_engine(args, workers=args.workers, page_size=args.page_size) as engine:
+        return await engine.export_collections(await known_collections(engine, args), output_dir,
+                                               partitions=args.partitions,
+                                               max_docs_per_shard=args.shard_size)
+
+
+def cmd_stats(args) -> int:
+    """Print document counts per collection"""
+    print_header("📊 Firebase Database Statistics")
+
+    try:
+        if args.engine == "async":
+            stats = asyncio.run(async_stats(args))
+        else:
+            clearer = open_clearer(args, auto_discover=args.discover)
+            if args.collections:
+                clearer.collections = parse_list(args.collections)
+            try:
+                stats = clearer.get_collection_stats()
+            finally:
+                clearer.close()
+    finally:
+        write_metrics(args, job="stats")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        print(f"💾 Counts written to {args.output}")
+    return EXIT_FAILED if any(count < 0 for count in stats.values()) else EXIT_OK
+
+
+def cmd_clear(args) -> int:
+    """Clear whole collections, or purge the documents matching --user-id/--older-than-days"""
+    print_header("🗄️ Firebase Database Clear Tool")
+
+    # Without --yes the clearer asks for confirmation, which would hang or fail under cron
+    if not args.yes and not sys.stdin.isatty():
+        print("❌ Refusing to delete without confirmation; pass --yes when running unattended")
+        return EXIT_REFUSED
+
+    purge = bool(args.user_id) or args.older_than_days is not None
+    if args.engine == "async":
+        if purge or args.backup_dir or not args.yes:
+            print("❌ The async engine clears whole collections only, without backups or prompts; "
+                  "pass --yes, or use --engine threads")
+            return EXIT_REFUSED
+        try:
+            results = asyncio.run(async_clear(args))
+            return EXIT_FAILED if any(count < 0 for count in results.values()) else EXIT_OK
+        except KeyboardInterrupt:
+            print("\n⏸️ Clear interrupted; run again with --resume to continue")
+            return EXIT_FAILED
+        finally:
+            write_metrics(args, job="clear")
+
+    clearer = open_clearer(args, workers=args.workers, max_in_flight=args.max_in_flight,
+                           auto_discover=args.discover, recursive=args.recursive,
+                           journal_path=args.checkpoint_file, resume=args.resume,
+                           backup_dir=args.backup_dir)
+    try:
+        collections = clear_targets(args, clearer.collections)
+        if purge:
+            results = clearer.purge_documents(collections, args.user_id, args.older_than_days,
+                                              confirm=args.yes)
+            if not results or any(count < 0 for count in results.values()):
+                return EXIT_FAILED
+            return EXIT_OK
+        if args.all:
+            succeeded = clearer.clear_all_data(confirm=args.yes)
+        else:
+            succeeded = clearer.clear_specific_collections(collections, confirm=args.yes)
+            clearer.print_rate_stats()
+        return EXIT_OK if succeeded else EXIT_FAILED
+    except KeyboardInterrupt:
+        print("\n⏸️ Clear interrupted; run again with --resume to continue")
+        return EXIT_FAILED
+    finally:
+        clearer.close()
+        write_metrics(args, job="clear")
+
+
+def cmd_export(args) -> int:
+    """Export collections to NDJSON shards, in full or incrementally"""
+    print_header("📦 Firebase Export Tool")
+
+    try:
+        if args.incremental and args.compact:
+            IncrementalExporter(None, args.incremental, max_docs_per_shard=args.shard_size).compact()
+            return EXIT_OK
+
+        if args.engine == "async":
+            if args.incremental:
+                print("❌ Incremental exports run on the threaded engine; drop --engine async")
+                return EXIT_REFUSED
+            manifest = asyncio.run(async_export(args, args.output_dir or default_export_dir()))
+        else:
+            clearer = open_clearer(args, auto_discover=args.discover)
+            collections = parse_list(args.collections) or clearer.collections
+            if args.incremental:
+                exporter = IncrementalExporter(clearer.db, args.incremental, workers=args.workers,
+                                               partitions=args.partitions, page_size=args.page_size,
+                                               max_docs_per_shard=args.shard_size)
+                if args.baseline or not exporter.state['baseline']:
+                    manifest = exporter.export_baseline(collections)
+                else:
+                    manifest = exporter.export_delta(collections)
+                if manifest is None:
+                    return EXIT_FAILED
+            else:
+                exporter = FirestoreExporter(clearer.db, args.output_dir or default_export_dir(),
+                                             workers=args.workers, partitions=args.partitions,
+                                             page_size=args.page_size, max_docs_per_shard=args.shard_size)
+                manifest = exporter.export_collections(collections)
+
+        if not manifest['complete']:
+            print("⚠️ Some partitions failed; see errors above")
+            return EXIT_FAILED
+        return EXIT_OK
+    finally:
+        write_metrics(args, job="export")
+
+
+def cmd_import(args) -> int:
+    """Restore an export directory into Firestore"""
+    print_header("📥 Firebase Import Tool")
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+
+    initial_rate = args.initial_ops_per_second
+    if initial_rate is None:
+        initial_rate = EMULATOR_INITIAL_OPS_PER_SECOND if emulator_host() else DEFAULT_INITIAL_OPS_PER_SECOND
+    rate_controller = AdaptiveRateController(initial_ops_per_second=initial_rate,
+                                             max_ops_per_second=args.max_ops_per_second)
+    writer = PipelinedWriter(db, args.batch_size, max_in_flight=args.max_in_flight,
+                             rate_controller=rate_controller)
+    journal = JobJournal(args.checkpoint_file)
+
+    importer = FirestoreImporter(db, writer, journal, workers=args.workers,
+                                 page_size=args.batch_size, merge=args.merge)
+    results = None
+    try:
+        results = importer.import_directory(args.input_dir, parse_list(args.collections) or None,
+                                            resume=args.resume)
+    except KeyboardInterrupt:
+        print("\n⏸️ Import interrupted; run again with --resume to continue")
+    finally:
+        writer.close()
+        journal.close()
+        write_metrics(args, job="import", imported=results or {})
+        stats = rate_controller.stats()
+        print(f"📈 Final target {stats['target_ops_per_second']:.0f} ops/sec, "
+              f"{stats['contention_errors']} contention errors")
+    return EXIT_OK if results and not importer.failed_shards else EXIT_FAILED
+
+
+def cmd_prune(args) -> int:
+    """Delete documents past their retention period, once or as a long-running service"""
+    print_header("🧹 Firebase Retention Pruner")
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+    journal = JobJournal(args.checkpoint_file)
+    policies = dict(args.policy) if args.policy else None
+
+    pruner = RetentionPruner(db, journal, policies,
+                             batch_size=args.batch_size,
+                             max_batches_per_cycle=args.max_batches,
+                             max_ops_per_second=args.max_ops_per_second)
+
+    if args.once:
+        try:
+            results = pruner.run_once()
+        finally:
+            pruner.writer.close()
+            journal.close()
+        print(f"✅ Pruned {sum(count for count in results.values() if count > 0)} documents")
+        write_metrics(args, job="prune", pruned=results)
+        return EXIT_FAILED if any(count < 0 for count in results.values()) else EXIT_OK
+
+    signal.signal(signal.SIGTERM, lambda *_: pruner.stop())
+    try:
+        # Refresh the metrics files every cycle so a textfile collector sees a live service
+        pruner.run_forever(args.interval, after_cycle=lambda: write_metrics(args, job="prune"))
+    except KeyboardInterrupt:
+        pruner.stop()
+        pruner.writer.close()
+    finally:
+        write_metrics(args, job="prune")
+        journal.close()
+    return EXIT_OK
+
+
+def cmd_rollup(args) -> int:
+    """Maintain the precomputed dashboard stats documents, once or as a long-running service"""
+    print_header("📊 Firebase Stats Rollup")
+
+    unknown = [name for name in parse_list(args.stats) if name not in ROLLUPS]
+    if unknown:
+        print(f"❌ Unknown stats: {', '.join(unknown)} (choose from {', '.join(ROLLUPS)})")
+        return EXIT_REFUSED
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+    journal = JobJournal(args.checkpoint_file)
+    rollup = StatsRollup(db, journal, parse_list(args.stats) or None,
+                         page_size=args.page_size,
+                         overlap_seconds=args.overlap_seconds,
+                         rescan_every=args.rescan_every)
+
+    if args.once:
+        try:
+            results = rollup.run_once(rebuild=args.rebuild)
+        finally:
+            rollup.close()
+            journal.close()
+        print(f"✅ {sum(count for count in results.values() if count > 0)} documents changed; "
+              f"dashboards read {STATS_COLLECTION}/<name>")
+        write_metrics(args, job="rollup", changed=results)
+        return EXIT_FAILED if any(count < 0 for count in results.values()) else EXIT_OK
+
+    signal.signal(signal.SIGTERM, lambda *_: rollup.stop())
+    try:
+        rollup.run_forever(args.interval, after_cycle=lambda: write_metrics(args, job="rollup"))
+    except KeyboardInterrupt:
+        rollup.stop()
+        rollup.close()
+    finally:
+        write_metrics(args, job="rollup")
+        journal.close()
+    return EXIT_OK
+
+
+def cmd_leaderboard(args) -> int:
+    """Maintain the leaderboard collection, once or as a long-running service"""
+    print_header("🏆 Firebase Leaderboard Materializer")
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+    journal = JobJournal(args.checkpoint_file)
+    materializer = LeaderboardMaterializer(db, journal, top=args.top,
+                                           daily_days=args.daily_days,
+                                           page_size=args.page_size,
+                                           overlap_seconds=args.overlap_seconds)
+
+    if args.once:
+        try:
+            results = materializer.run_once(rebuild=args.rebuild)
+        finally:
+            materializer.close()
+            journal.close()
+        print(f"✅ {results['entries_written']} {LEADERBOARD_COLLECTION} entries written")
+        write_metrics(args, job="leaderboard", results=results)
+        return EXIT_FAILED if results['failed_boards'] else EXIT_OK
+
+    signal.signal(signal.SIGTERM, lambda *_: materializer.stop())
+    try:
+        materializer.run_forever(args.interval, after_cycle=lambda: write_metrics(args, job="leaderboard"))
+    except KeyboardInterrupt:
+        materializer.stop()
+        materializer.close()
+    finally:
+        write_metrics(args, job="leaderboard")
+        journal.close()
+    return EXIT_OK
+
+
+def cmd_broadcast(args) -> int:
+    """Deliver queued broadcast requests as per-user notifications, once or as a long-running service"""
+    print_header("📣 Firebase Notification Fan-out")
+
+    data = {}
+    if args.data:
+        try:
+            data = json.loads(args.data)
+        except ValueError as e:
+            print(f"❌ --data is not valid JSON: {e}")
+            return EXIT_REFUSED
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+    if args.send:
+        print(f"📨 Queued broadcast {create_broadcast(db, args.send, data)} ({args.send})")
+
+    journal = JobJournal(args.checkpoint_file)
+    worker = BroadcastWorker(db, journal, page_size=args.page_size,
+                             max_in_flight=args.max_in_flight,
+                             max_ops_per_second=args.max_ops_per_second)
+
+    if args.once:
+        try:
+            results = worker.run_once()
+        finally:
+            worker.writer.close()
+            journal.close()
+        sent = {key: count for key, count in results.items() if count >= 0}
+        print(f"✅ Sent {len(sent)} broadcasts, {sum(sent.values())} notifications")
+        write_metrics(args, job="broadcast", sent=results)
+        return EXIT_FAILED if len(sent) < len(results) else EXIT_OK
+
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run_forever(args.interval, after_cycle=lambda: write_metrics(args, job="broadcast"))
+    except KeyboardInterrupt:
+        worker.stop()
+        worker.writer.close()
+    finally:
+        write_metrics(args, job="broadcast")
+        journal.close()
+    return EXIT_OK
+
+
+def cmd_reconcile(args) -> int:
+    """Check stored balances against transactions and bets, optionally correcting them"""
+    print_header("⚖️ Firebase Balance Reconciliation")
+
+    if args.apply and not args.yes:
+        print("❌ Refusing to overwrite balances without confirmation; pass --yes with --apply")
+        return EXIT_REFUSED
+    if args.apply_playable and not args.apply:
+        print("❌ --apply-playable only widens --apply; pass --apply --yes as well")
+        return EXIT_REFUSED
+
+    service_account_path = args.service_account or find_service_account_path()
+    # Worker processes connect on their own; the parent client only computes the userId ranges
+    db = connect_firestore(args.project_id, service_account_path)
+    summary = reconcile_balances(args.output or default_export_dir("reconciliation"), db=db,
+                                 project_id=args.project_id, service_account_path=service_account_path,
+                                 partitions=args.partitions, processes=args.processes,
+                                 page_size=args.page_size, tolerance=args.tolerance, apply=args.apply,
+                                 max_ops_per_second=args.max_ops_per_second,
+                                 apply_playable=args.apply_playable)
+    write_metrics(args, job="reconcile", users=summary['users'], discrepancies=summary['discrepancies'],
+                  orphans=summary['orphans'], corrected=summary['corrected'],
+                  rejected_withdrawals=summary['rejected_withdrawals'])
+    if args.check and (summary['discrepancies'] or summary['orphans'] or summary['rejected_withdrawals']):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def cmd_anticheat(args) -> int:
+    """Score every user's quiz history and publish risk documents, once or as a long-running service"""
+    print_header("🕵️ Firebase Anti-Cheat Scoring")
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+    scorer = RiskScorer(db, page_size=args.page_size, max_ops_per_second=args.max_ops_per_second)
+
+    if args.once or args.dry_run:
+        try:
+            results = scorer.run_once(dry_run=args.dry_run)
+        except Exception as e:
+            print(f"❌ Scoring failed: {e}")
+            write_metrics(args, job="anticheat")
+            return EXIT_FAILED
+        finally:
+            scorer.writer.close()
+        action = "would update" if args.dry_run else "updated"
+        print(f"✅ {results['flagged']} of {results['users']} users flagged over {results['sessions']} sessions "
+              f"({action} {results['written']}, cleared {results['cleared']})")
+        write_metrics(args, job="anticheat", **results)
+        return EXIT_OK
+
+    signal.signal(signal.SIGTERM, lambda *_: scorer.stop())
+    try:
+        scorer.run_forever(args.interval, after_cycle=lambda: write_metrics(args, job="anticheat"))
+    except KeyboardInterrupt:
+        scorer.stop()
+        scorer.writer.close()
+    finally:
+        write_metrics(args, job="anticheat")
+    return EXIT_OK
+
+
+def cmd_dedup(args) -> int:
+    """Index the question bank for near-duplicates and report, flag or delete them"""
+    print_header("🔎 Firebase Question Deduplicator")
+
+    if args.action == 'delete' and not args.yes:
+        print("❌ Refusing to delete questions without confirmation; pass --yes with --action delete")
+        return EXIT_REFUSED
+
+    service_account_path = args.service_account or find_service_account_path()
+    db = connect_firestore(args.project_id, service_account_path)
+    journal = JobJournal(args.checkpoint_file)
+    deduplicator = QuestionDeduplicator(db, journal, collection_name=args.collection, threshold=args.threshold,
+                                        action=args.action, page_size=args.page_size,
+                                        overlap_seconds=args.overlap_seconds,
+                                        max_ops_per_second=args.max_ops_per_second)
+
+    if args.lookup:
+        try:
+            matches = deduplicator.lookup(args.lookup, parse_list(args.options))
+        finally:
+            deduplicator.close()
+            journal.close()
+        for path, score in matches:
+            print(f"  🔁 {path} ({score:.2f})")
+        print(f"✅ {len(matches)} indexed questions at or above {args.threshold:g} similarity")
+        return EXIT_OK
+
+    if args.once or args.rebuild:
+        try:
+            results = deduplicator.run_once(rebuild=args.rebuild)
+        finally:
+            deduplicator.close()
+            journal.close()
+        print(f"✅ {results['read']} questions checked, {results['found']} new duplicates; "
+              f"{results['indexed']} distinct questions indexed, {results['duplicates']} duplicates recorded")
+        write_metrics(args, job="dedup", **results)
+        return EXIT_OK
+
+    signal.signal(signal.SIGTERM, lambda *_: deduplicator.stop())
+    try:
+        deduplicator.run_forever(args.interval, after_cycle=lambda: write_metrics(args, job="dedup"))
+    except KeyboardInterrupt:
+        deduplicator.stop()
+        deduplicator.close()
+    finally:
+        write_metrics(args, job="dedup")
+        journal.close()
+    return EXIT_OK
+
+
+def cmd_indexes(args) -> int:
+    """Derive the composite indexes the app's queries need and diff them against the declared ones"""
+    print_header("🔧 Firebase Index Advisor")
+
+    output = None if args.dry_run else args.output
+    if not create_firebase_indexes(args.src or DEFAULT_SOURCE_PATTERNS, args.declared or args.output,
+                                   output, check=args.check, include_client_sorted=args.include_client_sorted,
+                                   verbose=args.verbose):
+        print("\n❌ Some required indexes are not declared")
+        return EXIT_FAILED
+    print("\n✅ Index analysis completed!")
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with one subcommand per tool"""
+    connection = argparse.ArgumentParser(add_help=False)
+    connection.add_argument("--project-id", default=DEFAULT_PROJECT_ID, help="Firebase project ID")
+    connection.add_argument("--service-account", help="service account JSON file")
+    add_metrics_arguments(connection)
+
+    parser = argparse.ArgumentParser(
+        prog="manage_firebase_data.py", description="Firebase Data Management Tool",
+        epilog="Firestore is only contacted once a command runs; set FIRESTORE_EMULATOR_HOST "
+               "to work against the emulator")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+
+    stats = commands.add_parser("stats", parents=[connection], help="show document counts")
+    stats.add_argument("--collections", help="comma-separated collections (default: all known)")
+    stats.add_argument("--discover", action="store_true", help="also count root collections found in the database")
+    stats.add_argument("--output", metavar="PATH", help="also write the counts as JSON")
+    stats.add_argument("--engine", choices=["threads", "async"], default="threads",
+                         help="threads (default) or asyncio on one AsyncClient")
+    stats.set_defaults(handler=cmd_stats)
+
+    clear = commands.add_parser("clear", parents=[connection], help="delete collections or matching documents")
+    target = clear.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="every known collection")
+    target.add_argument("--collections", help="comma-separated collections")
+    target.add_argument("--user-data", action="store_true", help=", ".join(USER_DATA_COLLECTIONS))
+    target.add_argument("--content-data", action="store_true", help=", ".join(CONTENT_DATA_COLLECTIONS))
+    clear.add_argument("--user-id", action="append", metavar="ID",
+                       help="only delete this user's documents (repeatable)")
+    clear.add_argument("--older-than-days", type=float, metavar="DAYS",
+                       help="only delete documents older than DAYS")
+    clear.add_argument("--yes", action="store_true", help="skip the confirmation prompt (required without a terminal)")
+    clear.add_argument("--recursive", action="store_true", help="also delete nested subcollections")
+    clear.add_argument("--discover", action="store_true", help="add root collections found in the database")
+    clear.add_argument("--workers", type=int, default=1, help="collections cleared at once")
+    clear.add_argument("--max-in-flight", type=int, default=1, help="concurrent batch commits")
+    clear.add_argument("--resume", action="store_true", help="continue the previous clear from its checkpoints")
+    clear.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                       help=f"checkpoint file (default: {DEFAULT_JOURNAL_PATH})")
+    clear.add_argument("--backup-dir", help="export collections under this directory before clearing")
+    clear.add_argument("--engine", choices=["threads", "async"], default="threads",
+                         help="threads (default) or asyncio on one AsyncClient")
+    clear.set_defaults(handler=cmd_clear)
+
+    export = commands.add_parser("export", parents=[connection], help="back up collections to NDJSON shards")
+    export.add_argument("--collections", help="comma-separated collections (default: all known)")
+    export.add_argument("--discover", action="store_true", help="also export root collections found in the database")
+    export.add_argument("--output-dir", help="export directory (default: backups/<timestamp>)")
+    export.add_argument("--workers", type=int, default=4, help="partitions exported at once")
+    export.add_argument("--partitions", type=int, default=4, help="key-range partitions per collection")
+    export.add_argument("--page-size", type=int, default=300, help="documents per query page")
+    export.add_argument("--shard-size", type=int, default=100_000, help="documents per shard file")
+    export.add_argument("--incremental", metavar="ROOT_DIR",
+                        help="keep a baseline plus change-only deltas under ROOT_DIR")
+    export.add_argument("--baseline", action="store_true", help="with --incremental: take a new full baseline")
+    export.add_argument("--compact", action="store_true",
+                        help="with --incremental: fold deltas into a new baseline (no Firestore reads)")
+    export.add_argument("--engine", choices=["threads", "async"], default="threads",
+                          help="threads (default) or asyncio on one AsyncClient")
+    export.set_defaults(handler=cmd_export)
+
+    restore = commands.add_parser("import", parents=[connection], help="restore NDJSON shards into Firestore")
+    restore.add_argument("input_dir", help="export directory holding <collection>/*.ndjson.gz shards")
+    restore.add_argument("--collections", help="comma-separated collections (default: every shard found)")
+    restore.add_argument("--merge", action="store_true",
+                         help="merge fields into existing documents instead of replacing them")
+    restore.add_argument("--workers", type=int, default=8, help="shards imported at once")
+    restore.add_argument("--max-in-flight", type=int, default=32, help="concurrent batch commits")
+    restore.add_argument("--batch-size", type=int, default=500, help="documents per batch commit")
+    restore.add_argument("--initial-ops-per-second", type=float,
+                         help=f"starting write rate (default: {DEFAULT_INITIAL_OPS_PER_SECOND}, "
+                              "unthrottled against the emulator)")
+    restore.add_argument("--max-ops-per-second", type=float, help="write rate ceiling")
+    restore.add_argument("--resume", action="store_true", help="skip shards a previous run finished")
+    restore.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                         help=f"progress file (default: {DEFAULT_JOURNAL_PATH})")
+    restore.set_defaults(handler=cmd_import)
+
+    prune = commands.add_parser("prune", parents=[connection], help="delete documents past their retention period")
+    prune.add_argument("--policy", action="append", type=parse_policy, metavar="COLLECTION=DAYS",
+                       help="retention policy, repeatable (default: "
+                            + ", ".join(f"{n}={d}" for n, d in DEFAULT_RETENTION_POLICIES.items()) + ")")
+    prune.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    prune.add_argument("--interval", type=float, default=300.0, help="seconds between cycles")
+    prune.add_argument("--batch-size", type=int, default=100, help="documents per delete batch")
+    prune.add_argument("--max-batches", type=int, default=50, help="batches per collection per cycle")
+    prune.add_argument("--max-ops-per-second", type=float, default=200, help="delete rate ceiling")
+    prune.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                       help=f"watermark file (default: {DEFAULT_JOURNAL_PATH})")
+    prune.set_defaults(handler=cmd_prune)
+
+    rollup = commands.add_parser("rollup", parents=[connection],
+                                 help="maintain precomputed dashboard stats documents")
+    rollup.add_argument("--stats", help="comma-separated stats documents (default: " + ",".join(ROLLUPS) + ")")
+    rollup.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    rollup.add_argument("--rebuild", action="store_true", help="re-read every source collection this cycle")
+    rollup.add_argument("--interval", type=float, default=60.0, help="seconds between cycles")
+    rollup.add_argument("--rescan-every", type=int, default=288,
+                        help="cycles between full passes, which pick up deletes (0: never)")
+    rollup.add_argument("--overlap-seconds", type=float, default=300.0,
+                        help="how far before the watermark each change query starts")
+    rollup.add_argument("--page-size", type=int, default=500, help="documents read per query page")
+    rollup.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                        help=f"watermark and contribution file (default: {DEFAULT_JOURNAL_PATH})")
+    rollup.set_defaults(handler=cmd_rollup)
+
+    leaderboard = commands.add_parser("leaderboard", parents=[connection],
+                                      help="maintain global, daily and per-tournament leaderboards")
+    leaderboard.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    leaderboard.add_argument("--rebuild", action="store_true",
+                             help="re-read users and the recent quiz_sessions instead of the changes")
+    leaderboard.add_argument("--interval", type=float, default=60.0, help="seconds between cycles")
+    leaderboard.add_argument("--top", type=int, default=100, help="entries kept per leaderboard")
+    leaderboard.add_argument("--daily-days", type=int, default=7, help="daily leaderboards kept, including today")
+    leaderboard.add_argument("--overlap-seconds", type=float, default=300.0,
+                             help="how far before the watermark each change query starts")
+    leaderboard.add_argument("--page-size", type=int, default=500, help="documents read per query page")
+    leaderboard.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                             help=f"watermark and score file (default: {DEFAULT_JOURNAL_PATH})")
+    leaderboard.set_defaults(handler=cmd_leaderboard)
+
+    broadcast = commands.add_parser("broadcast", parents=[connection],
+                                    help="deliver broadcast requests as per-user notifications")
+    broadcast.add_argument("--send", metavar="TYPE", help="queue a broadcast of this notification type first")
+    broadcast.add_argument("--data", metavar="JSON", help="notification data for --send")
+    broadcast.add_argument("--once", action="store_true", help="deliver what is queued and exit")
+    broadcast.add_argument("--interval", type=float, default=30.0, help="seconds between polls")
+    broadcast.add_argument("--page-size", type=int, default=500, help="users per page and batch")
+    broadcast.add_argument("--max-in-flight", type=int, default=8, help="concurrent batch commits")
+    broadcast.add_argument("--max-ops-per-second", type=float, default=2000, help="write rate ceiling")
+    broadcast.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                           help=f"progress file (default: {DEFAULT_JOURNAL_PATH})")
+    broadcast.set_defaults(handler=cmd_broadcast)
+
+    reconcile = commands.add_parser("reconcile", parents=[connection],
+                                    help="check user balances against transactions and bets")
+    reconcile.add_argument("--output", metavar="DIR",
+                           help="report directory (default: reconciliation/<timestamp>)")
+    reconcile.add_argument("--partitions", type=int, default=8, help="userId ranges the users are split into")
+    reconcile.add_argument("--processes", type=int, default=1, help="ranges checked at once, one process each")
+    reconcile.add_argument("--page-size", type=int, default=1000, help="documents read per query page")
+    reconcile.add_argument("--tolerance", type=float, default=0.01, help="largest difference treated as rounding")
+    reconcile.add_argument("--check", action="store_true",
+                           help="exit 1 on any discrepancy, orphan or unrefunded rejected withdrawal")
+    reconcile.add_argument("--apply", action="store_true",
+                           help="write the expected totalDeposited and totalWithdrawn back")
+    reconcile.add_argument("--apply-playable", action="store_true",
+                           help="with --apply, also overwrite playableBalance and availableBalance")
+    reconcile.add_argument("--yes", action="store_true", help="confirm --apply")
+    reconcile.add_argument("--max-ops-per-second", type=float, default=200,
+                           help="write rate ceiling for --apply, per process")
+    reconcile.set_defaults(handler=cmd_reconcile)
+
+    anticheat = commands.add_parser("anticheat", parents=[connection],
+                                    help="score quiz sessions and publish per-user risk flags")
+    anticheat.add_argument("--once", action="store_true", help="score once and exit")
+    anticheat.add_argument("--dry-run", action="store_true", help="score once and report without writing")
+    anticheat.add_argument("--interval", type=float, default=3600.0, help="seconds between runs")
+    anticheat.add_argument("--page-size", type=int, default=1000, help="sessions read per query page")
+    anticheat.add_argument("--max-ops-per-second", type=float, default=500, help="write rate ceiling")
+    anticheat.set_defaults(handler=cmd_anticheat)
+
+    dedup = commands.add_parser("dedup", parents=[connection], help="find near-duplicate quiz questions")
+    dedup.add_argument("--collection", default=QUESTIONS_COLLECTION,
+                       help=f"question collection (default: {QUESTIONS_COLLECTION})")
+    dedup.add_argument("--action", choices=ACTIONS, default="report",
+                       help="list duplicates (default), mark them inactive, or delete them")
+    dedup.add_argument("--yes", action="store_true", help="confirm --action delete")
+    dedup.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help=f"similarity from which questions are duplicates (default: {DEFAULT_THRESHOLD:g})")
+    dedup.add_argument("--lookup", metavar="TEXT", help="only list indexed questions similar to this one")
+    dedup.add_argument("--options", help="comma-separated answer options for --lookup")
+    dedup.add_argument("--once", action="store_true", help="check new questions once and exit")
+    dedup.add_argument("--rebuild", action="store_true", help="rebuild the index from every question")
+    dedup.add_argument("--interval", type=float, default=300.0, help="seconds between cycles")
+    dedup.add_argument("--overlap-seconds", type=float, default=300.0,
+                       help="re-read window before the watermark, for late writes")
+    dedup.add_argument("--page-size", type=int, default=500, help="documents read per query page")
+    dedup.add_argument("--max-ops-per-second", type=float, default=100, help="flag/delete rate ceiling")
+    dedup.add_argument("--checkpoint-file", default=DEFAULT_JOURNAL_PATH,
+                       help=f"watermark and index file (default: {DEFAULT_JOURNAL_PATH})")
+    dedup.set_defaults(handler=cmd_dedup)
+
+    indexes = commands.add_parser("indexes", help="derive firestore.indexes.json from the app's queries")
+    indexes.add_argument("--src", action="append", metavar="GLOB",
+                         help="JavaScript sources to scan, repeatable (default: "
+                              + ", ".join(DEFAULT_SOURCE_PATTERNS) + ")")
+    indexes.add_argument("--output", default=DEFAULT_INDEXES_FILE,
+                         help=f"index file to write (default: {DEFAULT_INDEXES_FILE})")
+    indexes.add_argument("--declared", help="index file to diff against (default: --output)")
+    indexes.add_argument("--check", action="store_true",
+                         help="write nothing; exit 1 if required indexes are missing")
+    indexes.add_argument("--include-client-sorted", action="store_true",
+                         help="also declare the indexes queries sorted in memory would need")
+    indexes.add_argument("--dry-run", action="store_true", help="print the diff without writing")
+    indexes.add_argument("--verbose", action="store_true", help="list queries that need no composite index too")
+    indexes.set_defaults(handler=cmd_indexes)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main function"""
+    args = build_parser().parse_args(argv)
+    configure_metrics(args)
+    try:
+        return args.handler(args)
+    finally:
+        tracer.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
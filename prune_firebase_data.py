@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Firebase Retention Pruner
+Long-running service that keeps high-churn collections at a steady size
+by deleting documents older than each collection's retention period
+"""
+
+import argparse
+import json
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from firebase_checkpoint import JobJournal
+from firebase_metrics import tracer
+from firebase_rate_control import AdaptiveRateController
+from firebase_schema import TIMESTAMP, time_field_for, time_value
+from firebase_streaming import DOCUMENT_ID, PipelinedWriter
+
+# Retention period in days for each collection that grows without limit
+DEFAULT_RETENTION_POLICIES = {
+    'activities': 90,
+    'notifications': 30,
+    'quiz_sessions': 180
+}
+
+# Job name used for watermarks in the journal
+PRUNE_JOB = "prune"
+
+
+def encode_watermark(value: Any, path: str) -> str:
+    """Serialize the (time value, document path) of the last pruned document"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return json.dumps({'value': value, 'path': path})
+
+
+def decode_watermark(text: str, kind: str) -> Dict[str, Any]:
+    """Parse a saved watermark back into query cursor values"""
+    watermark = json.loads(text)
+    if kind == TIMESTAMP:
+        watermark['value'] = datetime.fromisoformat(watermark['value'])
+    return watermark
+
+
+class RetentionPruner:
+    def __init__(self, db, journal: JobJournal, policies: Dict[str, float] = None,
+                 batch_size: int = 100, max_batches_per_cycle: int = 50,
+                 max_ops_per_second: float = 200, rescan_every: int = 24):
+        """
+        Delete expired documents in small, rate-limited batches
+
+        Each collection is read oldest-first with a query on its time field
+        (`timestamp < cutoff`), starting after a persisted watermark, so a
+        cycle only touches documents that expired since the previous one and
+        never re-reads the tombstones left by earlier deletes.
+
+        Args:
+            db: Firestore client
+            journal: Journal the per-collection watermarks are stored in
+            policies: Retention period in days per collection
+            batch_size: Documents read and deleted per batch
+            max_batches_per_cycle: Upper bound on batches per collection per cycle
+            max_ops_per_second: Ceiling for the delete rate
+            rescan_every: Cycles between restarts from the beginning of the range,
+                which catches documents written with an older time than the watermark
+                (0 never restarts)
+        """
+        self.db = db
+        self.journal = journal
+        self.policies = policies or dict(DEFAULT_RETENTION_POLICIES)
+        self.batch_size = batch_size
+        self.max_batches_per_cycle = max_batches_per_cycle
+        self.rescan_every = rescan_every
+        self.rate_controller = AdaptiveRateController(
+            initial_ops_per_second=min(max_ops_per_second, 100),
+            max_ops_per_second=max_ops_per_second)
+        self.writer = PipelinedWriter(db, batch_size, max_in_flight=1,
+                                      rate_controller=self.rate_controller)
+        self.cycles = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the service loop to finish the current batch and exit"""
+        self._stop.set()
+
+    def prune_collection(self, collection_name: str, retention_days: float) -> int:
+        """Delete documents past their retention period, resuming from the watermark"""
+        time_field, kind = time_field_for(collection_name)
+        cutoff = time_value(datetime.now(timezone.utc) - timedelta(days=retention_days), kind)
+        base_query = (self.db.collection(collection_name)
+                      .where(time_field, '<', cutoff)
+                      .select([time_field])
+                      .order_by(time_field)
+                      .order_by(DOCUMENT_ID)
+                      .limit(self.batch_size))
+
+        saved = self.journal.load(PRUNE_JOB, collection_name)
+        watermark = None
+        rescan = self.rescan_every > 0 and self.cycles % self.rescan_every == 0
+        if saved and saved['cursor'] and not rescan:
+            watermark = decode_watermark(saved['cursor'], kind)
+        processed = saved['processed'] if saved else 0
+
+        deleted = 0
+        for _ in range(self.max_batches_per_cycle):
+            if self._stop.is_set():
+                break
+
+            query = base_query
+            if watermark:
+                query = query.start_after({time_field: watermark['value'],
+                                           DOCUMENT_ID: self.db.document(watermark['path'])})
+            snapshots = list(query.stream())
+            if not snapshots:
+                break
+
+            deleted += self.writer.delete_many([snapshot.reference for snapshot in snapshots]).result()
+            last = snapshots[-1]
+            watermark = {'value': last.get(time_field), 'path': last.reference.path}
+            self.journal.save(PRUNE_JOB, collection_name,
+                              encode_watermark(watermark['value'], watermark['path']),
+                              processed + deleted)
+
+            if len(snapshots) < self.batch_size:
+                break
+
+        if deleted:
+            print(f"  🗑️ {collection_name}: pruned {deleted} documents older than {retention_days:g} days")
+        return deleted
+
+    def run_once(self) -> Dict[str, int]:
+        """Run one pruning cycle over every policy (-1 marks a collection that failed)"""
+        results = {}
+        for collection_name, retention_days in self.policies.items():
+            if self._stop.is_set():
+                break
+            try:
+                with tracer.span("firestore.prune_collection", collection=collection_name) as span:
+                    results[collection_name] = self.prune_collection(collection_name, retention_days)
+                    span.set_attribute("documents", results[collection_name])
+            except Exception as e:
+                print(f"  ❌ Error pruning {collection_name}: {e}")
+                results[collection_name] = -1
+        self.cycles += 1
+        return results
+
+    def run_forever(self, interval: float = 300.0, after_cycle: Optional[Callable[[], None]] = None):
+        """Prune repeatedly, sleeping between cycles, until stop() is called"""
+        print(f"🕒 Pruning every {interval:g}s: "
+              + ", ".join(f"{name} > {days:g}d" for name, days in self.policies.items()))
+        while not self._stop.is_set():
+            results = self.run_once()
+            total = sum(count for count in results.values() if count > 0)
+            stats = self.rate_controller.stats()
+            print(f"✅ Cycle {self.cycles}: pruned {total} documents "
+                  f"(target {stats['target_ops_per_second']:.0f} ops/sec)")
+            if after_cycle is not None:
+                after_cycle()
+
+            # A full cycle means there is a backlog; start the next one right away
+            backlog = any(count >= self.batch_size * self.max_batches_per_cycle
+                          for count in results.values())
+            if not backlog:
+                self._stop.wait(interval)
+
+        self.writer.close()
+        print("👋 Pruner stopped")
+
+
+def parse_policy(text: str) -> tuple:
+    """Parse a collection=days retention policy argument"""
+    try:
+        collection_name, days = text.split("=", 1)
+        return collection_name.strip(), float(days)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected collection=days, got {text!r}")
+
+
+def main():
+    """Main function; same as `manage_firebase_data.py prune`"""
+    # Imported here because the CLI imports the pruner from this module
+    from manage_firebase_data import main as manage_main
+
+    return manage_main(["prune", *sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -310,6 +310,13 @@ class BalanceService {
   // Get house statistics
   async getHouseStats() {
     try {
+      // Maintained by the Python rollup worker (manage_firebase_data.py rollup)
+      const rollup = await firebaseService.read('stats', 'house')
+      if (rollup) {
+        const { id, computedAt, ...stats } = rollup
+        return stats
+      }
+
       const [allBets, allUsers] = await Promise.all([
         firebaseService.read('bets'),
         firebaseService.read('users')
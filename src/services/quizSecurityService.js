@@ -18,6 +18,9 @@ class QuizSecurityService {
       suspiciousPatterns: [],
       blockedUsers: new Set()
     }
+
+    // Summary of the last batch scoring run (stats/risk), loaded on first use
+    this.riskScoring = null
   }
 
   // Main security check before quiz starts
@@ -262,9 +265,30 @@ class QuizSecurityService {
     }
   }
 
+  // Get a user's precomputed risk assessment (null if batch scoring has never run)
+  async getRiskAssessment(userId) {
+    // Risk scores for every user come from the Python scorer (manage_firebase_data.py anticheat)
+    if (!this.riskScoring) {
+      this.riskScoring = await firebaseService.read('stats', 'risk')
+      if (!this.riskScoring) {
+        return null
+      }
+    }
+
+    // Users without a risk document were scored and found clean
+    const risk = await firebaseService.read('security_flags', `risk-${userId}`)
+    return risk || { userId, riskScore: 0, severity: null, patterns: [] }
+  }
+
   // Detect suspicious patterns
   async detectSuspiciousPatterns(userId) {
     try {
+      const risk = await this.getRiskAssessment(userId)
+      if (risk) {
+        // Low scores are past rate-limit breaches on their own, which the limit checks already cover
+        return risk.severity === 'medium' || risk.severity === 'high' ? risk.patterns || [] : []
+      }
+
       const patterns = []
 
       // Get recent quiz sessions
@@ -505,27 +529,42 @@ class QuizSecurityService {
   // Get security statistics
   async getSecurityStats() {
     try {
-      const [
-        totalUsers,
-        blockedUsers,
-        securityFlags,
-        recentSessions
-      ] = await Promise.all([
-        firebaseService.read('users'),
-        firebaseService.queryCollection('user_blocks', [
-          { field: 'status', operator: '==', value: 'active' }
-        ]),
-        firebaseService.read('security_flags'),
-        firebaseService.queryCollection('quiz_sessions', [], 'startedAt', 'desc', 100)
-      ])
+      // Whole-history session figures from the batch scorer; otherwise sample the last 100 sessions
+      const risk = await firebaseService.read('stats', 'risk')
+      const recentSessions = risk
+        ? []
+        : await firebaseService.queryCollection('quiz_sessions', [], 'startedAt', 'desc', 100)
+
+      // Collection-wide counts are maintained by the Python rollup worker (manage_firebase_data.py rollup)
+      let totals = await firebaseService.read('stats', 'security')
+      if (!totals) {
+        const [totalUsers, blockedUsers, securityFlags] = await Promise.all([
+          firebaseService.read('users'),
+          firebaseService.queryCollection('user_blocks', [
+            { field: 'status', operator: '==', value: 'active' }
+          ]),
+          firebaseService.read('security_flags')
+        ])
+        totals = {
+          totalUsers: totalUsers.length,
+          blockedUsers: blockedUsers.length,
+          securityFlags: securityFlags.length
+        }
+      }
 
       const stats = {
-        totalUsers: totalUsers.length,
-        blockedUsers: blockedUsers.length,
-        securityFlags: securityFlags.length,
-        recentSessions: recentSessions.length,
-        averageScore: recentSessions.reduce((sum, session) => sum + (session.score || 0), 0) / recentSessions.length,
-        suspiciousSessions: recentSessions.filter(session => session.score >= 95).length
+        totalUsers: totals.totalUsers,
+        blockedUsers: totals.blockedUsers,
+        securityFlags: totals.securityFlags,
+        recentSessions: risk ? risk.sessions : recentSessions.length,
+        averageScore: risk
+          ? risk.averageScore
+          : recentSessions.reduce((sum, session) => sum + (session.score || 0), 0) / recentSessions.length,
+        suspiciousSessions: risk
+          ? risk.suspiciousSessions
+          : recentSessions.filter(session => session.score >= 95).length,
+        flaggedUsers: risk ? risk.flaggedUsers : 0,
+        highRiskUsers: risk ? risk.highRiskUsers : 0
       }
 
       return stats
@@ -537,7 +576,9 @@ class QuizSecurityService {
         securityFlags: 0,
         recentSessions: 0,
         averageScore: 0,
-        suspiciousSessions: 0
+        suspiciousSessions: 0,
+        flaggedUsers: 0,
+        highRiskUsers: 0
       }
     }
   }
@@ -311,24 +311,16 @@ class TournamentService {
   // Send notification to all users
   async notifyAllUsers(type, data) {
     try {
-      // Get all users
-      const users = await firebaseService.queryCollection('users')
-      
-      // Create notification for each user
-      const notifications = users.map(user => ({
-        userId: user.userId,
+      // Queue a broadcast; the fan-out worker (manage_firebase_data.py broadcast)
+      // writes one notification per user in bulk
+      await firebaseService.create('broadcasts', {
         type: type,
         data: data,
-        read: false,
-        createdAt: new Date().toISOString()
-      }))
-
-      // Save notifications
-      for (const notification of notifications) {
-        await firebaseService.create('notifications', notification)
-      }
+        audience: 'all',
+        status: 'pending'
+      })
 
-      console.log(`Sent ${notifications.length} notifications`)
+      console.log(`Queued ${type} broadcast`)
     } catch (error) {
       console.error('Error sending notifications:', error)
     }
@@ -351,6 +343,13 @@ class TournamentService {
   // Get tournament statistics
   async getTournamentStats() {
     try {
+      // Maintained by the Python rollup worker (manage_firebase_data.py rollup)
+      const rollup = await firebaseService.read('stats', 'tournaments')
+      if (rollup) {
+        const { id, computedAt, ...stats } = rollup
+        return stats
+      }
+
       const tournaments = await firebaseService.read('tournaments')
       const activeTournaments = tournaments.filter(t => t.status === 'active')
       const completedTournaments = tournaments.filter(t => t.status === 'completed')
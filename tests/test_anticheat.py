@@ -0,0 +1,103 @@
+"""Vectorized anti-cheat features checked against naive per-user loops"""
+
+import math
+import random
+import statistics
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from firebase_anticheat import (HIGH_SCORE, PERFECT_SCORE, RAPID_SESSION_SECONDS, RECENT_SESSIONS,
+                                _window_peaks, risk_scores, session_features)
+
+
+def random_sessions(rng, users):
+    rows = []
+    for user in range(users):
+        start = rng.uniform(0, 1e5)
+        for _ in range(rng.randrange(0, 25)):
+            start += rng.choice([5, 40, 600, 4000, 90000]) * rng.random()
+            started = start if rng.random() > 0.1 else math.nan
+            duration = rng.choice([rng.uniform(1, 29), rng.uniform(31, 400), math.nan])
+            score = rng.choice([rng.uniform(0, 94), 95, 99, 100, math.nan])
+            rows.append((user, started, duration, score))
+    rng.shuffle(rows)
+    return rows
+
+
+def naive_peak(starts, seconds, ending=None):
+    ending = starts if ending is None else ending
+    return max((sum(1 for other in starts if start - seconds < other <= start) for start in ending), default=0)
+
+
+def naive_features(rows, user):
+    mine = [row for row in rows if row[0] == user]
+    by_start = sorted((row for row in mine if not math.isnan(row[1])), key=lambda row: row[1])
+    recent = by_start[-RECENT_SESSIONS:]
+    durations = [row[2] for row in mine if not math.isnan(row[2])]
+    starts = [row[1] for row in by_start]
+    recent_starts = starts[-RECENT_SESSIONS:]
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])][-RECENT_SESSIONS:]
+    return {
+        'sessions': len(mine),
+        'recentSessions': len(recent),
+        'recentRapid': sum(1 for row in recent if row[2] < RAPID_SESSION_SECONDS),
+        'recentPerfect': sum(1 for row in recent if row[3] >= PERFECT_SCORE),
+        'recentHigh': sum(1 for row in recent if row[3] >= HIGH_SCORE),
+        'highScores': sum(1 for row in mine if row[3] >= HIGH_SCORE),
+        'medianSeconds': statistics.median(durations) if durations else math.nan,
+        'recentMinSecondsBetween': min(gaps, default=math.inf),
+        'recentPeakHourly': naive_peak(starts, 3600, recent_starts),
+        'recentPeakDaily': naive_peak(starts, 86400, recent_starts),
+    }
+
+
+def columns(rows):
+    user, started, duration, score = (np.array(column) for column in zip(*rows))
+    return user.astype(np.int64), started, duration, score
+
+
+def test_session_features_match_naive_loops():
+    rng = random.Random(5)
+    users = 40
+    rows = random_sessions(rng, users)
+    features = session_features(*columns(rows), users)
+    for user in range(users):
+        for name, expected in naive_features(rows, user).items():
+            actual = features[name][user]
+            if math.isnan(expected):
+                assert math.isnan(actual), (user, name)
+            else:
+                assert actual == pytest.approx(expected), (user, name)
+
+
+def test_window_peaks_match_naive_counts():
+    rng = random.Random(9)
+    rows = [(user, rng.uniform(0, 20000)) for user in range(6) for _ in range(rng.randrange(0, 30))]
+    rows.append((6, math.nan))
+    rows.sort()
+    user = np.array([row[0] for row in rows], dtype=np.int64)
+    started = np.array([row[1] for row in rows])
+    peaks = _window_peaks(user, started, 8, 3600)
+    for index in range(8):
+        starts = [row[1] for row in rows if row[0] == index and not math.isnan(row[1])]
+        assert peaks[index] == naive_peak(starts, 3600)
+
+
+def test_recent_sessions_decide_the_patterns():
+    day = 86400
+    rows = []
+    # A long clean history followed by five high scores in the last ten sessions
+    rows += [(0, i * day, 120, 60) for i in range(100)]
+    rows += [(0, (100 + i) * day, 120, 99 if i % 2 else 70) for i in range(10)]
+    # An old five-in-a-row streak followed by ten ordinary sessions
+    rows += [(1, i * day, 120, 99) for i in range(5)]
+    rows += [(1, (5 + i) * day, 120, 60) for i in range(10)]
+    # A burst of quizzes a few seconds apart, long before ten ordinary daily sessions
+    rows += [(2, i * 10, 120, 60) for i in range(12)]
+    rows += [(2, (5 + i) * day, 120, 60) for i in range(10)]
+    scores, hits = risk_scores(session_features(*columns(rows), 3))
+    assert hits['high'].tolist() == [True, False, False]
+    assert scores[1] == 0
+    assert scores[2] == 0
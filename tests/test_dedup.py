@@ -0,0 +1,93 @@
+"""MinHash signatures and the LSH question index checked against exact comparisons"""
+
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from firebase_dedup import MinHasher, QuestionIndex, shingles, similarity
+
+WORDS = ("bitcoin ethereum wallet block chain stake proof work miner token ledger gas fee smart "
+         "contract defi swap pool yield node hash").split()
+
+
+def jaccard(left, right):
+    left, right = set(shingles(left)), set(shingles(right))
+    return len(left & right) / len(left | right)
+
+
+def random_question(rng):
+    return "what is the " + " ".join(rng.choice(WORDS) for _ in range(10))
+
+
+def variant(rng, text, edits):
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def test_signature_similarity_estimates_shingle_jaccard():
+    rng = random.Random(1)
+    hasher = MinHasher()
+    for _ in range(100):
+        left = random_question(rng)
+        right = variant(rng, left, rng.randrange(0, 6))
+        estimate = similarity(hasher.signature(left), hasher.signature(right))
+        # 128 permutations: the standard error is at most 0.045
+        assert estimate == pytest.approx(jaccard(left, right), abs=0.15)
+    assert similarity(hasher.signature("same text"), hasher.signature("same text")) == 1.0
+
+
+def test_candidates_match_a_naive_scan(tmp_path):
+    rng = random.Random(2)
+    hasher = MinHasher()
+    index = QuestionIndex(str(tmp_path / "index.sqlite3"))
+    signatures = {}
+    for i in range(150):
+        path = f"questions/q{i:03d}"
+        signatures[path] = hasher.signature(random_question(rng))
+        index.add(path, str(i), signatures[path])
+
+    probes = [hasher.signature(random_question(rng)) for _ in range(20)]
+    for path in list(signatures)[::10]:
+        # Near copies of indexed questions: a few permutations changed
+        probe = signatures[path].copy()
+        probe[rng.sample(range(len(probe)), rng.randrange(0, 12))] += 1
+        probes.append(probe)
+    for probe in probes:
+        expected = sorted(((path, round(similarity(probe, other), 4)) for path, other in signatures.items()
+                           if similarity(probe, other) >= 0.8), key=lambda match: (-match[1], match[0]))
+        actual = index.candidates(probe, 0.8)
+        # Only true matches come back, and none this similar is missed
+        assert set(actual) <= set(expected)
+        assert [match for match in expected if match[1] >= 0.9] == [match for match in actual if match[1] >= 0.9]
+    index.close()
+
+
+def test_older_question_takes_over_and_deleted_originals_release_their_duplicates(tmp_path):
+    hasher = MinHasher()
+    index = QuestionIndex(str(tmp_path / "index.sqlite3"))
+    signature = hasher.signature("which consensus does ethereum use after the merge")
+
+    index.add("questions/new", "f1", signature, created=300.0)
+    index.add("questions/mid", "f2", signature, "questions/new", 1.0, created=200.0)
+    index.mark(["questions/mid"], 'flag')
+    # An older copy read later becomes the original of the whole cluster
+    index.add("questions/old", "f3", signature, created=100.0)
+    index.promote("questions/old", "questions/new", 1.0)
+    assert index.candidates(signature, 0.8) == [("questions/old", 1.0)]
+    assert sorted(index.pending('flag', 10)) == [("questions/mid", "questions/old", 1.0),
+                                                ("questions/new", "questions/old", 1.0)]
+    assert index.originals("", 10) == ["questions/old"]
+
+    # Deleting the original hands back its duplicates, oldest first
+    orphans = index.forget(["questions/old"])
+    assert [(path, created) for path, _, _, created in orphans] == [("questions/mid", 200.0),
+                                                                     ("questions/new", 300.0)]
+    assert index.candidates(signature, 0.8) == []
+    index.add("questions/mid", "f2", signature, created=200.0)
+    index.add("questions/new", "f1", signature, "questions/mid", 1.0, created=300.0)
+    assert index.counts() == {'indexed': 1, 'duplicates': 1}
+    index.close()
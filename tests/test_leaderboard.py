@@ -0,0 +1,80 @@
+"""Leaderboard score store checked against a naive recomputation"""
+
+import random
+from collections import defaultdict
+
+from firebase_leaderboard import DAILY, GLOBAL_BOARD, TOURNAMENT, LeaderboardMaterializer, LeaderboardStore
+
+
+def naive_boards(sessions):
+    """Daily reward totals and per-tournament best scores from the final session rows"""
+    boards = defaultdict(dict)
+    for user_id, day, reward, tournament, score in sessions.values():
+        if day and reward:
+            board = boards[f"{DAILY}:{day}"]
+            board[user_id] = board.get(user_id, 0) + reward
+        if tournament:
+            board = boards[f"{TOURNAMENT}:{tournament}"]
+            board[user_id] = max(board.get(user_id, 0), score or 0)
+    return {board: {user: score for user, score in scores.items() if score > 1e-9}
+            for board, scores in boards.items()}
+
+
+def store_boards(store, boards):
+    return {board: {user_id: score for user_id, score, _ in store.top(board, 1000)} for board in boards}
+
+
+def test_apply_sessions_matches_naive_totals(tmp_path):
+    rng = random.Random(7)
+    store = LeaderboardStore(str(tmp_path / "store.sqlite3"))
+    sessions = {}
+    # Pages mix new sessions with rewrites of earlier ones (active -> completed, moved day or owner)
+    for _ in range(30):
+        page = []
+        for _ in range(20):
+            session_id = f"s{rng.randrange(120)}"
+            row = (f"u{rng.randrange(8)}", f"2025-01-0{rng.randrange(1, 4)}", float(rng.randrange(0, 5)),
+                   rng.choice([None, "T1", "T2"]), float(rng.randrange(0, 101)))
+            sessions[session_id] = row
+            page.append((session_id, *row))
+        store.apply_sessions(page)
+
+    expected = naive_boards(sessions)
+    actual = store_boards(store, expected)
+    assert actual.keys() == expected.keys()
+    for board, scores in expected.items():
+        assert actual[board] == {user: round(score, 6) for user, score in scores.items()}, board
+    store.close()
+
+
+def test_unchanged_session_touches_nothing(tmp_path):
+    store = LeaderboardStore(str(tmp_path / "store.sqlite3"))
+    page = [("s1", "u1", "2025-01-01", 2.0, "T1", 80.0)]
+    assert store.apply_sessions(page) == {f"{DAILY}:2025-01-01", f"{TOURNAMENT}:T1"}
+    assert store.apply_sessions(page) == set()
+    store.close()
+
+
+class Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def test_user_rows_are_keyed_by_user_id_field(tmp_path):
+    materializer = LeaderboardMaterializer.__new__(LeaderboardMaterializer)
+    assert materializer._user_row(Snapshot("doc1", {'userId': "u1", 'username': "ann", 'totalEarned': 5})) \
+        == ("u1", "ann", 5)
+    # Users without the field fall back to their document ID
+    assert materializer._user_row(Snapshot("doc2", {'totalEarned': 3})) == ("doc2", "doc2", 3)
+
+    store = LeaderboardStore(str(tmp_path / "store.sqlite3"))
+    store.apply_users([materializer._user_row(Snapshot("doc1", {'userId': "u1", 'username': "ann",
+                                                                'totalEarned': 5}))])
+    store.apply_sessions([("s1", "u1", "2025-01-01", 2.0, None, 90.0)])
+    assert store.top(GLOBAL_BOARD, 10) == [("u1", 5.0, "ann")]
+    assert store.top(f"{DAILY}:2025-01-01", 10) == [("u1", 2.0, "ann")]
+    store.close()
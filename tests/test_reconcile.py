@@ -0,0 +1,61 @@
+"""Ledger rules of the balance reconciler"""
+
+from firebase_reconcile import DEPOSIT, QUIZ_LOSS, QUIZ_WIN, WITHDRAWAL, expected_balances, rejected_withdrawals
+
+
+def test_ledger_rules_follow_balance_service():
+    transactions = [
+        {'type': DEPOSIT, 'amount': 100, 'status': 'completed'},
+        {'type': DEPOSIT, 'amount': 50, 'status': 'pending'},          # not approved yet
+        {'type': QUIZ_WIN, 'amount': 30, 'status': 'completed'},
+        {'type': QUIZ_LOSS, 'amount': 20, 'status': 'completed'},      # the stake was taken by the bet
+        {'type': 'admin_adjustment', 'amount': -5, 'status': 'completed'},
+        {'type': WITHDRAWAL, 'amount': -40, 'status': 'pending'},      # deducted when requested
+        {'type': WITHDRAWAL, 'amount': -25, 'status': 'rejected'},     # never taken off totalWithdrawn
+    ]
+    bets = [{'betAmount': 20}, {'betAmount': 10}, {'betAmount': True}]  # booleans are not amounts
+    assert expected_balances(transactions, bets) == {
+        'playableBalance': 95.0, 'totalDeposited': 100.0, 'totalWithdrawn': 65.0}
+
+
+# One user's history through balanceService/dataService. Each step lists the ledger documents the
+# call writes (keyed by ID; a later step rewriting an ID is a status update) and the user fields
+# it leaves behind, worked out by hand from the JavaScript.
+JOURNEY = [
+    ("depositMoney(100)",
+     {'t1': {'type': DEPOSIT, 'amount': 100, 'status': 'pending'}}, {}, (0, 0, 0)),
+    ("approveDeposit(t1)",
+     {'t1': {'type': DEPOSIT, 'amount': 100, 'status': 'completed'}}, {}, (100, 100, 0)),
+    ("placeBet(10)",
+     {}, {'b1': {'betAmount': 10}}, (90, 100, 0)),
+    ("processBetResult(b1, correct): winAmount is twice the bet",
+     {'t2': {'type': QUIZ_WIN, 'amount': 20, 'status': 'completed'}}, {}, (110, 100, 0)),
+    ("placeBet(5)",
+     {}, {'b2': {'betAmount': 5}}, (105, 100, 0)),
+    ("processBetResult(b2, wrong): only records the loss",
+     {'t3': {'type': QUIZ_LOSS, 'amount': 5, 'status': 'completed'}}, {}, (105, 100, 0)),
+    ("addBalance(7, 'bonus')",
+     {'t4': {'type': 'bonus', 'amount': 7, 'status': 'completed'}}, {}, (112, 100, 0)),
+    ("deductBalance(2, 'fee')",
+     {'t5': {'type': 'fee', 'amount': -2, 'status': 'completed'}}, {}, (110, 100, 0)),
+    ("withdrawMoney(50): playableBalance is untouched",
+     {'t6': {'type': WITHDRAWAL, 'amount': -50, 'status': 'pending'}}, {}, (110, 100, 50)),
+    ("dataService.rejectTransaction(t6): only the status changes",
+     {'t6': {'type': WITHDRAWAL, 'amount': -50, 'status': 'failed'}}, {}, (110, 100, 50)),
+    ("depositMoney(30)",
+     {'t7': {'type': DEPOSIT, 'amount': 30, 'status': 'pending'}}, {}, (110, 100, 50)),
+    ("rejectDeposit(t7)",
+     {'t7': {'type': DEPOSIT, 'amount': 30, 'status': 'rejected'}}, {}, (110, 100, 50)),
+    ("withdrawMoney(20), then approveTransaction",
+     {'t8': {'type': WITHDRAWAL, 'amount': -20, 'status': 'completed'}}, {}, (110, 100, 70)),
+]
+
+
+def test_ledger_matches_balance_service_after_every_step():
+    transactions, bets = {}, {}
+    for step, new_transactions, new_bets, (playable, deposited, withdrawn) in JOURNEY:
+        transactions.update(new_transactions)
+        bets.update(new_bets)
+        assert expected_balances(list(transactions.values()), list(bets.values())) == {
+            'playableBalance': playable, 'totalDeposited': deposited, 'totalWithdrawn': withdrawn}, step
+    assert rejected_withdrawals(list(transactions.values())) == [50]
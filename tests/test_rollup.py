@@ -0,0 +1,60 @@
+"""Rollup contribution store checked against summing the current documents"""
+
+import random
+
+from firebase_rollup import RollupStore, _tidy, bet_counters, house_stats
+
+
+def naive_totals(documents):
+    totals = {}
+    for data in documents.values():
+        for name, value in bet_counters(data).items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def random_bet(rng):
+    return {'betAmount': rng.randrange(1, 50), 'winAmount': rng.randrange(0, 80),
+            'lossAmount': rng.randrange(0, 50), 'status': rng.choice(['won', 'lost', 'pending'])}
+
+
+def assert_totals(store, documents):
+    actual = {name: _tidy(value) for name, value in store.totals().items() if _tidy(value)}
+    expected = {name: value for name, value in naive_totals(documents).items() if value}
+    assert actual == expected
+
+
+def test_incremental_pages_and_sweep_match_full_sum(tmp_path):
+    rng = random.Random(3)
+    store = RollupStore(str(tmp_path / "store.sqlite3"))
+    documents = {}
+
+    # Change feed pages: new bets, edited bets and re-reads of unchanged ones
+    for _ in range(25):
+        page = []
+        for _ in range(15):
+            doc_id = f"b{rng.randrange(80)}"
+            if doc_id not in documents or rng.random() < 0.5:
+                documents[doc_id] = random_bet(rng)
+            page.append((doc_id, bet_counters(documents[doc_id])))
+        store.apply('bets', page, store.generation('bets'))
+        assert_totals(store, documents)
+
+    # Deletes are only seen by a full pass, which sweeps the rows it did not visit
+    for doc_id in rng.sample(sorted(documents), 20):
+        del documents[doc_id]
+    generation = store.generation('bets') + 1
+    store.apply('bets', [(doc_id, bet_counters(data)) for doc_id, data in documents.items()], generation)
+    assert store.sweep('bets', generation) == 20
+    assert_totals(store, documents)
+    store.close()
+
+
+def test_reapplying_unchanged_documents_changes_nothing(tmp_path):
+    store = RollupStore(str(tmp_path / "store.sqlite3"))
+    page = [("b1", bet_counters({'betAmount': 10, 'lossAmount': 10, 'status': 'lost'}))]
+    assert store.apply('bets', page, 0) == 1
+    assert store.apply('bets', page, 0) == 0
+    stats = house_stats(store.totals())
+    assert (stats['totalBets'], stats['houseProfit'], stats['averageWinRate']) == (1, 10, 0)
+    store.close()